@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+sys.path.append( "." )
+sys.path.append( ".." )
+
+import gc
+import json
+import time
+import getopt
+import timeit
+import statistics
+import tracemalloc
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.vm.commands
+import pyvbcc.disk.commands
+import pyvbcc.net.commands
+import pyvbcc.info.commands
+
+import corpus
+
+"""
+    Parse time and peak memory of every VBoxManage list parser over a synthetic corpus ( bench/corpus.py ).
+
+    Each parser turns the output of one list call into its records, as parse() does after a real call. Time is
+    the best and the median of --repeat runs, peak memory is what tracemalloc saw during one more run, the
+    parsed records included. --json keeps the results, --baseline compares with a kept file and exits 1 when
+    a parser got slower or bigger than --tolerance allows.
+
+        python3 bench/bench_parsers.py [--vms 10000] [--media 50000] [--networks 2000] [--repeat 5]
+                                       [--only name,...] [--json file] [--baseline file] [--tolerance 0.2]
+"""
+
+DEF_VMS=10000
+DEF_MEDIA=50000
+DEF_NETWORKS=2000
+DEF_REPEAT=5
+DEF_TOLERANCE=0.2
+
+def parsers( c, vms = DEF_VMS, media = DEF_MEDIA, networks = DEF_NETWORKS ):
+    """
+        { name: ( command, output lines ) } for every list parser.
+    """
+    nets = c.networks( networks )
+    res = {
+        "vms": ( pyvbcc.vm.commands.ListVmsCommand( test=True ), c.vms( vms ) ),
+        "vms_long": ( pyvbcc.vm.commands.ListVmsLongCommand( test=True ), c.vms_long( vms ) ),
+        "ostypes": ( pyvbcc.vm.commands.ListOsTypesCommand( test=True ), c.ostypes() ),
+        "hdds": ( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ), c.hdds( media, vms ) ),
+        "groups": ( pyvbcc.info.commands.ListGroupCommand( "all", test=True ), c.groups( max( vms // 100, 1 ) ) ),
+        "systemproperties": ( pyvbcc.info.commands.ListSystemPropertiesCommand( test=True ), c.systemproperties() ),
+        "hostinfo": ( pyvbcc.info.commands.ListHostInfoCommand( test=True ), c.hostinfo() )
+    }
+    for mode in ( "natnets", "hostonlyifs", "intnets", "bridgedifs" ):
+        res[ mode ] = ( pyvbcc.net.commands.ListNetworkCommand( mode, "all", test=True ), nets[ mode ] )
+    return res
+
+def measure( cmd, lines, repeat = DEF_REPEAT ):
+    parse = lambda: dict( cmd.records( lines ) )
+    records = len( parse() )
+
+    ## small outputs parse in microseconds, loop them to get above the timer resolution
+    number = 1
+    while number < 1000000 and timeit.timeit( parse, number=number ) < 0.05:
+        number *= 10
+    times = [ t / number for t in timeit.repeat( parse, number=number, repeat=repeat ) ]
+
+    gc.collect()
+    tracemalloc.start()
+    res = parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del res
+
+    return {
+        "lines": len( lines ),
+        "records": records,
+        "best": round( min( times ), 6 ),
+        "median": round( statistics.median( times ), 6 ),
+        "us_per_record": round( min( times ) * 1000000 / max( records, 1 ), 3 ),
+        "peak": peak
+    }
+
+def compare( results, baseline, tolerance = DEF_TOLERANCE ):
+    """
+        [ ( parser, metric, before, after ) ] of everything that grew by more than tolerance.
+    """
+    regressions = list()
+    for name, r in results.items():
+        old = baseline.get( name )
+        if old is None or old[ "records" ] != r[ "records" ]:
+            continue
+        for metric in ( "best", "peak" ):
+            if old[ metric ] > 0 and r[ metric ] > old[ metric ] * ( 1 + tolerance ):
+                regressions.append( ( name, metric, old[ metric ], r[ metric ] ) )
+    return regressions
+
+
+if __name__ == "__main__":
+    vms, media, networks = DEF_VMS, DEF_MEDIA, DEF_NETWORKS
+    repeat = DEF_REPEAT
+    tolerance = DEF_TOLERANCE
+    only = None
+    output = None
+    baseline = None
+
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "", [ "vms=", "media=", "networks=", "repeat=", "only=", "json=", "baseline=", "tolerance=" ] )
+    except getopt.GetoptError as e:
+        print( e )
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "--vms": vms = int( a )
+        elif o == "--media": media = int( a )
+        elif o == "--networks": networks = int( a )
+        elif o == "--repeat": repeat = int( a )
+        elif o == "--only": only = a.split( "," )
+        elif o == "--json": output = a
+        elif o == "--baseline": baseline = a
+        elif o == "--tolerance": tolerance = float( a )
+
+    results = dict()
+    print( "# %-18s %8s %8s %10s %10s %10s %12s" % ( "parser", "lines", "records", "best s", "median s", "us/record", "peak bytes" ) )
+    for name, ( cmd, lines ) in parsers( corpus.Corpus(), vms, media, networks ).items():
+        if only is not None and name not in only:
+            continue
+        r = measure( cmd, lines, repeat )
+        print( "  %-18s %8s %8s %10.4f %10.4f %10.3f %12s" % ( name, r[ "lines" ], r[ "records" ], r[ "best" ], r[ "median" ], r[ "us_per_record" ], r[ "peak" ] ) )
+        results[ name ] = r
+
+    if output:
+        with open( output, "w" ) as fd:
+            json.dump( results, fd, indent=2 )
+
+    if baseline:
+        with open( baseline, "r" ) as fd:
+            regressions = compare( results, json.load( fd ), tolerance )
+        for name, metric, before, after in regressions:
+            print( "REGRESSION %s %s: %s -> %s" % ( name, metric, before, after ) )
+        if len( regressions ) > 0:
+            sys.exit(1)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+sys.path.append( "." )
+sys.path.append( ".." )
+
+import timeit
+
+import pyvbcc
+import pyvbcc.vm.machinereadable
+
+"""
+    Compares the showvminfo --machinereadable parser with the line splitting parser it replaced,
+    on a synthetic dump of about 5000 lines.
+
+        python3 bench/bench_showvminfo.py [lines] [rounds]
+"""
+
+def legacy_parse( res ):
+    data = dict()
+    for line in res:
+        line = re.compile( "\"" ).sub(  "", line )
+        nldata = re.split(r"=", line )
+        data[ nldata[0] ] = nldata[1]
+    return data
+
+
+def dump( size = 5000 ):
+    lines = [
+        "name=\"bench-vm\"",
+        "groups=\"/bench\"",
+        "ostype=\"Red Hat (64-bit)\"",
+        "UUID=\"5d1c1a9e-2222-4c4c-8b8b-000000000001\"",
+        "CfgFile=\"/tmp/vms/bench/bench-vm/bench-vm.vbox\"",
+        "memory=4096",
+        "cpus=4",
+        "VMState=\"running\"",
+        "VMStateChangeTime=\"2020-01-01T10:00:00.000000000\"",
+        "description=\"built with key=value pairs\"",
+        "storagecontrollername0=\"SATA\"",
+        "storagecontrollertype0=\"IntelAhci\"",
+        "storagecontrollerportcount0=\"30\""
+    ]
+
+    i = 0
+    while len( lines ) < size:
+        port = i % 30
+        lines.append( "\"SATA-%s-%s\"=\"/tmp/vms/bench/bench-vm/disk%s.vdi\"" % ( port, i // 30, i ) )
+        lines.append( "\"SATA-ImageUUID-%s-%s\"=\"0b8a5c0e-1111-4c4c-8b8b-%012d\"" % ( port, i // 30, i ) )
+        lines.append( "nic%s=\"nat\"" % ( i % 8 + 1 ) )
+        lines.append( "macaddress%s=\"0800270000%02x\"" % ( i % 8 + 1, i % 256 ) )
+        lines.append( "Forwarding(%s)=\"rule%s,tcp,,%s,,%s\"" % ( i, i, 10000 + i, 22 ) )
+        lines.append( "GuestProperty%s=\"/VirtualBox/GuestInfo/Key%s=value%s\"" % ( i, i, i ) )
+        i += 1
+
+    return lines[:size]
+
+
+if __name__ == "__main__":
+    size = 5000
+    rounds = 50
+    if len( sys.argv ) > 1: size = int( sys.argv[1] )
+    if len( sys.argv ) > 2: rounds = int( sys.argv[2] )
+
+    lines = dump( size )
+
+    legacy = timeit.timeit( lambda: legacy_parse( lines ), number=rounds ) / rounds
+    current = timeit.timeit( lambda: pyvbcc.vm.machinereadable.parse( lines ), number=rounds ) / rounds
+
+    truncated = len( [ l for l in lines if l.count( "=" ) > 1 ] )
+
+    print( "lines:          %s" % ( len( lines ) ) )
+    print( "legacy parser:  %.3f ms" % ( legacy * 1000 ) )
+    print( "machinereadable %.3f ms" % ( current * 1000 ) )
+    print( "speedup:        %.2fx" % ( legacy / current ) )
+    print( "values legacy truncates at '=': %s" % ( truncated ) )
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+sys.path.append( "." )
+sys.path.append( ".." )
+
+import json
+import time
+import getopt
+import tempfile
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.config
+import pyvbcc.vbm
+import pyvbcc.plan
+import pyvbcc.metrics
+import pyvbcc.vm.inventory
+
+"""
+    Env build, inventory and teardown throughput of pyvbcc against bin/vboxmanage-emulator.
+
+    For every size an environment of that many VMs ( one disk and two NICs each, one NAT network ) is created
+    with vbm create, read back with a cold inventory refresh and removed with vbm destroy, each phase timed
+    on its own. Emulator latency and contention come from the options, every size starts from an empty
+    emulator, state store and command cache.
+
+        python3 bench/bench_throughput.py [--sizes 10,100,1000] [--latency s] [--svc s] [--contention p] [--json file]
+"""
+
+DEF_SIZES=( 10, 100, 1000 )
+
+def environment( hosts, machinefolder ):
+    return {
+        "system": { "machinefolder": machinefolder, "group": "bench", "command": "emulator" },
+        "networks": [ { "name": "benchnat", "type": "natnet", "network": "10.0.2.0/24" } ],
+        "hosts": [ {
+            "name": "bench%s" % ( i ), "type": "centos7", "cpus": "1", "mem": "1024",
+            "disks": [ { "name": "bench%sd0" % ( i ), "size": "2G", "format": "vdi" } ],
+            "nics": [ { "type": "nat", "network": "benchnat" }, { "type": "host", "network": "vboxnet0" } ]
+        } for i in range( hosts ) ]
+    }
+
+def _calls():
+    return sum( m[ "count" ] for m in pyvbcc.metrics.Report().values() )
+
+def _phase( name, hosts, func ):
+    calls = _calls()
+    start = time.perf_counter()
+    ok = func()
+    elapsed = time.perf_counter() - start
+    return { "phase": name, "vms": hosts, "seconds": round( elapsed, 3 ), "vms_per_s": round( hosts / elapsed, 1 ),
+             "calls": _calls() - calls, "ok": ok }
+
+def bench( hosts, workdir ):
+    os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( workdir, "emulator.json" )
+    os.environ[ "PYVBCC_STATE" ] = os.path.join( workdir, "pyvbcc.db" )
+    os.environ[ "PYVBCC_CACHE" ] = "off"
+    os.environ[ "PYVBCC_OSTYPES" ] = "off"
+
+    config = os.path.join( workdir, "pyvbcc.json" )
+    with open( config, "w" ) as fd:
+        json.dump( { "system": {} }, fd )
+    envfile = os.path.join( workdir, "bench.json" )
+    with open( envfile, "w" ) as fd:
+        json.dump( environment( hosts, os.path.join( workdir, "VirtualBox VMs" ) ), fd )
+
+    def vbm( mode ):
+        opt = { pyvbcc.KEY_SYSTEM_MODE: mode, pyvbcc.KEY_SYSTEM_ENVFILE: envfile }
+        res = pyvbcc.vbm.VbManage( pyvbcc.config.Configuration( config ), opt ).run()
+        return pyvbcc.plan.STATE_FAILED not in res.values() and pyvbcc.plan.STATE_SKIPPED not in res.values()
+
+    def inventory():
+        inv = pyvbcc.vm.inventory.VmInventory( **{ pyvbcc.KEY_SYSTEM_COMMAND: "emulator" } )
+        inv.refresh()
+        return len( inv.records() ) == hosts
+
+    return [ _phase( "build", hosts, lambda: vbm( "create" ) ),
+             _phase( "inventory", hosts, inventory ),
+             _phase( "teardown", hosts, lambda: vbm( "destroy" ) ) ]
+
+
+if __name__ == "__main__":
+    sizes = DEF_SIZES
+    output = None
+
+    try:
+        opts, args = getopt.getopt( sys.argv[1:], "", [ "sizes=", "latency=", "svc=", "contention=", "json=" ] )
+    except getopt.GetoptError as e:
+        print( e )
+        sys.exit(2)
+
+    for o, a in opts:
+        if o == "--sizes":
+            sizes = [ int( s ) for s in a.split( "," ) ]
+        elif o == "--latency":
+            os.environ[ "PYVBCC_EMULATOR_LATENCY" ] = a
+        elif o == "--svc":
+            os.environ[ "PYVBCC_EMULATOR_SVC" ] = a
+        elif o == "--contention":
+            os.environ[ "PYVBCC_EMULATOR_CONTENTION" ] = a
+        elif o == "--json":
+            output = a
+
+    results = list()
+    print( "# %-10s %6s %10s %10s %8s %4s" % ( "phase", "vms", "seconds", "vms/s", "calls", "ok" ) )
+    for hosts in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            for r in bench( hosts, workdir ):
+                print( "  %-10s %6s %10.3f %10.1f %8s %4s" % ( r[ "phase" ], r[ "vms" ], r[ "seconds" ], r[ "vms_per_s" ], r[ "calls" ], r[ "ok" ] ) )
+                results.append( r )
+
+    if output:
+        with open( output, "w" ) as fd:
+            json.dump( { "results": results, "metrics": pyvbcc.metrics.Report() }, fd, indent=2 )
+
+    if False in [ r[ "ok" ] for r in results ]:
+        sys.exit(1)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import random
+import uuid
+
+"""
+    Synthetic VBoxManage list output of any size, for the parser benchmarks.
+
+    Every generator returns the lines one VBoxManage call would print on a host with that many objects, in
+    the layout and field order VirtualBox 7 uses. Output depends only on the sizes and the seed, so runs are
+    comparable. Media are spread over the VMs and carry "In use by VMs" lines, a share of them are
+    differencing images with a parent UUID.
+
+        corpus = Corpus( seed=1 )
+        lines = corpus.hdds( 50000, vms=10000 )
+"""
+
+DEF_SEED=1
+
+OSTYPE_FAMILIES = [
+    ( "Linux", "Linux", [ "RedHat", "Fedora", "Oracle", "Debian", "Ubuntu", "OpenSUSE", "ArchLinux", "Gentoo" ] ),
+    ( "Windows", "Microsoft Windows", [ "Windows10", "Windows11", "Windows2016", "Windows2019", "Windows2022" ] ),
+    ( "BSD", "BSD", [ "FreeBSD", "OpenBSD", "NetBSD" ] ),
+    ( "Solaris", "Oracle Solaris", [ "Solaris11", "OpenSolaris" ] ),
+    ( "Other", "Other", [ "Other", "DOS", "Netware", "L4", "QNX" ] )
+]
+
+STATES = [ "powered off", "running", "saved", "paused", "aborted" ]
+
+class Corpus( object ):
+
+    def __init__( self, seed = DEF_SEED ):
+        self._seed = seed
+
+    def _random( self, kind ):
+        ## one stream per output kind, a generator's output does not depend on which ran before
+        return random.Random( "%s-%s" % ( self._seed, kind ) )
+
+    def _uuid( self, rnd ):
+        return str( uuid.UUID( int=rnd.getrandbits( 128 ), version=4 ) )
+
+    def _mac( self, rnd ):
+        return "080027%06X" % ( rnd.getrandbits( 24 ) )
+
+    def _names( self, count ):
+        return [ "vm%05d" % ( i ) for i in range( count ) ]
+
+    def _vm_uuids( self, count ):
+        rnd = self._random( "vm-uuids" )
+        return [ self._uuid( rnd ) for i in range( count ) ]
+
+    ###################################################################################################################
+    ## VMs
+    ###################################################################################################################
+    def vms( self, count ):
+        """
+            list vms
+        """
+        return [ "\"%s\" {%s}" % ( name, u ) for name, u in zip( self._names( count ), self._vm_uuids( count ) ) ]
+
+    def vms_long( self, count ):
+        """
+            list --long vms, with two controllers, a disk, a DVD, two NICs and a shared folder per VM.
+        """
+        rnd = self._random( "vms-long" )
+        lines = list()
+        for idx, ( name, u ) in enumerate( zip( self._names( count ), self._vm_uuids( count ) ) ):
+            lines += [
+                "Name:                        %s" % ( name ),
+                "Encryption:                  disabled",
+                "Groups:                      /bench%s" % ( idx % 10 ),
+                "Guest OS:                    Red Hat (64-bit)",
+                "UUID:                        %s" % ( u ),
+                "Config file:                 /vms/bench%s/%s/%s.vbox" % ( idx % 10, name, name ),
+                "Snapshot folder:             /vms/bench%s/%s/Snapshots" % ( idx % 10, name ),
+                "Log folder:                  /vms/bench%s/%s/Logs" % ( idx % 10, name ),
+                "Hardware UUID:               %s" % ( u ),
+                "Memory size:                 %sMB" % ( rnd.choice( [ 512, 1024, 2048, 4096 ] ) ),
+                "Page Fusion:                 disabled",
+                "VRAM size:                   16MB",
+                "CPU exec cap:                100%",
+                "HPET:                        disabled",
+                "Chipset:                     piix3",
+                "Firmware:                    BIOS",
+                "Number of CPUs:              %s" % ( rnd.choice( [ 1, 2, 4 ] ) ),
+                "PAE:                         enabled",
+                "Long Mode:                   enabled",
+                "Boot menu mode:              message and menu",
+                "Boot Device 1:               Floppy",
+                "Boot Device 2:               DVD",
+                "Boot Device 3:               HardDisk",
+                "Boot Device 4:               Not Assigned",
+                "ACPI:                        enabled",
+                "IOAPIC:                      enabled",
+                "Time offset:                 0ms",
+                "Hardware Virtualization:     enabled",
+                "State:                       %s (since 2026-01-01T10:00:00.000000000)" % ( rnd.choice( STATES ) ),
+                "Graphics Controller:         VMSVGA",
+                "Monitor count:               1",
+                "Storage Controller Name (0):            IDE",
+                "Storage Controller Type (0):            PIIX4",
+                "Storage Controller Instance Number (0): 0",
+                "Storage Controller Max Port Count (0):  2",
+                "Storage Controller Port Count (0):      2",
+                "Storage Controller Bootable (0):        on",
+                "Storage Controller Name (1):            SATA",
+                "Storage Controller Type (1):            IntelAhci",
+                "Storage Controller Instance Number (1): 0",
+                "Storage Controller Max Port Count (1):  30",
+                "Storage Controller Port Count (1):      2",
+                "Storage Controller Bootable (1):        on",
+                "IDE (1, 0): Empty",
+                "SATA (0, 0): /vms/bench%s/%s/%sd0.vdi (UUID: %s)" % ( idx % 10, name, name, self._uuid( rnd ) ),
+                "NIC 1:                       MAC: %s, Attachment: NAT Network 'nat%s', Cable connected: on, Trace: off (file: none), Type: 82540EM, Reported speed: 0 Mbps, Boot priority: 0, Promisc Policy: deny, Bandwidth group: none" % ( self._mac( rnd ), idx % 10 ),
+                "NIC 1 Rule(0):   name = ssh, protocol = tcp, host ip = , host port = %s, guest ip = , guest port = 22" % ( 20000 + idx ),
+                "NIC 2:                       MAC: %s, Attachment: Host-only Interface 'vboxnet0', Cable connected: on, Trace: off (file: none), Type: 82540EM, Reported speed: 0 Mbps, Boot priority: 0, Promisc Policy: deny, Bandwidth group: none" % ( self._mac( rnd ) ),
+                "NIC 3:                       disabled",
+                "NIC 4:                       disabled",
+                "Audio:                       disabled",
+                "Clipboard Mode:              disabled",
+                "VRDE:                        disabled",
+                "USB:                         disabled",
+                "",
+                "Shared folders:",
+                "",
+                "Name: 'data', Host path: '/srv/data' (machine mapping), writable",
+                "",
+                "Guest:",
+                "",
+                "Configured memory balloon size: 0MB",
+                ""
+            ]
+        return lines
+
+    ###################################################################################################################
+    ## Media
+    ###################################################################################################################
+    def hdds( self, count, vms = None ):
+        """
+            list hdds --long, media round robin over the VMs, every fifth one a differencing image.
+        """
+        vms = count if vms is None else vms
+        rnd = self._random( "hdds" )
+        names = self._names( vms )
+        uuids = self._vm_uuids( vms )
+        lines = list()
+        base = None
+        for idx in range( count ):
+            u = self._uuid( rnd )
+            vm = idx % vms if vms > 0 else None
+            diff = base is not None and idx % 5 == 4
+            lines += [
+                "UUID:           %s" % ( u ),
+                "Parent UUID:    %s" % ( base if diff else "base" ),
+                "State:          %s" % ( "created" if idx % 50 else "inaccessible" ),
+                "Type:           normal (%s)" % ( "differencing" if diff else "base" ),
+                "Location:       /vms/bench/%s/disk%06d.vdi" % ( names[ vm ] if vm is not None else "detached", idx ),
+                "Storage format: VDI",
+                "Capacity:       %s MBytes" % ( rnd.choice( [ 2048, 8192, 20480, 102400 ] ) ),
+                "Size on disk:   %s MBytes" % ( rnd.randint( 2, 20000 ) ),
+                "Encryption:     disabled",
+                "Property:       AllocationBlockSize=1048576"
+            ]
+            if vm is not None:
+                lines.append( "In use by VMs:  %s (UUID: %s)" % ( names[ vm ], uuids[ vm ] ) )
+            lines.append( "" )
+            if not diff: base = u
+        return lines
+
+    ###################################################################################################################
+    ## Networks
+    ###################################################################################################################
+    def natnets( self, count ):
+        lines = list()
+        for idx in range( count ):
+            lines += [
+                "NetworkName:    nat%s" % ( idx ),
+                "Network:        10.%s.%s.0/24" % ( idx // 256 % 256, idx % 256 ),
+                "Gateway:        10.%s.%s.1" % ( idx // 256 % 256, idx % 256 ),
+                "DHCP Server:    Yes",
+                "IPv6:           No",
+                "IPv6 Prefix:    fd17:625c:f037:2::/64",
+                "IPv6 Default:   No",
+                "Enabled:        Yes",
+                ""
+            ]
+        return lines
+
+    def hostonlyifs( self, count ):
+        rnd = self._random( "hostonlyifs" )
+        lines = list()
+        for idx in range( count ):
+            lines += [
+                "Name:            vboxnet%s" % ( idx ),
+                "GUID:            %s" % ( self._uuid( rnd ) ),
+                "DHCP:            Disabled",
+                "IPAddress:       192.168.%s.1" % ( idx % 256 ),
+                "NetworkMask:     255.255.255.0",
+                "IPV6Address:     fe80::800:27ff:fe00:%x" % ( idx ),
+                "IPV6NetworkMaskPrefixLength: 64",
+                "HardwareAddress: 0a:00:27:00:%02x:%02x" % ( idx // 256 % 256, idx % 256 ),
+                "MediumType:      Ethernet",
+                "Wireless:        No",
+                "Status:          Up",
+                "VBoxNetworkName: HostInterfaceNetworking-vboxnet%s" % ( idx ),
+                ""
+            ]
+        return lines
+
+    def intnets( self, count ):
+        lines = list()
+        for idx in range( count ):
+            lines += [ "Name:        intnet%s" % ( idx ), "" ]
+        return lines
+
+    def bridgedifs( self, count ):
+        rnd = self._random( "bridgedifs" )
+        lines = list()
+        for idx in range( count ):
+            lines += [
+                "Name:            eth%s" % ( idx ),
+                "GUID:            %s" % ( self._uuid( rnd ) ),
+                "DHCP:            Disabled",
+                "IPAddress:       10.1.%s.2" % ( idx % 256 ),
+                "NetworkMask:     255.255.255.0",
+                "IPV6Address:     ",
+                "IPV6NetworkMaskPrefixLength: 0",
+                "HardwareAddress: 52:54:00:00:%02x:%02x" % ( idx // 256 % 256, idx % 256 ),
+                "MediumType:      Ethernet",
+                "Wireless:        No",
+                "Status:          Up",
+                "VBoxNetworkName: HostInterfaceNetworking-eth%s" % ( idx ),
+                ""
+            ]
+        return lines
+
+    def networks( self, count ):
+        """
+            { list mode: lines } with count networks spread over the four kinds.
+        """
+        share = max( count // 4, 1 )
+        return { "natnets": self.natnets( share ), "hostonlyifs": self.hostonlyifs( share ),
+                 "intnets": self.intnets( share ), "bridgedifs": self.bridgedifs( count - 3 * share ) }
+
+    ###################################################################################################################
+    ## System
+    ###################################################################################################################
+    def ostypes( self, count = None ):
+        """
+            list ostypes, 32 and 64 bit ids of the common families, padded with generated ones up to count.
+        """
+        ids = list()
+        for family, desc, names in OSTYPE_FAMILIES:
+            for name in names:
+                ids += [ ( name, family, desc, False ), ( name + "_64", family, desc, True ) ]
+        idx = 0
+        while count is not None and len( ids ) < count:
+            ids.append( ( "Synthetic%s_64" % ( idx ), "Other", "Other", True ) )
+            idx += 1
+        lines = list()
+        for oid, family, desc, bits64 in ids[ :count ] if count is not None else ids:
+            lines += [
+                "ID:          %s" % ( oid ),
+                "Description: %s%s" % ( oid.replace( "_64", "" ), " (64-bit)" if bits64 else " (32-bit)" ),
+                "Family ID:   %s" % ( family ),
+                "Family Desc: %s" % ( desc ),
+                "64 bit:      %s" % ( "true" if bits64 else "false" ),
+                ""
+            ]
+        return lines
+
+    def groups( self, count ):
+        return [ "\"/\"" ] + [ "\"/bench%s\"" % ( i ) for i in range( count ) ]
+
+    def systemproperties( self ):
+        lines = [
+            "API version:                     7_0",
+            "Minimum guest RAM size:          4 Megabytes",
+            "Maximum guest RAM size:          2097152 Megabytes",
+            "Minimum video RAM size:          0 Megabytes",
+            "Maximum video RAM size:          256 Megabytes",
+            "Maximum guest monitor count:     64",
+            "Minimum guest CPU count:         1",
+            "Maximum guest CPU count:         64",
+            "Virtual disk limit (info):       2199022206976 Bytes",
+            "Maximum Serial Port count:       4",
+            "Maximum Parallel Port count:     2",
+            "Maximum Boot Position:           4",
+            "Maximum PIIX3 Network Adapter count:   8",
+            "Maximum ICH9 Network Adapter count:   36",
+            "Default machine folder:          /vms",
+            "Raw-mode Supported:              no",
+            "Exclusive HW virtualization use: on",
+            "Default hard disk format:        VDI",
+            "VRDE auth library:               VBoxAuth",
+            "Webservice auth. library:        VBoxAuth",
+            "Log history count:               3",
+            "Default frontend:                ",
+            "Default audio driver:            ALSA",
+            "Autostart database path:         ",
+            "Default Guest Additions ISO:     /usr/share/virtualbox/VBoxGuestAdditions.iso",
+            "Logging Level:                   all",
+            "Proxy Mode:                      System",
+            "Proxy URL:                       ",
+            "User language:                   en_US"
+        ]
+        for bus in ( "IDE", "SATA", "SCSI", "SAS", "Floppy", "VirtioSCSI", "NVMe" ):
+            lines += [
+                "Maximum %s Controllers:   8" % ( bus ),
+                "Maximum %s Port count:    30" % ( bus ),
+                "Maximum Devices per %s Port: 1" % ( bus )
+            ]
+        return lines
+
+    def hostinfo( self, cpus = 64 ):
+        lines = [
+            "Host Information:",
+            "",
+            "Host time: 2026-01-01T10:00:00.000000000Z",
+            "Processor online count: %s" % ( cpus ),
+            "Processor count: %s" % ( cpus ),
+            "Processor online core count: %s" % ( cpus // 2 ),
+            "Processor core count: %s" % ( cpus // 2 ),
+            "Processor supports HW virtualization: yes",
+            "Processor supports PAE: yes",
+            "Processor supports long mode: yes",
+            "Processor supports nested paging: yes",
+            "Processor supports unrestricted guest: yes",
+            "Processor supports nested HW virtualization: yes",
+            "Memory size: 515890 MByte",
+            "Memory available: 401233 MByte",
+            "Operating system: Linux",
+            "Operating system version: 6.1.0-18-amd64"
+        ]
+        for cpu in range( cpus ):
+            lines += [
+                "Processor#%s speed: 3000 MHz" % ( cpu ),
+                "Processor#%s description: AMD EPYC 7543 32-Core Processor" % ( cpu )
+            ]
+        return lines
+
+
+if __name__ == "__main__":
+    corpus = Corpus()
+    kind = sys.argv[1] if len( sys.argv ) > 1 else "vms"
+    args = [ int( a ) for a in sys.argv[2:] ]
+    out = getattr( corpus, kind )( *args )
+    for line in ( sum( out.values(), [] ) if type( out ).__name__ == "dict" else out ):
+        print( line )
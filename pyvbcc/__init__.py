@@ -8,6 +8,19 @@ KEY_SYSTEM_CONFIG="system.config"
 KEY_SYSTEM_HELP="system.help"
 KEY_SYSTEM_COMMAND="system.command"
 KEY_SYSTEM_INFO="system.info"
+KEY_SYSTEM_CONCURRENCY="system.concurrency"
+KEY_SYSTEM_VM_CONCURRENCY="system.vm_concurrency"
+KEY_SYSTEM_CACHE="system.cache"
+KEY_SYSTEM_LONG="system.long"
+KEY_SYSTEM_WATCH="system.watch"
+KEY_SYSTEM_MANAGED="system.managed"
+KEY_SYSTEM_RESUME="system.resume"
+KEY_SYSTEM_METRICS="system.metrics"
+KEY_SYSTEM_TRACE="system.trace"
+KEY_SYSTEM_PROFILE="system.profile"
+KEY_SYSTEM_PROFILE_MEM="system.profile_mem"
+KEY_SYSTEM_TIMEOUT="system.timeout"
+KEY_SYSTEM_WAIT="system.wait"
 
 ##
 KEY_CONFIG_FILE="config.file"
@@ -20,6 +33,7 @@ KEY_GROUP_NAME="group.name"
 KEY_VM_NAME="vm.name"
 KEY_VM_GROUP="vm.group"
 KEY_VM_OSTYPE="vm.ostyoe"
+KEY_VM_BASEFOLDER="vm.basefolder"
 KEY_VM_CPUS="vm.cpus"
 KEY_VM_MEMORY="vm.mem"
 KEY_VM_CPUCAP="vm.ccap"
@@ -42,6 +56,11 @@ KEY_VM_PSTATE="vm.powerstate"
 KEY_VM_STYPE="vm.starttype"
 KEY_VM_SENV="vm.startenv"
 KEY_VM_OFFTYPE="vm.powerofftype"
+KEY_VM_READY="vm.ready"
+KEY_VM_SNAPSHOT="vm.snapshot"
+KEY_VM_TEMPLATE="vm.template"
+KEY_VM_LINKED="vm.linked"
+KEY_VM_NEWNAME="vm.newname"
 
 ##
 KEY_BOOT_ORDER="boot.order"
@@ -82,6 +101,7 @@ KEY_NETWORK_ENABLED="network.enabled"
 
 KEY_NIC_ID="nic.id"
 KEY_NIC_NET="nic.net"
+KEY_NIC_NETNAME="nic.netname"
 KEY_NIC_MAC="nic.mac"
 KEY_NIC_CONNECTED="nic.connected"
 KEY_NIC_TYPE="nic.type"
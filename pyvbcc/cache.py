@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import time
+import sqlite3
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.utils
+
+"""
+    Output cache for read-only VBoxManage queries.
+
+    Read-only command classes set CACHE_TTL and CACHE_TAGS, their raw output is kept for CACHE_TTL seconds.
+    Any other command drops the entries tagged with its INVALIDATES tags when it runs (all entries if it does not
+    say). The cache is a small SQLite database so back-to-back CLI runs reuse it, every entry is a row of its
+    own: a put writes one row, and an invalidation by another process is seen by the next get.
+
+    PYVBCC_CACHE in the environment points the cache at another file, "off" disables it.
+"""
+
+DEF_CACHE_FILE=os.path.join( os.path.expanduser( "~" ), ".cache", "pyvbcc", "commands.db" )
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY, created REAL NOT NULL, ttl REAL NOT NULL, tags TEXT NOT NULL, lines TEXT NOT NULL )"""
+]
+
+class CommandCache( object ):
+
+    def __init__( self, filename = DEF_CACHE_FILE, **opt ):
+        self._debug = False
+        self._filename = filename
+        self._conn = None
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+    def filename( self ):
+        return self._filename
+
+    def _db( self ):
+        if self._conn is not None:
+            return self._conn
+
+        try:
+            if self._filename != ":memory:":
+                os.makedirs( os.path.dirname( os.path.abspath( self._filename ) ), exist_ok=True )
+            self._conn = sqlite3.connect( self._filename, timeout=30, isolation_level=None )
+            self._conn.execute( "PRAGMA journal_mode=WAL" )
+            self._conn.execute( "PRAGMA synchronous=NORMAL" )
+            for stmt in SCHEMA:
+                self._conn.execute( stmt )
+        except ( OSError, sqlite3.Error ) as e:
+            ## a broken cache file is just no cache
+            if self._debug: print( "Ignoring cache file %s: %s" % ( self._filename, e ) )
+            self._conn = None
+        return self._conn
+
+    def close( self ):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _execute( self, query, args = () ):
+        db = self._db()
+        if db is None:
+            return None
+        try:
+            return db.execute( query, args )
+        except sqlite3.Error as e:
+            if self._debug: print( "Cache file %s: %s" % ( self._filename, e ) )
+            return None
+
+    def get( self, key ):
+        cur = self._execute( "SELECT created, ttl, lines FROM entries WHERE key = ?", ( key, ) )
+        row = cur.fetchone() if cur is not None else None
+        if row is None:
+            return None
+
+        created, ttl, lines = row
+        if time.time() - created > ttl:
+            self._execute( "DELETE FROM entries WHERE key = ? AND created = ?", ( key, created ) )
+            return None
+
+        return json.loads( lines )
+
+    def put( self, key, lines, ttl, tags = () ):
+        ## tags are kept as ",vms,hdds," so a tag matches with LIKE
+        self._execute( "INSERT OR REPLACE INTO entries VALUES ( ?, ?, ?, ?, ? )",
+                       ( key, time.time(), ttl, "," + ",".join( tags ) + ",", json.dumps( list( lines ) ) ) )
+
+    def invalidate( self, tags = None ):
+        """
+            Drops all entries carrying any of the tags, or every entry if tags is None.
+        """
+        if tags is None:
+            cur = self._execute( "DELETE FROM entries" )
+        else:
+            tags = list( tags )
+            if len( tags ) == 0:
+                return 0
+            cur = self._execute( "DELETE FROM entries WHERE " + " OR ".join( [ "tags LIKE ?" ] * len( tags ) ),
+                                 [ "%%,%s,%%" % ( t ) for t in tags ] )
+        return cur.rowcount if cur is not None else 0
+
+    def clear( self ):
+        return self.invalidate( None )
+
+
+_cache = None
+_disabled = False
+
+def GetCache():
+    global _cache
+
+    if _disabled:
+        return None
+
+    if _cache is None:
+        filename = pyvbcc.utils.read_env( "PYVBCC_CACHE" )
+        if filename in ("off", "false", "0"):
+            return None
+        if not filename:
+            filename = DEF_CACHE_FILE
+        _cache = CommandCache( filename )
+
+    return _cache
+
+def SetCache( cache ):
+    global _cache, _disabled
+    _cache = cache
+    _disabled = cache is None
+
+def Disable():
+    SetCache( None )
+
+
+if __name__ == "__main__":
+    pass
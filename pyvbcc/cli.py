@@ -10,6 +10,8 @@ import pyvbcc
 import pyvbcc.config
 import pyvbcc.validate
 import pyvbcc.command
+import pyvbcc.cache
+import pyvbcc.state
 
 import pyvbcc.info
 import pyvbcc.vm
@@ -41,7 +43,7 @@ class InfoCommandLine( pyvbcc.command.CommonCommandLine ):
         Handles all the input from the info sub-command.
     """
     def __init__(self, argv, **opt ):
-        super().__init__( argv, ["h","v:","n:","d","g:", "o:"], ["help","test","debug","vm=","network=","dhcp=","group=","vm-disk=", "ostype="], **opt )
+        super().__init__( argv, ["h","v:","n:","d","g:", "o:", "l"], ["help","test","debug","vm=","network=","dhcp=","group=","vm-disk=", "ostype=", "no-cache", "long", "watch=", "managed"], **opt )
 
         self._validmap = {
             pyvbcc.KEY_VM_NAME :{ "match":["^[a-zA-Z0-9\-\._]+$"] },
@@ -52,7 +54,11 @@ class InfoCommandLine( pyvbcc.command.CommonCommandLine ):
             pyvbcc.KEY_GROUP_NAME : { "match":["^[a-zA-Z0-9\-\._]+$"] },
             pyvbcc.KEY_SYSTEM_DEBUG : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_TEST : {"match":[".*"]},
-            pyvbcc.KEY_SYSTEM_HELP : {"match":[".*"]}
+            pyvbcc.KEY_SYSTEM_HELP : {"match":[".*"]},
+            pyvbcc.KEY_SYSTEM_CACHE : {"match":["True","False"]},
+            pyvbcc.KEY_SYSTEM_LONG : {"match":["True","False"]},
+            pyvbcc.KEY_SYSTEM_WATCH : {"match":["^[0-9]+(\.[0-9]+)?$"]},
+            pyvbcc.KEY_SYSTEM_MANAGED : {"match":["True","False"]}
         }
 
         self._validator = pyvbcc.validate.Validator( self._validmap, **opt )
@@ -68,6 +74,14 @@ class InfoCommandLine( pyvbcc.command.CommonCommandLine ):
                 self._opt[ pyvbcc.KEY_SYSTEM_DEBUG ] = True
             elif o in ("--test"):
                 self._opt[ pyvbcc.KEY_SYSTEM_TEST ] = True
+            elif o in ("--no-cache",):
+                self._opt[ pyvbcc.KEY_SYSTEM_CACHE ] = False
+            elif o in ("-l", "--long"):
+                self._opt[ pyvbcc.KEY_SYSTEM_LONG ] = True
+            elif o in ("--watch",):
+                self._opt[ pyvbcc.KEY_SYSTEM_WATCH ] = a
+            elif o in ("--managed",):
+                self._opt[ pyvbcc.KEY_SYSTEM_MANAGED ] = True
             elif o in ("-v", "--vm"):
                 self._opt[ pyvbcc.KEY_VM_NAME ] = a
             elif o in ("-n", "--network"):
@@ -87,17 +101,30 @@ class InfoCommandLine( pyvbcc.command.CommonCommandLine ):
         return self._opt
 
     def action( self ):
+        """
+            Listings are returned as generators of ( key, record ) so output starts before VBoxManage is done.
+        """
+        if pyvbcc.KEY_SYSTEM_CACHE in self._opt and not self._opt[ pyvbcc.KEY_SYSTEM_CACHE ]:
+            pyvbcc.cache.Disable()
+
+        ## what pyvbcc created comes from the state store, --long checks it against VBoxManage
+        if self._opt.get( pyvbcc.KEY_SYSTEM_MANAGED ):
+            return pyvbcc.state.GetManagedInfo( self._opt )
+
+        if pyvbcc.KEY_VM_NAME in self._opt and self._opt[ pyvbcc.KEY_VM_NAME ] == "all":
+            return pyvbcc.vm.StreamVms( self._opt )
+
         if pyvbcc.KEY_VM_NAME in self._opt:
             return pyvbcc.vm.GetVmInfo( self._opt )
 
         if pyvbcc.KEY_VM_OSTYPE in self._opt:
-            return pyvbcc.vm.GetOsTypesInfo( self._opt )
+            return pyvbcc.vm.StreamOsTypesInfo( self._opt )
 
         if pyvbcc.KEY_NETWORK_NAME in self._opt:
             return pyvbcc.net.GetNetworkInfo( self._opt )
 
         if pyvbcc.KEY_DISKS_NAME in self._opt:
-            return pyvbcc.disk.GetDiskInfo( self._opt )
+            return pyvbcc.disk.StreamDiskInfo( self._opt )
 
         if pyvbcc.KEY_GROUP_NAME in self._opt:
             return pyvbcc.info.GetGroupInfo( self._opt )
@@ -106,7 +133,7 @@ class InfoCommandLine( pyvbcc.command.CommonCommandLine ):
 
 class CreateCommandLine( pyvbcc.command.CommonCommandLine ):
     def __init__(self, argv, **opt ):
-        super().__init__( argv, ["h","d"], ["help","debug", "test"], **opt )
+        super().__init__( argv, ["h","d"], ["help","debug", "test", "resume"], **opt )
         self._validmap = {
             pyvbcc.KEY_SYSTEM_DEBUG : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_TEST : {"match":[".*"]},
@@ -156,26 +183,106 @@ class SysInfoCommandLine( pyvbcc.command.CommonCommandLine ):
         return pyvbcc.info.GetSystemInfo( self._opt )
 
 class StartCommandLine( pyvbcc.command.CommonCommandLine ):
+    """
+        Starts a group of VMs ( or one ) and waits until the guests are up.
+    """
     def __init__(self, argv, **opt ):
-        super().__init__( argv, ["h","d"], ["help","debug", "test"], **opt )
+        super().__init__( argv, ["h","d","g:","v:"], ["help","debug", "test", "group=", "vm=", "concurrency=", "timeout=", "property=", "type=", "no-wait"], **opt )
         self._validmap = {
+            pyvbcc.KEY_GROUP_NAME : { "match":["^/?[a-zA-Z0-9\-\._/]+$"] },
+            pyvbcc.KEY_VM_NAME :{ "match":["^[a-zA-Z0-9\-\._]+$"] },
+            pyvbcc.KEY_SYSTEM_CONCURRENCY : {"match":["^[0-9]+$"]},
+            pyvbcc.KEY_SYSTEM_TIMEOUT : {"match":["^[0-9]+(\.[0-9]+)?$"]},
+            pyvbcc.KEY_VM_READY : {"match":["^/[a-zA-Z0-9\-\._/\*]+$"]},
+            pyvbcc.KEY_VM_STYPE : {"match":["headless","gui","separate"]},
+            pyvbcc.KEY_SYSTEM_WAIT : {"match":["True","False"]},
             pyvbcc.KEY_SYSTEM_DEBUG : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_TEST : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_HELP : {"match":[".*"]}
         }
         self._validator = pyvbcc.validate.Validator( self._validmap, **opt )
 
+    def parse( self ):
+        for o, a in self._opts:
+            if a in ("-h", "--help"):
+                self._opt[ pyvbcc.KEY_SYSTEM_HELP ] = True
+            elif o in ("-d", "--debug"):
+                self._opt[ pyvbcc.KEY_SYSTEM_DEBUG ] = True
+            elif o in ("--test",):
+                self._opt[ pyvbcc.KEY_SYSTEM_TEST ] = True
+            elif o in ("-g", "--group"):
+                self._opt[ pyvbcc.KEY_GROUP_NAME ] = a
+            elif o in ("-v", "--vm"):
+                self._opt[ pyvbcc.KEY_VM_NAME ] = a
+            elif o in ("--concurrency",):
+                self._opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ] = a
+            elif o in ("--timeout",):
+                self._opt[ pyvbcc.KEY_SYSTEM_TIMEOUT ] = a
+            elif o in ("--property",):
+                self._opt[ pyvbcc.KEY_VM_READY ] = a
+            elif o in ("--type",):
+                self._opt[ pyvbcc.KEY_VM_STYPE ] = a
+            elif o in ("--no-wait",):
+                self._opt[ pyvbcc.KEY_SYSTEM_WAIT ] = False
+
+        ## Either this is true, or get exception
+        self._validator.validate( self._opt )
+
+        return self._opt
+
+    def action( self ):
+        if pyvbcc.KEY_GROUP_NAME not in self._opt and pyvbcc.KEY_VM_NAME not in self._opt:
+            raise AttributeError( "start needs --group or --vm" )
+        return pyvbcc.vm.StartGroup( self._opt )
+
 
 class StopCommandLine( pyvbcc.command.CommonCommandLine ):
+    """
+        Shuts a group of VMs ( or one ) down, ACPI first and hard power off after --timeout.
+    """
     def __init__(self, argv, **opt ):
-        super().__init__( argv, ["h","d"], ["help","debug", "test"], **opt )
+        super().__init__( argv, ["h","d","g:","v:"], ["help","debug", "test", "group=", "vm=", "concurrency=", "timeout=", "hard"], **opt )
         self._validmap = {
+            pyvbcc.KEY_GROUP_NAME : { "match":["^/?[a-zA-Z0-9\-\._/]+$"] },
+            pyvbcc.KEY_VM_NAME :{ "match":["^[a-zA-Z0-9\-\._]+$"] },
+            pyvbcc.KEY_SYSTEM_CONCURRENCY : {"match":["^[0-9]+$"]},
+            pyvbcc.KEY_SYSTEM_TIMEOUT : {"match":["^[0-9]+(\.[0-9]+)?$"]},
+            pyvbcc.KEY_VM_OFFTYPE : {"match":["hard","soft"]},
             pyvbcc.KEY_SYSTEM_DEBUG : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_TEST : {"match":[".*"]},
             pyvbcc.KEY_SYSTEM_HELP : {"match":[".*"]}
         }
         self._validator = pyvbcc.validate.Validator( self._validmap, **opt )
 
+    def parse( self ):
+        for o, a in self._opts:
+            if a in ("-h", "--help"):
+                self._opt[ pyvbcc.KEY_SYSTEM_HELP ] = True
+            elif o in ("-d", "--debug"):
+                self._opt[ pyvbcc.KEY_SYSTEM_DEBUG ] = True
+            elif o in ("--test",):
+                self._opt[ pyvbcc.KEY_SYSTEM_TEST ] = True
+            elif o in ("-g", "--group"):
+                self._opt[ pyvbcc.KEY_GROUP_NAME ] = a
+            elif o in ("-v", "--vm"):
+                self._opt[ pyvbcc.KEY_VM_NAME ] = a
+            elif o in ("--concurrency",):
+                self._opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ] = a
+            elif o in ("--timeout",):
+                self._opt[ pyvbcc.KEY_SYSTEM_TIMEOUT ] = a
+            elif o in ("--hard",):
+                self._opt[ pyvbcc.KEY_VM_OFFTYPE ] = "hard"
+
+        ## Either this is true, or get exception
+        self._validator.validate( self._opt )
+
+        return self._opt
+
+    def action( self ):
+        if pyvbcc.KEY_GROUP_NAME not in self._opt and pyvbcc.KEY_VM_NAME not in self._opt:
+            raise AttributeError( "stop needs --group or --vm" )
+        return pyvbcc.vm.StopGroup( self._opt )
+
 
 class DestroyCommandLine( pyvbcc.command.CommonCommandLine ):
     def __init__(self, argv, **opt ):
@@ -3,17 +3,60 @@
 import os, sys, re
 import subprocess, shlex
 import getopt
+import asyncio
+import tempfile
+import time
 
 import pyvbcc
 import pyvbcc.utils
 import pyvbcc.validate
+import pyvbcc.cache
+import pyvbcc.emulator
+import pyvbcc.metrics
+import pyvbcc.trace
 
 from pprint import pprint
+
+## system.command "emulator" runs the VBoxManage stand-in of pyvbcc.emulator instead of VirtualBox
+EMULATOR=os.path.join( os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) ), "bin", "vboxmanage-emulator" )
+
+## VBoxManage sub-commands that take the target machine as a positional argument,
+## value is the number of positional arguments before the machine name.
+MACHINE_COMMANDS = {
+    "showvminfo": 0,
+    "modifyvm": 0,
+    "controlvm": 0,
+    "startvm": 0,
+    "unregistervm": 0,
+    "storagectl": 0,
+    "storageattach": 0,
+    "snapshot": 0,
+    "clonevm": 0,
+    "guestproperty": 1,
+    "guestcontrol": 0
+}
+
+## exit code reported by commands in test mode, they never start a process
+TEST_EXITCODE = 999
+
+## VirtualBox COM error names VBoxManage prints on stderr, e.g. "error: Details: code VBOX_E_INVALID_OBJECT_STATE (0x80bb0007)"
+RX_VBOX_ERROR = re.compile( r'\b((?:VBOX_E|NS_ERROR|E)_[A-Z_]+)\b' )
+
+## errors that only mean VBoxSVC or a session lock was busy, the same call succeeds a little later
+CONTENTION_ERRORS = ( "VBOX_E_INVALID_OBJECT_STATE", "VBOX_E_INVALID_SESSION_STATE", "VBOX_E_OBJECT_IN_USE" )
+RX_CONTENTION = re.compile( r'is already locked|lock.*timed? ?out|timed out waiting', re.IGNORECASE )
+
 class GenericCommandResult( object ):
-    def __init__( self, cmd, result, exitcode = 0, **opt ):
+    def __init__( self, cmd, result, exitcode = 0, errors = None, started = None, finished = None, walltime = None, bytes_out = None, bytes_err = None, **opt ):
         self._cmd = cmd
         self._result = result
         self._exitcode = exitcode
+        self._errors = errors if errors is not None else list()
+        self._started = started
+        self._finished = finished
+        self._walltime = walltime
+        self._bytes_out = bytes_out
+        self._bytes_err = bytes_err
         self._debug = False
         self._test = False
 
@@ -27,18 +70,109 @@ class GenericCommandResult( object ):
         return self._exitcode
 
     def command( self ):
-        return self._command
+        return self._cmd
+
+    def subcommand( self ):
+        """
+            VBoxManage sub-command, "modifyvm" for [ "VBoxManage", "modifyvm", ... ].
+        """
+        return self._cmd[1] if self._cmd is not None and len( self._cmd ) > 1 else None
 
     def result( self ):
         return self._result
 
+    def started( self ):
+        """
+            time.time() when the process was started, None if no process ran.
+        """
+        return self._started
+
+    def finished( self ):
+        return self._finished
+
+    def walltime( self ):
+        """
+            Seconds the process ran.
+        """
+        if self._walltime is not None:
+            return self._walltime
+        if self._started is not None and self._finished is not None:
+            return self._finished - self._started
+        return 0.0
+
+    def _size( self, lines ):
+        return sum( len( l.encode( "utf-8" ) ) + 1 for l in lines )
+
+    def bytes_out( self ):
+        """
+            Bytes VBoxManage wrote to stdout.
+        """
+        return self._bytes_out if self._bytes_out is not None else self._size( self._result or list() )
+
+    def bytes_err( self ):
+        return self._bytes_err if self._bytes_err is not None else self._size( self._errors )
+
+    def to_dict( self ):
+        return {
+            "command": self._cmd,
+            "exitcode": self._exitcode,
+            "errorcode": self.errorcode(),
+            "started": self._started,
+            "finished": self._finished,
+            "walltime": self.walltime(),
+            "bytes_out": self.bytes_out(),
+            "bytes_err": self.bytes_err(),
+            "errors": self._errors
+        }
+
+    def errors( self ):
+        """
+            stderr lines of the command.
+        """
+        return self._errors
+
+    def errorcode( self ):
+        """
+            First VirtualBox error name found on stderr, None if there is none.
+        """
+        for line in self._errors:
+            m = RX_VBOX_ERROR.search( line )
+            if m: return m.group(1)
+        return None
+
+    def contention( self ):
+        """
+            True when the command failed only because VBoxSVC or the machine lock was busy.
+        """
+        if self.ok():
+            return False
+        if self.errorcode() in CONTENTION_ERRORS:
+            return True
+        return any( RX_CONTENTION.search( line ) for line in self._errors )
+
+    def ok( self ):
+        return self._exitcode in ( 0, TEST_EXITCODE )
+
 class GenericCommand( object ):
+    ## Read-only commands set CACHE_TTL (seconds) and the CACHE_TAGS describing their output.
+    ## Other commands drop cached output tagged with any of INVALIDATES when they run, None drops everything.
+    CACHE_TTL = None
+    CACHE_TAGS = ()
+    INVALIDATES = None
 
     def __init__(self, cmd, **opt ):
         self._cmd = cmd
         self._debug = False
         self._test = False
         self._command = "VBoxManage"
+        self._exitcode = None
+        self._use_cache = True
+        self._errors = list()
+        self._started = None
+        self._finished = None
+        self._walltime = None
+        self._bytes_out = None
+        self._bytes_err = None
 
         if "debug" in opt and opt['debug'] in (True, False):
             self._debug = opt["debug"]
@@ -51,27 +185,246 @@ class GenericCommand( object ):
 
         if pyvbcc.KEY_SYSTEM_COMMAND in opt and opt[ pyvbcc.KEY_SYSTEM_COMMAND ] in ("VBoxManage", "VBoxHeadless"):
             self._command = opt[ pyvbcc.KEY_SYSTEM_COMMAND ]
+        elif pyvbcc.KEY_SYSTEM_COMMAND in opt and opt[ pyvbcc.KEY_SYSTEM_COMMAND ] == "emulator":
+            self._command = EMULATOR
+        elif pyvbcc.KEY_SYSTEM_COMMAND in opt and os.path.isfile( str( opt[ pyvbcc.KEY_SYSTEM_COMMAND ] ) ) and os.access( opt[ pyvbcc.KEY_SYSTEM_COMMAND ], os.X_OK ):
+            ## any executable speaking VBoxManage, e.g. /usr/local/bin/VBoxManage or bin/vboxmanage-emulator
+            self._command = opt[ pyvbcc.KEY_SYSTEM_COMMAND ]
 
+        ## cached output is not read when asked for fresh data, the fresh output is still cached
+        if pyvbcc.KEY_SYSTEM_CACHE in opt and opt[ pyvbcc.KEY_SYSTEM_CACHE ] in (False, "False", "false"):
+            self._use_cache = False
 
-    def run( self, **opt ):
-        result = list()
+
+    def machine( self ):
+        """
+            Name of the machine this command takes the session lock on, None if the command does not touch a machine.
+            Used by the executor to keep two calls from racing for the same machine lock.
+        """
+        cmd = self._cmd
+        if type( cmd ).__name__ == "str":
+            cmd = shlex.split( cmd )
+
+        if len( cmd ) < 2:
+            return None
+
+        if cmd[0] == "createvm" and "--name" in cmd:
+            idx = cmd.index( "--name" ) + 1
+            if idx < len( cmd ): return cmd[ idx ]
+
+        if cmd[0] in MACHINE_COMMANDS:
+            args = [ a for a in cmd[1:] if not a.startswith("--") ][ MACHINE_COMMANDS[ cmd[0] ]: ]
+            if len( args ) > 0:
+                return args[0]
+
+        return None
+
+    def _command_line( self ):
         cmd = self._cmd
 
         if type( cmd ).__name__ == "str":
             cmd = shlex.split( cmd )
 
-        cmd = [ self._command ] + cmd
+        return [ self._command ] + [ c for c in cmd if c != "" ]
+
+    def check( self ):
+        """
+            Raises before anything runs when the command cannot succeed, the default checks nothing.
+        """
+        pass
+
+    def _cache_key( self ):
+        key = " ".join( self._command_line() )
+        ## every emulator state file is a VirtualBox of its own, their answers must not mix
+        if os.path.basename( self._command ) == os.path.basename( EMULATOR ):
+            key += " @%s" % ( os.path.abspath( pyvbcc.emulator.state_file() ) )
+        return key
+
+    def _cached( self ):
+        if self._test or not self.CACHE_TTL or not self._use_cache:
+            return None
+
+        cache = pyvbcc.cache.GetCache()
+        if cache is None:
+            return None
+
+        lines = cache.get( self._cache_key() )
+        if lines is not None and self._debug: print( "cached: %s" % ( " ".join( self._command_line() ) ) )
+        return lines
+
+    def _completed( self, lines ):
+        if self._test:
+            return
+
+        cache = pyvbcc.cache.GetCache()
+        if cache is None:
+            return
+
+        if self.CACHE_TTL:
+            if self._exitcode == 0:
+                cache.put( self._cache_key(), lines, self.CACHE_TTL, self.CACHE_TAGS )
+        else:
+            cache.invalidate( self.INVALIDATES )
+
+    def _reset( self ):
+        self._exitcode = None
+        self._errors = list()
+        self._started = None
+        self._finished = None
+        self._walltime = None
+        self._bytes_out = None
+        self._bytes_err = None
+
+    def _result( self, cmd, lines, **opt ):
+        return GenericCommandResult( cmd, lines, self._exitcode, self._errors, self._started, self._finished, self._walltime, self._bytes_out, self._bytes_err, **opt )
+
+    def _errorlines( self, err ):
+        return [ line.lstrip().rstrip() for line in err.decode( "utf-8", "replace" ).splitlines() if line.strip() ]
+
+    def _span( self ):
+        if not pyvbcc.trace.Enabled():
+            return None
+        line = self._command_line()
+        sub = line[1] if len( line ) > 1 else line[0]
+        vm = self.machine()
+        return pyvbcc.trace.Begin( "%s %s" % ( sub, vm ) if vm else sub, "vboxmanage", lane=True, subcommand=sub, vm=vm, test=self._test )
+
+    def stream( self, **opt ):
+        """
+            Runs the command and yields its output lines as VBoxManage prints them.
+            The exit code is available from exitcode() once the generator is exhausted.
+        """
+        span = self._span()
+        try:
+            yield from self._stream( **opt )
+        finally:
+            pyvbcc.trace.End( span, exitcode=self._exitcode )
+
+    def _stream( self, **opt ):
+        cmd = self._command_line()
+        self._reset()
+        self.check()
+
+        cached = self._cached()
+        if cached is not None:
+            self._exitcode = 0
+            pyvbcc.metrics.GetRegistry().cached( cmd[1] if len( cmd ) > 1 else None )
+            yield from cached
+            return
 
         if self._debug: print( " ".join( cmd ) )
 
         if self._test:
-            return GenericCommandResult( cmd, result, 999, **opt )
+            self._exitcode = TEST_EXITCODE
+            return
+
+        lines = list()
+        nbytes = 0
+        ## stderr goes to a file, a pipe nobody reads while stdout streams could fill up and block VBoxManage
+        with tempfile.TemporaryFile() as errfd:
+            self._started = time.time()
+            start = time.monotonic()
+            prc = subprocess.Popen( cmd, universal_newlines=True, stdout=subprocess.PIPE, stderr=errfd )
+            try:
+                for line in prc.stdout:
+                    nbytes += len( line.encode( "utf-8" ) )
+                    line = line.lstrip().rstrip()
+                    lines.append( line )
+                    yield line
+            finally:
+                prc.stdout.close()
+                self._exitcode = prc.wait()
+                self._walltime = time.monotonic() - start
+                self._finished = time.time()
+
+            errfd.seek( 0 )
+            err = errfd.read()
+
+        self._errors = self._errorlines( err )
+        self._bytes_out = nbytes
+        self._bytes_err = len( err )
+        pyvbcc.metrics.Observe( self._result( cmd, lines ) )
+        self._completed( lines )
 
-        prc = subprocess.Popen( cmd, universal_newlines=True, stdout=subprocess.PIPE )
-        for line in prc.stdout.readlines():
+    def exitcode( self ):
+        return self._exitcode
+
+    def execute( self, **opt ):
+        result = list( self.stream( **opt ) )
+        return self._result( self._command_line(), result, **opt )
+
+    async def aexecute( self, **opt ):
+        span = self._span()
+        try:
+            return await self._aexecute( **opt )
+        finally:
+            pyvbcc.trace.End( span, exitcode=self._exitcode )
+
+    async def _aexecute( self, **opt ):
+        result = list()
+        cmd = self._command_line()
+        self._reset()
+        self.check()
+
+        cached = self._cached()
+        if cached is not None:
+            self._exitcode = 0
+            pyvbcc.metrics.GetRegistry().cached( cmd[1] if len( cmd ) > 1 else None )
+            return GenericCommandResult( cmd, cached, 0, **opt )
+
+        if self._debug: print( " ".join( cmd ) )
+
+        if self._test:
+            self._exitcode = TEST_EXITCODE
+            return GenericCommandResult( cmd, result, TEST_EXITCODE, **opt )
+
+        self._started = time.time()
+        start = time.monotonic()
+        prc = await asyncio.create_subprocess_exec( *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE )
+        ## communicate() returns once the process has exited, returncode is set by then
+        out, err = await prc.communicate()
+        self._walltime = time.monotonic() - start
+        self._finished = time.time()
+
+        for line in out.decode( "utf-8", "replace" ).splitlines():
             result.append( line.lstrip().rstrip() )
+        self._errors = self._errorlines( err )
+        self._bytes_out = len( out )
+        self._bytes_err = len( err )
+        self._exitcode = prc.returncode
+
+        res = self._result( cmd, result, **opt )
+        pyvbcc.metrics.Observe( res )
+        self._completed( result )
+
+        return res
+
+    def records( self, lines ):
+        """
+            Generator turning output lines into ( key, record ) pairs, one pair as soon as a record is complete.
+            Commands that parse listings override this, the default yields the lines by index.
+        """
+        for idx, line in enumerate( lines ):
+            yield idx, line
+
+    def iterate( self, **opt ):
+        """
+            Runs the command and yields parsed records while VBoxManage is still printing.
+        """
+        return self.records( self.stream( **opt ) )
+
+    def parse( self, result ):
+        """
+            Turns the raw command result into the commands return data. Commands that parse VBoxManage output override this,
+            the default returns the GenericCommandResult as is.
+        """
+        return result
 
-        return GenericCommandResult( cmd, result, prc.returncode, **opt )
+    def run( self, **opt ):
+        return self.parse( self.execute( **opt ) )
+
+    async def arun( self, **opt ):
+        return self.parse( await self.aexecute( **opt ) )
 
 
 
@@ -82,11 +435,14 @@ class CommonCommandLine( object ):
         self._test = False
         self._argv = argv
         self._short = ["hDc:"]+shrt
-        self._long = ["help","debug", "config="]+lng
+        self._long = ["help","debug", "config=", "trace=", "profile", "profile-mem"]+lng
         self._opt = dict()
         self._opts = None
         self._args = None
         self._validator = None
+        self._trace = None
+        self._profile = False
+        self._profile_mem = False
 
         if 'debug' in opt and opt['debug'] in (True, False):
             self._debug = opt['debug']
@@ -99,6 +455,24 @@ class CommonCommandLine( object ):
         except getopt.GetoptError as err:
             raise err
 
+        ## every sub-command takes --trace and --profile*, they are not options of the sub-command itself
+        for o, a in self._opts:
+            if o == "--trace": self._trace = a
+            elif o == "--profile": self._profile = True
+            elif o == "--profile-mem": self._profile_mem = True
+
+    def trace( self ):
+        """
+            File the run's trace goes to, None without --trace.
+        """
+        return self._trace
+
+    def profile( self ):
+        """
+            ( cpu, memory ) profiling asked for with --profile and --profile-mem.
+        """
+        return self._profile, self._profile_mem
+
     def get( self, key ):
         if key in self._opt:
             return self._opt[ key ]
@@ -1,4 +1,4 @@
- #!/usr/bin/env python3
+#!/usr/bin/env python3
 
 import os, sys, re
 import json
@@ -12,8 +12,64 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.records
 import pyvbcc.disk.commands
+import pyvbcc.disk.index
 
+def GetMediaIndex( opt ):
+    return pyvbcc.disk.index.GetMediaIndex( opt )
+
+def _selected( opt ):
+    index = GetMediaIndex( opt )
+    if opt[ pyvbcc.KEY_DISKS_NAME ] == "all":
+        return sorted( index.records().values(), key=lambda r: str( r.location ) )
+    return index.by_vm( opt[ pyvbcc.KEY_DISKS_NAME ] )
 
 def GetDiskInfo( opt ):
-    return pyvbcc.disk.commands.ListDiskCommand( opt[ pyvbcc.KEY_DISKS_NAME ] ).run()
+    res = { str( r.uuid ): r.to_dict() for r in _selected( opt ) }
+    if opt[ pyvbcc.KEY_DISKS_NAME ] == "all":
+        return res
+    return list( res.values() )
+
+def StreamDiskInfo( opt ):
+    return ( ( str( r.uuid ), r.to_dict() ) for r in _selected( opt ) )
+
+def AttachNeeded( cfg, opt ):
+    """
+        False when the index shows the medium on the same controller, port and device of the VM already.
+    """
+    index = GetMediaIndex( opt )
+    slot = pyvbcc.disk.index.slot_key( cfg[ pyvbcc.KEY_CONTROLLER_NAME ], cfg.get( pyvbcc.KEY_DISKS_PORT, 0 ), cfg.get( pyvbcc.KEY_DISKS_DEVICE, 0 ) )
+    return index.at( cfg[ pyvbcc.KEY_VM_NAME ], slot ) != os.path.normpath( cfg[ pyvbcc.KEY_DISKS_FILE ] )
+
+def CheckClose( cfg, opt, users = () ):
+    """
+        Raises RuntimeError when closemedium would fail on a medium the index knows: a VM other than users
+        still uses it, or differencing images hang off it. Returns the medium record, None when it is unknown.
+    """
+    index = GetMediaIndex( opt )
+    rec = index.by_location( cfg[ pyvbcc.KEY_DISKS_FILE ] )
+    if rec is None:
+        return None
+    used = [ v[ "name" ] for v in rec.vms if v[ "name" ] not in users ]
+    if len( used ) > 0:
+        raise RuntimeError( "Disk %s is in use by %s" % ( rec.location, ", ".join( used ) ) )
+    if len( index.children( rec.uuid ) ) > 0:
+        raise RuntimeError( "Disk %s has differencing children" % ( rec.location ) )
+    return rec
+
+def AttachDisk( cfg, opt ):
+    """
+        storageattach unless the medium is on that slot of the VM already, returns the result or None when skipped.
+    """
+    if not AttachNeeded( cfg, opt ):
+        return None
+    return pyvbcc.disk.commands.AttachDiskCommand( cfg, **opt ).run()
+
+def CloseDisk( cfg, opt ):
+    """
+        closemedium for a medium no VM uses, returns the result or None when the medium is not registered.
+    """
+    if CheckClose( cfg, opt ) is None:
+        return None
+    return pyvbcc.disk.commands.CloseDiskCommand( cfg, **opt ).run()
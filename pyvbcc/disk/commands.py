@@ -12,12 +12,15 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.records
+import pyvbcc.disk.index
 
 
 ###########################################################################################################################
 ## Basic controller commands
 ###########################################################################################################################
 class CreateControllerCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
 
     def __init__( self, cfg = {}, **opt ):
         self._cfg = cfg
@@ -58,10 +61,25 @@ class CreateControllerCommand( pyvbcc.command.GenericCommand ):
             "--hostiocache", self._iocache
         ], **opt )
 
+class ModifyControllerCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
+
+    def __init__( self, cfg = {}, **opt ):
+        if pyvbcc.KEY_VM_NAME not in cfg or pyvbcc.KEY_CONTROLLER_NAME not in cfg or pyvbcc.KEY_CONTROLLER_PCOUNT not in cfg:
+            raise AttributeError("Missing vm name, controller name or port count")
+
+        super().__init__( [
+            "storagectl", cfg[ pyvbcc.KEY_VM_NAME ],
+            "--name", cfg[ pyvbcc.KEY_CONTROLLER_NAME ],
+            "--portcount", cfg[ pyvbcc.KEY_CONTROLLER_PCOUNT ]
+        ], **opt )
+
 ###########################################################################################################################
 ## Basic dock management commands
 ###########################################################################################################################
 class CreateDiskCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "hdds", )
+
     def __init__( self, cfg = {}, **opt ):
         self._cfg = cfg
         self._validmap = {
@@ -89,7 +107,28 @@ class CreateDiskCommand( pyvbcc.command.GenericCommand ):
 
 
 
+class ResizeDiskCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "hdds", )
+
+    def __init__( self, cfg = {}, **opt ):
+        self._cfg = cfg
+        self._validmap = {
+            pyvbcc.KEY_DISKS_FILE: { "match": ["^[a-zA-Z0-9\-\._/ ]+$"], "mandatory":True },
+            pyvbcc.KEY_DISKS_SIZE: { "match": ["^[0-9]+$"], "mandatory":True }
+        }
+
+        opt["strict"] = False
+        pyvbcc.validate.Validator( self._validmap, **opt ).validate( self._cfg )
+
+        super().__init__( [
+            "modifymedium", "disk", self._cfg[ pyvbcc.KEY_DISKS_FILE ],
+            "--resize", self._cfg[ pyvbcc.KEY_DISKS_SIZE ]
+        ], **opt )
+
+
 class CloseDiskCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "hdds", )
+
     def __init__( self, cfg = {}, **opt ):
 
         self._cfg = cfg
@@ -102,20 +141,28 @@ class CloseDiskCommand( pyvbcc.command.GenericCommand ):
         pyvbcc.validate.Validator( self._validmap, **opt ).validate( self._cfg )
 
         self._delete = True
-        if self._cfg[ pyvbcc.KEY_DISKS_DELETE ]:
-            self._delete = self._cfg[ pyvbcc.KEY_DISKS_DELETE ]
+        if pyvbcc.KEY_DISKS_DELETE in self._cfg:
+            self._delete = self._cfg[ pyvbcc.KEY_DISKS_DELETE ] in ( True, "True" )
 
         del_str = ""
         if self._delete:
             del_str = "--delete"
 
         super().__init__( [
-            "closemdium", "disk", self._cfg[ pyvbcc.KEY_DISKS_FILE ],
+            "closemedium", "disk", self._cfg[ pyvbcc.KEY_DISKS_FILE ],
             del_str
         ], **opt )
 
+    def parse( self, result ):
+        ## a failed closemedium changed nothing, the media index stays as it is
+        if result.ok():
+            pyvbcc.disk.index.Closed( self._cfg )
+        return result
+
 
 class AttachDiskCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "hdds", "vms" )
+
     def __init__( self, cfg = {}, **opt ):
 
         self._cfg = cfg
@@ -151,41 +198,89 @@ class AttachDiskCommand( pyvbcc.command.GenericCommand ):
 
         super().__init__( params, **opt )
 
+    def parse( self, result ):
+        if result.ok():
+            pyvbcc.disk.index.Attached( self._cfg )
+        return result
+
 
 ###########################################################################################################################
 ## Get info
 ###########################################################################################################################
+RX_SPACE = re.compile( r"\s+" )
+## "vm1 (UUID: ...), vm2 (UUID: ...) [snapshot (UUID: ...)]", one match per VM
+RX_INUSEBY = re.compile( r"\s*(.+?) \(UUID: ([0-9a-fA-F-]+)\)(?: \[[^\]]*\])?(?:,|$)" )
+
+def _parent( value ):
+    return None if value == "base" else pyvbcc.records.to_uuid( value )
+
+## list hdds --long labels ( lowercased, no spaces ) to DiskRecord fields with their converter
+DISK_FIELDS = {
+    "uuid": ( "uuid", pyvbcc.records.to_uuid ),
+    "parentuuid": ( "parent", _parent ),
+    "state": ( "state", None ),
+    "type": ( "type", None ),
+    "location": ( "location", None ),
+    "storageformat": ( "format", None ),
+    "capacity": ( "capacity", pyvbcc.records.to_bytes ),
+    "sizeondisk": ( "size", pyvbcc.records.to_bytes ),
+    "encryption": ( "encryption", None )
+}
+
 class ListDiskCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 30
+    CACHE_TAGS = ( "hdds", )
+
     def __init__( self, vm = None, **opt ):
         super().__init__( [ "list", "hdds", "--long" ], **opt )
         self._vm = vm
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        item = dict()
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r":", line )
+    def _selected( self, item ):
+        if self._vm == "all":
+            return True
+        return self._vm in [ v[ 'name' ] for v in item.vms ]
+
+    def records( self, lines ):
+        """
+            Yields ( uuid, DiskRecord ) per medium.
+        """
+        item = None
+        key = None
+        for line in lines:
+            line = line.replace( "\"", "" )
+            nldata = line.split( ":", 1 )
 
             if len( nldata ) > 1:
-                key = re.sub( r"\s+", "", nldata[0].lstrip().rstrip().lower() )
+                label = RX_SPACE.sub( "", nldata[0].lstrip().rstrip().lower() )
                 val = nldata[1].lstrip().rstrip()
 
-                if key == "inusebyvms":
-                    linex = re.sub( r"\s+", "", line )
-                    m = re.compile("\S+:(\S+)\(UUID:(\S+)\)").match( linex )
-                    val = {"name": m.group(1), "uuid":m.group(2)}
+                if label == "uuid":
+                    if item is not None and self._selected( item ): yield key, item
+                    item = pyvbcc.records.DiskRecord( val )
+                    key = val
+                    continue
+
+                if item is None:
+                    continue
+
+                if label == "inusebyvms":
+                    for m in RX_INUSEBY.finditer( val ):
+                        item.vms.append( { "name": m.group(1), "uuid": pyvbcc.records.to_uuid( m.group(2) ) } )
+                elif label in DISK_FIELDS:
+                    field = DISK_FIELDS[ label ]
+                    setattr( item, field[0], field[1]( val ) if field[1] else val )
+                else:
+                    item.properties[ label ] = val
 
-                if re.match( "uuid", key ) and len( item ) > 0:
-                    data[ item[ 'uuid' ] ] = item
-                    item = dict()
-                item[ key ] = val
+            if len( line ) == 0 and item is not None:
+                if self._selected( item ): yield key, item
+                item = None
 
-            if len( line ) == 0 and len( item ) > 0:
-                data[ item['uuid'] ] = item
+        if item is not None and self._selected( item ):
+            yield key, item
 
+    def parse( self, result ):
         if self._vm == "all":
-            return data
+            return dict( self.records( result.result() ) )
 
-        return [ data[i] for i in data if 'inusebyvms' in data[i] and data[i]['inusebyvms']['name'] == self._vm ]
+        return [ x[1] for x in self.records( result.result() ) ]
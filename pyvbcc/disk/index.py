@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.records
+import pyvbcc.disk.commands
+import pyvbcc.vm.commands
+
+"""
+    Registry of every medium known to VirtualBox, built from one list hdds --long pass.
+
+    Media are looked up by UUID, by file location, by the VMs using them ( a medium shared by several
+    machines is listed under each of them ) and along the parent/child chain of differencing images.
+    What sits on a controller port of a VM comes from its showvminfo, read the first time it is asked for.
+
+    AttachDiskCommand and CloseDiskCommand keep the process wide index ( GetMediaIndex() ) in step when they
+    succeed, whoever runs them.
+"""
+
+_index = None
+
+def slot_key( controller, port = 0, device = 0 ):
+    """
+        "SATA", 1, 0 -> "SATA-1-0" as showvminfo names attachments.
+    """
+    return "%s-%s-%s" % ( controller, port, device )
+
+class MediaIndex( object ):
+
+    def __init__( self, **opt ):
+        self._debug = False
+        self._opt = opt
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+        self.clear()
+
+    def clear( self ):
+        self._media = dict()
+        self._locations = dict()
+        self._vms = dict()
+        self._children = dict()
+        ## { vm name: { slot: location } } of the VMs looked at so far
+        self._slots = dict()
+        self._loaded = False
+
+    def _location( self, path ):
+        return os.path.normpath( path ) if path else None
+
+    def _vm_keys( self, vm ):
+        return [ str( k ) for k in ( vm.get( "name" ), vm.get( "uuid" ) ) if k is not None ]
+
+    def add( self, rec ):
+        if rec.uuid in self._media:
+            self.remove( rec.uuid )
+
+        self._media[ rec.uuid ] = rec
+        if rec.location:
+            self._locations[ self._location( rec.location ) ] = rec
+        for vm in rec.vms:
+            for k in self._vm_keys( vm ):
+                self._vms.setdefault( k, dict() )[ rec.uuid ] = rec
+        if rec.parent is not None:
+            self._children.setdefault( rec.parent, dict() )[ rec.uuid ] = rec
+
+    def remove( self, uuid ):
+        rec = self._media.pop( pyvbcc.records.to_uuid( uuid ), None )
+        if rec is None:
+            return None
+
+        if rec.location and self._locations.get( self._location( rec.location ) ) is rec:
+            del self._locations[ self._location( rec.location ) ]
+        for vm in rec.vms:
+            for k in self._vm_keys( vm ):
+                if k in self._vms: self._vms[ k ].pop( rec.uuid, None )
+        if rec.parent is not None and rec.parent in self._children:
+            self._children[ rec.parent ].pop( rec.uuid, None )
+        return rec
+
+    def load( self, records = None ):
+        """
+            Rebuilds the index from ( uuid, DiskRecord ) pairs, from list hdds --long if none are given.
+        """
+        self.clear()
+        if records is None:
+            records = pyvbcc.disk.commands.ListDiskCommand( "all", **self._opt ).iterate()
+
+        for uuid, rec in records:
+            self.add( rec )
+
+        self._loaded = True
+        return self
+
+    def loaded( self ):
+        return self._loaded
+
+    def _ensure( self ):
+        if not self._loaded:
+            self.load()
+
+    def get( self, key ):
+        """
+            Medium by UUID or file location, None if unknown.
+        """
+        self._ensure()
+        uuid = pyvbcc.records.to_uuid( key )
+        if uuid is not None and uuid in self._media:
+            return self._media[ uuid ]
+        return self._locations.get( self._location( key ) )
+
+    def by_uuid( self, uuid ):
+        self._ensure()
+        return self._media.get( pyvbcc.records.to_uuid( uuid ) )
+
+    def by_location( self, path ):
+        self._ensure()
+        return self._locations.get( self._location( path ) )
+
+    def by_vm( self, vm ):
+        """
+            Media used by a VM given by name or UUID.
+        """
+        self._ensure()
+        return list( self._vms.get( str( vm ), dict() ).values() )
+
+    def children( self, uuid ):
+        self._ensure()
+        return list( self._children.get( pyvbcc.records.to_uuid( uuid ), dict() ).values() )
+
+    def chain( self, uuid ):
+        """
+            Differencing chain of a medium, from its base image down to the medium itself.
+        """
+        self._ensure()
+        result = list()
+        rec = self._media.get( pyvbcc.records.to_uuid( uuid ) )
+        while rec is not None and rec not in result:
+            result.insert( 0, rec )
+            rec = self._media.get( rec.parent ) if rec.parent is not None else None
+        return result
+
+    def slots( self, vm ):
+        """
+            { slot: medium location } of a VM by name, from showvminfo the first time.
+        """
+        if vm not in self._slots:
+            info = pyvbcc.vm.commands.InfoVmCommand( vm, **self._opt ).run()
+            storage = getattr( info, "storage", dict() )
+            self._slots[ vm ] = { slot: self._location( e[ "medium" ] ) for slot, e in storage.items() if e.get( "medium" ) not in ( None, "none", "emptydrive" ) }
+        return self._slots[ vm ]
+
+    def at( self, vm, slot ):
+        """
+            Location of the medium on a slot of the VM, None when the slot is empty.
+        """
+        return self.slots( vm ).get( slot )
+
+    def ports( self, vm, controller ):
+        """
+            Ports of a controller of the VM that hold a medium, sorted.
+        """
+        ports = set()
+        for slot in self.slots( vm ):
+            ctl, port, device = slot.rsplit( "-", 2 )
+            if ctl == controller: ports.add( int( port ) )
+        return sorted( ports )
+
+    def attach( self, key, vm, slot = None ):
+        """
+            Records that a VM ( by name ) now uses a medium, on slot when given.
+        """
+        if slot is not None and vm in self._slots:
+            self._slots[ vm ][ slot ] = self._location( key )
+        rec = self.get( key )
+        if rec is None:
+            return None
+        if vm not in [ v.get( "name" ) for v in rec.vms ]:
+            rec.vms.append( { "name": vm, "uuid": None } )
+            self._vms.setdefault( vm, dict() )[ rec.uuid ] = rec
+        return rec
+
+    def records( self ):
+        self._ensure()
+        return dict( self._media )
+
+    def __len__( self ):
+        return len( self._media )
+
+
+def GetMediaIndex( opt = {} ):
+    global _index
+    if _index is None:
+        _index = MediaIndex( **opt )
+    return _index
+
+def Attached( cfg ):
+    """
+        Updates the index after a successful storageattach of cfg, a medium it did not know makes it read everything again.
+    """
+    if _index is None or not _index.loaded():
+        return
+    slot = slot_key( cfg[ pyvbcc.KEY_CONTROLLER_NAME ], cfg.get( pyvbcc.KEY_DISKS_PORT, 0 ), cfg.get( pyvbcc.KEY_DISKS_DEVICE, 0 ) )
+    if _index.attach( cfg[ pyvbcc.KEY_DISKS_FILE ], cfg[ pyvbcc.KEY_VM_NAME ], slot ) is None and cfg.get( pyvbcc.KEY_DISKS_TYPE, "hdd" ) == "hdd":
+        _index.clear()
+
+def Closed( cfg ):
+    """
+        Updates the index after a successful closemedium of cfg.
+    """
+    if _index is None or not _index.loaded():
+        return
+    rec = _index.by_location( cfg[ pyvbcc.KEY_DISKS_FILE ] )
+    if rec is not None:
+        _index.remove( rec.uuid )
+
+
+if __name__ == "__main__":
+    pass
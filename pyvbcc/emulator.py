@@ -0,0 +1,780 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import time
+import uuid
+import fcntl
+import random
+import fnmatch
+import contextlib
+
+"""
+    Stand-in for VBoxManage, for benchmarks and tests on hosts without VirtualBox.
+
+    bin/vboxmanage-emulator runs main() once per call, like the real binary. VMs, media and networks live in
+    a JSON file every call reads and writes under an exclusive lock, which also plays the part of VBoxSVC
+    serialising the work. The output of the supported sub-commands follows what VBoxManage prints closely
+    enough for the pyvbcc parsers, errors go to stderr in the "VBoxManage: error:" format with exit code 1.
+
+    Select it with system.command ( "emulator" or the path of bin/vboxmanage-emulator ). Environment:
+
+    PYVBCC_EMULATOR_STATE       state file ( default ~/.cache/pyvbcc/emulator.json )
+    PYVBCC_EMULATOR_LATENCY     seconds each call takes outside the lock ( default 0 )
+    PYVBCC_EMULATOR_SVC         seconds each call holds the lock, serialised work ( default 0 )
+    PYVBCC_EMULATOR_JITTER      random extra latency, fraction of the latency ( default 0 )
+    PYVBCC_EMULATOR_CONTENTION  probability a machine call fails with a session lock error ( default 0 )
+    PYVBCC_EMULATOR_BOOT        seconds from startvm until the guest reports its IP ( default 0 )
+    PYVBCC_EMULATOR_SHUTDOWN    seconds from acpipowerbutton until the VM is powered off ( default 0 )
+    PYVBCC_EMULATOR_ACPI_IGNORE VM name patterns whose guests ignore acpipowerbutton, comma separated
+"""
+
+DEF_STATE_FILE=os.path.join( os.path.expanduser( "~" ), ".cache", "pyvbcc", "emulator.json" )
+
+API_VERSION="7_0"
+VERSION="7.0.99r000000"
+
+OSTYPES = [
+    ( "Other", "Other/Unknown", "Other", "Other", False ),
+    ( "Other_64", "Other/Unknown (64-bit)", "Other", "Other", True ),
+    ( "Linux_64", "Other Linux (64-bit)", "Linux", "Linux", True ),
+    ( "RedHat_64", "Red Hat (64-bit)", "Linux", "Linux", True ),
+    ( "Fedora_64", "Fedora (64-bit)", "Linux", "Linux", True ),
+    ( "Oracle_64", "Oracle (64-bit)", "Linux", "Linux", True ),
+    ( "Debian_64", "Debian (64-bit)", "Linux", "Linux", True ),
+    ( "Ubuntu_64", "Ubuntu (64-bit)", "Linux", "Linux", True ),
+    ( "OpenSUSE_64", "openSUSE (64-bit)", "Linux", "Linux", True ),
+    ( "FreeBSD_64", "FreeBSD (64-bit)", "BSD", "BSD", True ),
+    ( "Windows10_64", "Windows 10 (64-bit)", "Windows", "Microsoft Windows", True ),
+    ( "Windows2019_64", "Windows 2019 (64-bit)", "Windows", "Microsoft Windows", True )
+]
+OSTYPE_DESC = { o[0]: o[1] for o in OSTYPES }
+
+## sub-commands that take the session lock of the machine named by their first argument
+LOCKING = ( "modifyvm", "storagectl", "storageattach", "startvm", "controlvm", "unregistervm", "snapshot" )
+
+## options that never take a value
+FLAGS = ( "long", "sorted", "register", "machinereadable", "details", "delete", "enable", "disable", "remove", "fail-on-timeout", "live" )
+
+ERRORS = {
+    "VBOX_E_OBJECT_NOT_FOUND": "0x80bb0001",
+    "VBOX_E_INVALID_VM_STATE": "0x80bb0002",
+    "VBOX_E_FILE_ERROR": "0x80bb0004",
+    "VBOX_E_INVALID_OBJECT_STATE": "0x80bb0007",
+    "VBOX_E_OBJECT_IN_USE": "0x80bb000c",
+    "E_INVALIDARG": "0x80070057"
+}
+
+
+class EmulatorError( Exception ):
+
+    def __init__( self, message, code = "E_INVALIDARG", component = "VirtualBoxWrap", interface = "IVirtualBox" ):
+        super().__init__( message )
+        self.code = code
+        self.component = component
+        self.interface = interface
+
+    def lines( self ):
+        return [ "VBoxManage: error: %s" % ( self.args[0] ),
+                 "VBoxManage: error: Details: code %s (%s), component %s, interface %s, callee nsISupports" % (
+                     self.code, ERRORS.get( self.code, "0x80004005" ), self.component, self.interface ) ]
+
+
+def _float_env( key, default = 0.0 ):
+    try:
+        return float( os.environ.get( key, default ) )
+    except ValueError:
+        return default
+
+def _options( args ):
+    """
+        [ "--cpus", "2", "--register" ] -> { "cpus": "2", "register": True }, positional arguments separately.
+    """
+    opts = dict()
+    positional = list()
+    idx = 0
+    while idx < len( args ):
+        a = args[ idx ]
+        if a.startswith( "--" ):
+            key = a[2:]
+            if "=" in key:
+                key, value = key.split( "=", 1 )
+                opts[ key ] = value
+            elif key not in FLAGS and idx + 1 < len( args ) and not args[ idx + 1 ].startswith( "--" ):
+                opts[ key ] = args[ idx + 1 ]
+                idx += 1
+            else:
+                opts[ key ] = True
+        else:
+            positional.append( a )
+        idx += 1
+    return opts, positional
+
+def _now():
+    now = time.time_ns()
+    return "%s.%09d" % ( time.strftime( "%Y-%m-%dT%H:%M:%S", time.gmtime( now // 10**9 ) ), now % 10**9 )
+
+
+def state_file():
+    """
+        File the emulator keeps its VMs, media and networks in.
+    """
+    return os.environ.get( "PYVBCC_EMULATOR_STATE" ) or DEF_STATE_FILE
+
+class Emulator( object ):
+
+    def __init__( self, filename = None ):
+        self._filename = filename or state_file()
+        self._data = None
+        self._wait = None
+        self.out = list()
+
+    def _empty( self ):
+        return { "vms": dict(), "media": dict(), "natnets": dict(),
+                 "hostonlyifs": { "vboxnet0": { "ip": "192.168.56.1", "netmask": "255.255.255.0" } } }
+
+    def machinefolder( self ):
+        return os.path.join( os.path.dirname( os.path.abspath( self._filename ) ), "VirtualBox VMs" )
+
+    @contextlib.contextmanager
+    def locked( self ):
+        os.makedirs( os.path.dirname( os.path.abspath( self._filename ) ), exist_ok=True )
+        with open( self._filename + ".lock", "a+" ) as lock:
+            fcntl.flock( lock, fcntl.LOCK_EX )
+            try:
+                self._data = self._empty()
+                if os.path.exists( self._filename ) and os.path.getsize( self._filename ) > 0:
+                    with open( self._filename, "r" ) as fd:
+                        self._data = json.load( fd )
+                yield self._data
+            finally:
+                fcntl.flock( lock, fcntl.LOCK_UN )
+
+    def save( self ):
+        tmpfile = "%s.%s.tmp" % ( self._filename, os.getpid() )
+        with open( tmpfile, "w" ) as fd:
+            json.dump( self._data, fd )
+        os.replace( tmpfile, self._filename )
+
+    def print( self, line = "" ):
+        self.out.append( line )
+
+    ###################################################################################################################
+    ## Lookups
+    ###################################################################################################################
+    def _vm( self, key ):
+        vms = self._data[ "vms" ]
+        if key in vms:
+            return vms[ key ]
+        for vm in vms.values():
+            if vm[ "uuid" ] == key:
+                return vm
+        raise EmulatorError( "Could not find a registered machine named '%s'" % ( key ), "VBOX_E_OBJECT_NOT_FOUND" )
+
+    def _medium( self, key ):
+        media = self._data[ "media" ]
+        if key in media:
+            return media[ key ]
+        path = os.path.normpath( key )
+        for m in media.values():
+            if m[ "location" ] == path:
+                return m
+        return None
+
+    def _settle( self, vm ):
+        ## state changes that take time happen lazily, when somebody looks
+        ## a guest shutting down on ACPI stays running until it powers itself off
+        if vm[ "state" ] == "running" and vm.get( "stop_at" ) and time.time() >= vm[ "stop_at" ]:
+            vm[ "state" ] = "poweroff"
+            vm[ "state_since" ] = _now()
+            vm[ "guestprops" ] = dict()
+            vm.pop( "stop_at" )
+        if vm[ "state" ] == "running" and vm.get( "ip" ) and time.time() >= vm.get( "boot_at", 0 ):
+            vm[ "guestprops" ][ "/VirtualBox/GuestInfo/Net/0/V4/IP" ] = vm[ "ip" ]
+            vm[ "guestprops" ][ "/VirtualBox/GuestInfo/OS/LoggedInUsers" ] = "0"
+
+    ###################################################################################################################
+    ## list
+    ###################################################################################################################
+    def list( self, args ):
+        opts, what = _options( args )
+        what = what[0] if len( what ) > 0 else ""
+        vms = sorted( self._data[ "vms" ].values(), key=lambda v: v[ "name" ].lower() )
+        for vm in vms: self._settle( vm )
+
+        if what in ( "vms", "runningvms" ) and opts.get( "long" ):
+            for vm in vms:
+                if what == "vms" or vm[ "state" ] in ( "running", "paused" ):
+                    self._long( vm )
+                    self.print()
+        elif what in ( "vms", "runningvms" ):
+            for vm in vms:
+                if what == "vms" or vm[ "state" ] in ( "running", "paused" ):
+                    self.print( "\"%s\" {%s}" % ( vm[ "name" ], vm[ "uuid" ] ) )
+        elif what == "hdds":
+            for m in self._data[ "media" ].values():
+                self._hdd( m )
+        elif what == "natnets":
+            for name, net in sorted( self._data[ "natnets" ].items() ):
+                self.print( "NetworkName:    %s" % ( name ) )
+                self.print( "Network:        %s" % ( net[ "network" ] ) )
+                self.print( "Gateway:        %s" % ( net[ "network" ].rsplit( ".", 1 )[0] + ".1" ) )
+                self.print( "DHCP Server:    %s" % ( "Yes" if net[ "dhcp" ] else "No" ) )
+                self.print( "IPv6:           %s" % ( "Yes" if net[ "ipv6" ] else "No" ) )
+                self.print( "Enabled:        %s" % ( "Yes" if net[ "enabled" ] else "No" ) )
+                self.print()
+        elif what == "hostonlyifs":
+            for name, net in sorted( self._data[ "hostonlyifs" ].items() ):
+                self.print( "Name:            %s" % ( name ) )
+                self.print( "DHCP:            Disabled" )
+                self.print( "IPAddress:       %s" % ( net[ "ip" ] ) )
+                self.print( "NetworkMask:     %s" % ( net[ "netmask" ] ) )
+                self.print( "HardwareAddress: 0a:00:27:00:00:00" )
+                self.print( "Status:          Up" )
+                self.print()
+        elif what == "intnets":
+            names = set()
+            for vm in vms:
+                for nic in vm[ "nics" ].values():
+                    if nic.get( "type" ) == "intnet" and nic.get( "network" ): names.add( nic[ "network" ] )
+            for name in sorted( names ):
+                self.print( "Name:        %s" % ( name ) )
+                self.print()
+        elif what == "bridgedifs":
+            self.print( "Name:            eth0" )
+            self.print( "IPAddress:       10.0.0.2" )
+            self.print( "NetworkMask:     255.255.255.0" )
+            self.print( "HardwareAddress: 52:54:00:00:00:01" )
+            self.print( "Status:          Up" )
+            self.print()
+        elif what == "ostypes":
+            for o in OSTYPES:
+                self.print( "ID:          %s" % ( o[0] ) )
+                self.print( "Description: %s" % ( o[1] ) )
+                self.print( "Family ID:   %s" % ( o[2] ) )
+                self.print( "Family Desc: %s" % ( o[3] ) )
+                self.print( "64 bit:      %s" % ( "true" if o[4] else "false" ) )
+                self.print()
+        elif what == "systemproperties":
+            self.print( "API version:                     %s" % ( API_VERSION ) )
+            self.print( "Default machine folder:          %s" % ( self.machinefolder() ) )
+            self.print( "Maximum guest RAM size:          2097152 Megabytes" )
+            self.print( "Maximum guest CPU count:         64" )
+        elif what == "hostinfo":
+            self.print( "Host Information:" )
+            self.print( "Processor count: 8" )
+            self.print( "Memory size: 32768 MByte" )
+            self.print( "Operating system: Linux" )
+        elif what == "groups":
+            groups = set( [ "/" ] )
+            for vm in vms: groups.update( vm[ "groups" ] )
+            for g in sorted( groups ):
+                self.print( "\"%s\"" % ( g ) )
+        else:
+            raise EmulatorError( "Unknown list type '%s'" % ( what ) )
+
+    def _hdd( self, m ):
+        self.print( "UUID:           %s" % ( m[ "uuid" ] ) )
+        self.print( "Parent UUID:    %s" % ( m.get( "parent" ) or "base" ) )
+        self.print( "State:          created" )
+        self.print( "Type:           normal (%s)" % ( "differencing" if m.get( "parent" ) else "base" ) )
+        self.print( "Location:       %s" % ( m[ "location" ] ) )
+        self.print( "Storage format: %s" % ( m[ "format" ].upper() ) )
+        self.print( "Capacity:       %s MBytes" % ( m[ "capacity" ] ) )
+        self.print( "Encryption:     disabled" )
+        if len( m[ "vms" ] ) > 0:
+            used = [ "%s (UUID: %s)" % ( n, self._data[ "vms" ][ n ][ "uuid" ] ) for n in m[ "vms" ] if n in self._data[ "vms" ] ]
+            self.print( "In use by VMs:  %s" % ( ", ".join( used ) ) )
+        self.print()
+
+    def _long( self, vm ):
+        states = { "poweroff": "powered off", "running": "running", "saved": "saved", "paused": "paused" }
+        self.print( "Name:                        %s" % ( vm[ "name" ] ) )
+        self.print( "Groups:                      %s" % ( ",".join( vm[ "groups" ] ) ) )
+        self.print( "Guest OS:                    %s" % ( OSTYPE_DESC.get( vm[ "ostype" ], vm[ "ostype" ] ) ) )
+        self.print( "UUID:                        %s" % ( vm[ "uuid" ] ) )
+        self.print( "Config file:                 %s" % ( vm[ "cfgfile" ] ) )
+        self.print( "Memory size                  %sMB" % ( vm[ "memory" ] ) )
+        self.print( "Number of CPUs:              %s" % ( vm[ "cpus" ] ) )
+        self.print( "State:                       %s (since %s)" % ( states.get( vm[ "state" ], vm[ "state" ] ), vm[ "state_since" ] ) )
+        for idx, ctl in enumerate( vm[ "controllers" ] ):
+            self.print( "Storage Controller Name (%s):            %s" % ( idx, ctl[ "name" ] ) )
+            self.print( "Storage Controller Type (%s):            %s" % ( idx, ctl[ "type" ] ) )
+            self.print( "Storage Controller Port Count (%s):      %s" % ( idx, ctl[ "portcount" ] ) )
+        for slot, location in sorted( vm[ "attachments" ].items() ):
+            ctl, port, device = slot.rsplit( "-", 2 )
+            m = self._medium( location )
+            self.print( "%s (%s, %s): %s (UUID: %s)" % ( ctl, port, device, location, m[ "uuid" ] if m else "" ) )
+        for idx in range( 1, 5 ):
+            nic = vm[ "nics" ].get( str( idx ) )
+            if nic is None or nic.get( "type", "none" ) == "none":
+                self.print( "NIC %s:                       disabled" % ( idx ) )
+                continue
+            attachment = { "nat": "NAT", "natnetwork": "NAT Network '%s'", "hostonly": "Host-only Interface '%s'",
+                           "intnet": "Internal Network '%s'", "bridged": "Bridged Interface '%s'" }.get( nic[ "type" ], nic[ "type" ] )
+            if "%s" in attachment: attachment = attachment % ( nic.get( "network", "" ) )
+            self.print( "NIC %s:                       MAC: %s, Attachment: %s, Cable connected: on, Trace: off (file: none), Type: %s" % (
+                idx, nic.get( "mac", "" ), attachment, nic.get( "nictype", "82540EM" ) ) )
+
+    ###################################################################################################################
+    ## VMs
+    ###################################################################################################################
+    def showvminfo( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._settle( vm )
+        if not opts.get( "machinereadable" ):
+            self._long( vm )
+            return
+
+        self.print( "name=\"%s\"" % ( vm[ "name" ] ) )
+        self.print( "groups=\"%s\"" % ( ",".join( vm[ "groups" ] ) ) )
+        self.print( "ostype=\"%s\"" % ( OSTYPE_DESC.get( vm[ "ostype" ], vm[ "ostype" ] ) ) )
+        self.print( "UUID=\"%s\"" % ( vm[ "uuid" ] ) )
+        self.print( "CfgFile=\"%s\"" % ( vm[ "cfgfile" ] ) )
+        self.print( "memory=%s" % ( vm[ "memory" ] ) )
+        self.print( "cpus=%s" % ( vm[ "cpus" ] ) )
+        self.print( "VMState=\"%s\"" % ( vm[ "state" ] ) )
+        self.print( "VMStateChangeTime=\"%s\"" % ( vm[ "state_since" ] ) )
+        for idx in range( 1, 5 ):
+            self.print( "boot%s=\"%s\"" % ( idx, vm[ "boot" ].get( str( idx ), "none" ) ) )
+        for idx, ctl in enumerate( vm[ "controllers" ] ):
+            self.print( "storagecontrollername%s=\"%s\"" % ( idx, ctl[ "name" ] ) )
+            self.print( "storagecontrollertype%s=\"%s\"" % ( idx, ctl[ "type" ] ) )
+            self.print( "storagecontrollerportcount%s=\"%s\"" % ( idx, ctl[ "portcount" ] ) )
+            self.print( "storagecontrollerbootable%s=\"%s\"" % ( idx, ctl[ "bootable" ] ) )
+        for slot, location in sorted( vm[ "attachments" ].items() ):
+            ctl, port, device = slot.rsplit( "-", 2 )
+            m = self._medium( location )
+            self.print( "\"%s\"=\"%s\"" % ( slot, location ) )
+            if m: self.print( "\"%s-ImageUUID-%s-%s\"=\"%s\"" % ( ctl, port, device, m[ "uuid" ] ) )
+        for idx in range( 1, 5 ):
+            nic = vm[ "nics" ].get( str( idx ), dict() )
+            kind = nic.get( "type", "none" )
+            self.print( "nic%s=\"%s\"" % ( idx, kind ) )
+            if kind == "none":
+                continue
+            self.print( "nictype%s=\"%s\"" % ( idx, nic.get( "nictype", "82540EM" ) ) )
+            self.print( "macaddress%s=\"%s\"" % ( idx, nic.get( "mac", "" ) ) )
+            key = { "natnetwork": "nat-network", "hostonly": "hostonlyadapter", "intnet": "intnet", "bridged": "bridgeadapter" }.get( kind )
+            if key and nic.get( "network" ): self.print( "%s%s=\"%s\"" % ( key, idx, nic[ "network" ] ) )
+            self.print( "cableconnected%s=\"on\"" % ( idx ) )
+        for key, value in sorted( vm[ "guestprops" ].items() ):
+            self.print( "GuestProperty=\"%s=%s\"" % ( key, value ) )
+
+    def createvm( self, args ):
+        opts, pos = _options( args )
+        name = opts.get( "name" )
+        if not name or name is True:
+            raise EmulatorError( "Missing --name" )
+        if name in self._data[ "vms" ]:
+            raise EmulatorError( "Machine settings file '%s' already exists" % ( name ), "VBOX_E_FILE_ERROR", "MachineWrap", "IMachine" )
+        ostype = opts.get( "ostype", "Other" )
+        if ostype not in OSTYPE_DESC:
+            raise EmulatorError( "Guest OS type '%s' is invalid" % ( ostype ), "E_INVALIDARG" )
+
+        groups = [ g for g in str( opts.get( "groups", "/" ) ).split( "," ) if g ]
+        base = opts.get( "basefolder", self.machinefolder() )
+        folder = os.path.join( base, *[ g.strip( "/" ) for g in groups[:1] if g.strip( "/" ) ] )
+        cfgfile = os.path.join( folder, name, "%s.vbox" % ( name ) )
+        vm = {
+            "name": name, "uuid": str( uuid.uuid4() ), "groups": groups, "ostype": ostype, "cfgfile": cfgfile,
+            "memory": 128, "cpus": 1, "state": "poweroff", "state_since": _now(), "controllers": list(),
+            "attachments": dict(), "nics": { "1": { "type": "nat", "mac": self._mac() } }, "boot": { "1": "floppy", "2": "dvd", "3": "disk" },
+            "guestprops": dict(), "settings": dict()
+        }
+        if opts.get( "register" ):
+            self._data[ "vms" ][ name ] = vm
+        self.print( "Virtual machine '%s' is created%s." % ( name, " and registered" if opts.get( "register" ) else "" ) )
+        self.print( "UUID: %s" % ( vm[ "uuid" ] ) )
+        self.print( "Settings file: '%s'" % ( cfgfile ) )
+
+    def _mac( self ):
+        return "080027%06X" % ( random.randint( 0, 0xFFFFFF ) )
+
+    def _unlocked( self, vm ):
+        if vm[ "state" ] in ( "running", "paused" ):
+            raise EmulatorError( "The machine '%s' is already locked for a session (or being unlocked)" % ( vm[ "name" ] ),
+                                 "VBOX_E_INVALID_OBJECT_STATE", "MachineWrap", "IMachine" )
+
+    def modifyvm( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._settle( vm )
+        self._unlocked( vm )
+        for key, value in opts.items():
+            m = re.match( r'^(nic|macaddress|nictype|nat-network|hostonlyadapter|intnet|bridgeadapter|nicgenericdrv|boot|cableconnected|nicspeed)(\d+)$', key )
+            if key == "cpus": vm[ "cpus" ] = int( value )
+            elif key == "memory": vm[ "memory" ] = int( value )
+            elif key == "ostype":
+                if value not in OSTYPE_DESC: raise EmulatorError( "Guest OS type '%s' is invalid" % ( value ) )
+                vm[ "ostype" ] = value
+            elif key == "groups": vm[ "groups" ] = [ g for g in str( value ).split( "," ) if g ]
+            elif key == "name": self._rename( vm, value )
+            elif m and m.group(1) == "boot": vm[ "boot" ][ m.group(2) ] = value
+            elif m:
+                nic = vm[ "nics" ].setdefault( m.group(2), { "type": "none" } )
+                if m.group(1) == "nic": nic[ "type" ] = value
+                elif m.group(1) == "macaddress": nic[ "mac" ] = self._mac() if value == "auto" else value.upper()
+                elif m.group(1) == "nictype": nic[ "nictype" ] = value
+                elif m.group(1) in ( "nat-network", "hostonlyadapter", "intnet", "bridgeadapter", "nicgenericdrv" ): nic[ "network" ] = value
+                else: nic[ m.group(1) ] = value
+                if "mac" not in nic: nic[ "mac" ] = self._mac()
+            else:
+                vm[ "settings" ][ key ] = value
+
+    def _rename( self, vm, name ):
+        if name in self._data[ "vms" ]:
+            raise EmulatorError( "Could not rename the machine, '%s' already exists" % ( name ), "VBOX_E_FILE_ERROR", "MachineWrap", "IMachine" )
+        del self._data[ "vms" ][ vm[ "name" ] ]
+        for location in vm[ "attachments" ].values():
+            m = self._medium( location )
+            if m and vm[ "name" ] in m[ "vms" ]: m[ "vms" ][ m[ "vms" ].index( vm[ "name" ] ) ] = name
+        vm[ "cfgfile" ] = os.path.join( os.path.dirname( vm[ "cfgfile" ] ), "%s.vbox" % ( name ) )
+        vm[ "name" ] = name
+        self._data[ "vms" ][ name ] = vm
+
+    def storagectl( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._unlocked( vm )
+        name = opts.get( "name" )
+        ctl = [ c for c in vm[ "controllers" ] if c[ "name" ] == name ]
+        if opts.get( "remove" ):
+            vm[ "controllers" ] = [ c for c in vm[ "controllers" ] if c[ "name" ] != name ]
+            return
+        if opts.get( "add" ):
+            if ctl:
+                raise EmulatorError( "Storage controller named '%s' already exists" % ( name ), "VBOX_E_OBJECT_IN_USE", "SessionMachine", "IMachine" )
+            ctl = { "name": name, "type": opts.get( "controller", opts[ "add" ] ), "portcount": 2, "bootable": "on" }
+            vm[ "controllers" ].append( ctl )
+        elif not ctl:
+            raise EmulatorError( "Could not find a storage controller named '%s'" % ( name ), "VBOX_E_OBJECT_NOT_FOUND", "SessionMachine", "IMachine" )
+        else:
+            ctl = ctl[0]
+        if "portcount" in opts: ctl[ "portcount" ] = int( opts[ "portcount" ] )
+        if "bootable" in opts: ctl[ "bootable" ] = opts[ "bootable" ]
+
+    def storageattach( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._unlocked( vm )
+        name = opts.get( "storagectl" )
+        ctl = [ c for c in vm[ "controllers" ] if c[ "name" ] == name ]
+        if not ctl:
+            raise EmulatorError( "Could not find a controller named '%s'" % ( name ), "VBOX_E_OBJECT_NOT_FOUND", "SessionMachine", "IMachine" )
+        port = int( opts.get( "port", 0 ) )
+        if port >= ctl[0][ "portcount" ]:
+            raise EmulatorError( "The port and/or device parameter are out of range [0..%s]" % ( ctl[0][ "portcount" ] - 1 ), "E_INVALIDARG", "SessionMachine", "IMachine" )
+        slot = "%s-%s-%s" % ( name, port, opts.get( "device", 0 ) )
+        medium = opts.get( "medium", "none" )
+
+        old = vm[ "attachments" ].pop( slot, None )
+        if old:
+            m = self._medium( old )
+            if m and vm[ "name" ] in m[ "vms" ]: m[ "vms" ].remove( vm[ "name" ] )
+        if medium in ( "none", "emptydrive" ):
+            return
+
+        if opts.get( "type" ) == "dvddrive":
+            vm[ "attachments" ][ slot ] = medium
+            return
+        m = self._medium( medium )
+        if m is None:
+            raise EmulatorError( "Could not find file for the medium '%s' (VERR_FILE_NOT_FOUND)" % ( medium ), "VBOX_E_FILE_ERROR", "MediumWrap", "IMedium" )
+        vm[ "attachments" ][ slot ] = m[ "location" ]
+        if vm[ "name" ] not in m[ "vms" ]: m[ "vms" ].append( vm[ "name" ] )
+
+    def unregistervm( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._settle( vm )
+        self._unlocked( vm )
+        for location in vm[ "attachments" ].values():
+            m = self._medium( location )
+            if m is None:
+                continue
+            if vm[ "name" ] in m[ "vms" ]: m[ "vms" ].remove( vm[ "name" ] )
+            ## --delete removes the disks only this machine used
+            if opts.get( "delete" ) and len( m[ "vms" ] ) == 0:
+                del self._data[ "media" ][ m[ "uuid" ] ]
+        del self._data[ "vms" ][ vm[ "name" ] ]
+
+    def snapshot( self, args ):
+        opts, pos = _options( args )
+        vm = self._vm( pos[0] )
+        self._settle( vm )
+        action = pos[1]
+        snapshots = vm.setdefault( "snapshots", list() )
+        if action == "take":
+            if vm[ "state" ] != "poweroff" and not opts.get( "live" ):
+                raise EmulatorError( "The machine '%s' is running, take a --live snapshot" % ( vm[ "name" ] ), "VBOX_E_INVALID_VM_STATE", "SessionMachine", "IMachine" )
+            snap = { "name": pos[2], "uuid": str( uuid.uuid4() ), "description": opts.get( "description", "" ), "attachments": dict( vm[ "attachments" ] ) }
+            snapshots.append( snap )
+            self.print( "0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%" )
+            self.print( "Snapshot taken. UUID: %s" % ( snap[ "uuid" ] ) )
+        elif action == "list":
+            if len( snapshots ) == 0:
+                self.print( "This machine does not have any snapshots" )
+                return
+            ## every snapshot is the child of the one before, the keys grow by -1 per level
+            for idx, snap in enumerate( snapshots ):
+                suffix = "-1" * idx
+                self.print( "SnapshotName%s=\"%s\"" % ( suffix, snap[ "name" ] ) )
+                self.print( "SnapshotUUID%s=\"%s\"" % ( suffix, snap[ "uuid" ] ) )
+                self.print( "SnapshotDescription%s=\"%s\"" % ( suffix, snap[ "description" ] ) )
+            self.print( "CurrentSnapshotName=\"%s\"" % ( snapshots[-1][ "name" ] ) )
+            self.print( "CurrentSnapshotUUID=\"%s\"" % ( snapshots[-1][ "uuid" ] ) )
+            self.print( "CurrentSnapshotNode=\"SnapshotName%s\"" % ( "-1" * ( len( snapshots ) - 1 ) ) )
+        elif action == "delete":
+            snap = self._snapshot( vm, pos[2] )
+            snapshots.remove( snap )
+        else:
+            raise EmulatorError( "Unknown snapshot action '%s'" % ( action ) )
+
+    def _snapshot( self, vm, key ):
+        for snap in vm.get( "snapshots", list() ):
+            if key in ( snap[ "name" ], snap[ "uuid" ] ):
+                return snap
+        raise EmulatorError( "Could not find a snapshot named '%s'" % ( key ), "VBOX_E_OBJECT_NOT_FOUND", "MachineWrap", "IMachine" )
+
+    def clonevm( self, args ):
+        opts, pos = _options( args )
+        source = self._vm( pos[0] )
+        options = str( opts.get( "options", "" ) ).split( "," )
+        attachments = source[ "attachments" ]
+        if "snapshot" in opts:
+            attachments = self._snapshot( source, opts[ "snapshot" ] )[ "attachments" ]
+        elif "link" in options:
+            raise EmulatorError( "Linked clone can only be created from a snapshot", "E_INVALIDARG", "MachineWrap", "IMachine" )
+
+        name = opts.get( "name" ) or "%s Clone" % ( source[ "name" ] )
+        if name in self._data[ "vms" ]:
+            raise EmulatorError( "Machine settings file '%s' already exists" % ( name ), "VBOX_E_FILE_ERROR", "MachineWrap", "IMachine" )
+        groups = [ g for g in str( opts.get( "groups", ",".join( source[ "groups" ] ) ) ).split( "," ) if g ]
+        base = opts.get( "basefolder", self.machinefolder() )
+        folder = os.path.join( base, *[ g.strip( "/" ) for g in groups[:1] if g.strip( "/" ) ], name )
+
+        vm = json.loads( json.dumps( source ) )
+        vm.update( { "name": name, "uuid": str( uuid.uuid4() ), "groups": groups, "cfgfile": os.path.join( folder, "%s.vbox" % ( name ) ),
+                     "state": "poweroff", "state_since": _now(), "attachments": dict(), "guestprops": dict(), "snapshots": list() } )
+        for key in ( "boot_at", "stop_at", "ip" ): vm.pop( key, None )
+        if "keepallmacs" not in options:
+            for nic in vm[ "nics" ].values():
+                if "mac" in nic: nic[ "mac" ] = self._mac()
+
+        ## a linked clone gets a differencing image on top of each disk, a full clone a copy
+        for slot, location in attachments.items():
+            parent = self._medium( location )
+            if parent is None:
+                vm[ "attachments" ][ slot ] = location
+                continue
+            m = { "uuid": str( uuid.uuid4() ), "format": parent[ "format" ], "capacity": parent[ "capacity" ], "vms": [ name ],
+                  "parent": parent[ "uuid" ] if "link" in options else None }
+            if "link" in options:
+                m[ "location" ] = os.path.join( folder, "Snapshots", "{%s}.%s" % ( m[ "uuid" ], m[ "format" ] ) )
+            else:
+                m[ "location" ] = os.path.join( folder, "%s-%s.%s" % ( name, slot.replace( "-", "" ), m[ "format" ] ) )
+            self._data[ "media" ][ m[ "uuid" ] ] = m
+            vm[ "attachments" ][ slot ] = m[ "location" ]
+
+        if opts.get( "register" ):
+            self._data[ "vms" ][ name ] = vm
+        self.print( "0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%" )
+        self.print( "Machine has been successfully cloned as \"%s\"" % ( name ) )
+
+    def startvm( self, args ):
+        opts, pos = _options( args )
+        for key in pos:
+            vm = self._vm( key )
+            self._settle( vm )
+            if vm[ "state" ] != "poweroff":
+                raise EmulatorError( "The machine '%s' is already locked by a session (or being locked or unlocked)" % ( vm[ "name" ] ),
+                                     "VBOX_E_INVALID_OBJECT_STATE", "MachineWrap", "IMachine" )
+            self.print( "Waiting for VM \"%s\" to power on..." % ( vm[ "name" ] ) )
+            vm[ "state" ] = "running"
+            vm[ "state_since" ] = _now()
+            vm[ "boot_at" ] = time.time() + _float_env( "PYVBCC_EMULATOR_BOOT" )
+            vm[ "ip" ] = "10.0.%s.%s" % ( ( int( vm[ "uuid" ][:2], 16 ) ), 2 + int( vm[ "uuid" ][2:4], 16 ) % 250 )
+            vm[ "guestprops" ] = dict()
+            self.print( "VM \"%s\" has been successfully started." % ( vm[ "name" ] ) )
+
+    def controlvm( self, args ):
+        vm = self._vm( args[0] )
+        self._settle( vm )
+        action = args[1] if len( args ) > 1 else ""
+        if vm[ "state" ] not in ( "running", "paused" ):
+            raise EmulatorError( "Machine '%s' is not currently running" % ( vm[ "name" ] ), "VBOX_E_INVALID_VM_STATE", "ConsoleWrap", "IConsole" )
+        if action == "poweroff":
+            vm[ "state" ] = "poweroff"
+            vm[ "state_since" ] = _now()
+            vm[ "guestprops" ] = dict()
+            vm.pop( "stop_at", None )
+        elif action == "acpipowerbutton":
+            ignored = [ p for p in os.environ.get( "PYVBCC_EMULATOR_ACPI_IGNORE", "" ).split( "," ) if p ]
+            if vm[ "state" ] == "running" and not any( fnmatch.fnmatch( vm[ "name" ], p ) for p in ignored ):
+                vm.setdefault( "stop_at", time.time() + _float_env( "PYVBCC_EMULATOR_SHUTDOWN" ) )
+        elif action == "pause":
+            vm[ "state" ] = "paused"
+            vm[ "state_since" ] = _now()
+        elif action == "resume":
+            vm[ "state" ] = "running"
+            vm[ "state_since" ] = _now()
+        elif action == "savestate":
+            vm[ "state" ] = "saved"
+            vm[ "state_since" ] = _now()
+        else:
+            vm[ "settings" ][ action ] = args[2:]
+
+    def guestproperty( self, args ):
+        opts, pos = _options( args )
+        action, vm = pos[0], self._vm( pos[1] )
+        self._settle( vm )
+        if action == "get":
+            value = vm[ "guestprops" ].get( pos[2] )
+            self.print( "Value: %s" % ( value ) if value is not None else "No value set!" )
+        elif action == "set":
+            if len( pos ) > 3: vm[ "guestprops" ][ pos[2] ] = pos[3]
+            else: vm[ "guestprops" ].pop( pos[2], None )
+        elif action == "enumerate":
+            for key, value in sorted( vm[ "guestprops" ].items() ):
+                self.print( "Name: %s, value: %s, timestamp: 0, flags: " % ( key, value ) )
+        elif action == "wait":
+            ## only the guest coming up changes properties, waiting happens after the lock is released
+            timeout = float( opts.get( "timeout", 3600000 ) ) / 1000
+            prop = "/VirtualBox/GuestInfo/Net/0/V4/IP"
+            delay = vm.get( "boot_at", 0 ) - time.time()
+            if vm[ "state" ] == "running" and vm.get( "ip" ) and 0 < delay <= timeout and fnmatch.fnmatch( prop, pos[2] ):
+                self._wait = ( delay, None )
+                self.print( "Name: %s, value: %s, flags: TRANSIENT, TRANSRESET" % ( prop, vm[ "ip" ] ) )
+            else:
+                self._wait = ( timeout, "Time out or interruption while waiting for a notification." if opts.get( "fail-on-timeout" ) else None )
+        else:
+            raise EmulatorError( "Unknown guestproperty action '%s'" % ( action ) )
+
+    ###################################################################################################################
+    ## Media
+    ###################################################################################################################
+    def createmedium( self, args ):
+        opts, pos = _options( args )
+        location = os.path.normpath( str( opts.get( "filename" ) ) )
+        if self._medium( location ) is not None:
+            raise EmulatorError( "Failed to create medium. Medium '%s' already exists" % ( location ), "VBOX_E_FILE_ERROR", "MediumWrap", "IMedium" )
+        m = { "uuid": str( uuid.uuid4() ), "location": location, "format": str( opts.get( "format", "vdi" ) ).lower(),
+              "capacity": int( opts.get( "size", 0 ) ), "vms": list(), "parent": None }
+        self._data[ "media" ][ m[ "uuid" ] ] = m
+        self.print( "0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%" )
+        self.print( "Medium created. UUID: %s" % ( m[ "uuid" ] ) )
+
+    def modifymedium( self, args ):
+        opts, pos = _options( args )
+        m = self._medium( pos[-1] )
+        if m is None:
+            raise EmulatorError( "Could not find file for the medium '%s'" % ( pos[-1] ), "VBOX_E_FILE_ERROR", "MediumWrap", "IMedium" )
+        if "resize" in opts:
+            if int( opts[ "resize" ] ) < m[ "capacity" ]:
+                raise EmulatorError( "Shrinking is not yet supported for medium '%s'" % ( m[ "location" ] ), "VBOX_E_NOT_SUPPORTED", "MediumWrap", "IMedium" )
+            m[ "capacity" ] = int( opts[ "resize" ] )
+            self.print( "0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%" )
+
+    def closemedium( self, args ):
+        opts, pos = _options( args )
+        m = self._medium( pos[-1] )
+        if m is None:
+            raise EmulatorError( "Could not find file for the medium '%s'" % ( pos[-1] ), "VBOX_E_FILE_ERROR", "MediumWrap", "IMedium" )
+        if len( m[ "vms" ] ) > 0:
+            raise EmulatorError( "Cannot close medium '%s' because it is still attached to 1 virtual machines" % ( m[ "location" ] ), "VBOX_E_OBJECT_IN_USE", "MediumWrap", "IMedium" )
+        del self._data[ "media" ][ m[ "uuid" ] ]
+        if opts.get( "delete" ):
+            self.print( "0%...10%...20%...30%...40%...50%...60%...70%...80%...90%...100%" )
+
+    ###################################################################################################################
+    ## Networks
+    ###################################################################################################################
+    def natnetwork( self, args ):
+        opts, pos = _options( args )
+        action = pos[0]
+        name = opts.get( "netname" )
+        nets = self._data[ "natnets" ]
+        if action == "add":
+            if name in nets:
+                raise EmulatorError( "NATNetwork server already exists", "E_INVALIDARG" )
+            nets[ name ] = { "network": opts.get( "network", "10.0.2.0/24" ), "enabled": True, "dhcp": False, "ipv6": False }
+        elif name not in nets:
+            raise EmulatorError( "NATNetwork server '%s' does not exist" % ( name ), "VBOX_E_OBJECT_NOT_FOUND" )
+        elif action == "remove":
+            del nets[ name ]
+            return
+        elif action in ( "start", "stop" ):
+            return
+        net = nets[ name ]
+        if "network" in opts and opts[ "network" ] is not True: net[ "network" ] = opts[ "network" ]
+        if opts.get( "enable" ): net[ "enabled" ] = True
+        if opts.get( "disable" ): net[ "enabled" ] = False
+        if "dhcp" in opts: net[ "dhcp" ] = opts[ "dhcp" ] in ( "on", True )
+        if "ipv6" in opts: net[ "ipv6" ] = opts[ "ipv6" ] in ( "on", True )
+
+    ###################################################################################################################
+    ## Dispatch
+    ###################################################################################################################
+    def run( self, argv ):
+        """
+            Runs one VBoxManage command line ( without the program name ), returns the exit code.
+        """
+        self.out = list()
+        self._wait = None
+        if len( argv ) == 0:
+            return 0
+        if argv[0] == "--version":
+            self.out.append( VERSION )
+            return 0
+
+        sub = argv[0]
+        handler = getattr( self, sub, None )
+        if sub.startswith( "_" ) or sub in ( "run", "save", "locked", "print", "machinefolder" ) or not callable( handler ):
+            sys.stderr.write( "Syntax error: Invalid command '%s'\n" % ( sub ) )
+            return 2
+
+        latency = _float_env( "PYVBCC_EMULATOR_LATENCY" )
+        latency += latency * _float_env( "PYVBCC_EMULATOR_JITTER" ) * random.random()
+        if latency > 0: time.sleep( latency )
+
+        if sub in LOCKING and len( argv ) > 1 and random.random() < _float_env( "PYVBCC_EMULATOR_CONTENTION" ):
+            for line in EmulatorError( "The machine '%s' is already locked for a session (or being unlocked)" % ( argv[1] ),
+                                       "VBOX_E_INVALID_OBJECT_STATE", "MachineWrap", "IMachine" ).lines():
+                sys.stderr.write( line + "\n" )
+            return 1
+
+        try:
+            with self.locked():
+                svc = _float_env( "PYVBCC_EMULATOR_SVC" )
+                if svc > 0: time.sleep( svc )
+                handler( argv[1:] )
+                self.save()
+        except EmulatorError as e:
+            for line in e.lines():
+                sys.stderr.write( line + "\n" )
+            return 1
+        except ( IndexError, KeyError, ValueError ) as e:
+            sys.stderr.write( "VBoxManage: error: Invalid arguments for %s: %s\n" % ( sub, e ) )
+            return 2
+
+        if self._wait is not None:
+            time.sleep( self._wait[0] )
+            if self._wait[1] is not None:
+                self.out = list()
+                sys.stderr.write( self._wait[1] + "\n" )
+                return 2
+        return 0
+
+
+def main( argv = None ):
+    emulator = Emulator()
+    code = emulator.run( sys.argv[1:] if argv is None else argv )
+    for line in emulator.out:
+        sys.stdout.write( line + "\n" )
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import random
+import asyncio
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.command
+
+"""
+    Asyncio based execution engine for VBoxManage commands.
+
+    Commands are run through their aexecute() and parse() methods. The executor limits how many commands run at once in total
+    and how many run against the same machine, VBoxManage calls on one machine take its session lock and
+    would otherwise fail on each other.
+
+    Without a fixed limit ( or with concurrency "auto" ) the total limit adapts to VBoxSVC the way TCP adapts
+    to a link: it grows by one every window of commands that finish close to the fastest latency seen for
+    their sub-command lately, and halves when latency climbs or VBoxManage reports lock contention. Only
+    commands that ran a process count, cache hits and test runs say nothing about VBoxSVC. Commands failing
+    on contention are retried after a jittered backoff.
+"""
+
+DEF_EXEC_LIMIT=8
+DEF_EXEC_VM_LIMIT=1
+DEF_EXEC_MAX_LIMIT=64
+
+## a command slower than this many times its sub-command's best latency counts as congestion
+DEF_LATENCY_TOLERANCE=3.0
+DEF_DECREASE=0.5
+## seconds the fastest latency of a sub-command is trusted, then the next one seen replaces it
+DEF_BASELINE_WINDOW=30.0
+
+DEF_RETRIES=4
+DEF_BACKOFF=0.25
+DEF_BACKOFF_MAX=8.0
+
+def backoff( attempt, base = DEF_BACKOFF, maximum = DEF_BACKOFF_MAX ):
+    """
+        Full jitter backoff, a random delay up to base * 2^attempt.
+    """
+    return random.uniform( 0, min( maximum, base * ( 2 ** attempt ) ) )
+
+
+class AdaptiveLimiter( object ):
+    """
+        Additive increase, multiplicative decrease limit on the commands in flight.
+    """
+
+    def __init__( self, limit = DEF_EXEC_LIMIT, minimum = 1, maximum = DEF_EXEC_MAX_LIMIT, tolerance = DEF_LATENCY_TOLERANCE, window = DEF_BASELINE_WINDOW ):
+        self._limit = float( limit )
+        self._minimum = minimum
+        self._maximum = maximum
+        self._tolerance = tolerance
+        self._window = window
+        self._inflight = 0
+        self._baseline = dict()
+        ## commands finished since the last decrease, None before the first one
+        self._since_decrease = None
+        self._cond = None
+
+    def limit( self ):
+        return max( self._minimum, int( self._limit ) )
+
+    def inflight( self ):
+        return self._inflight
+
+    async def acquire( self ):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for( lambda: self._inflight < self.limit() )
+            self._inflight += 1
+
+    async def release( self ):
+        async with self._cond:
+            self._inflight -= 1
+            self._cond.notify_all()
+
+    def _decrease( self ):
+        ## the first signal decreases at once, after that one decrease per window as the commands
+        ## already in flight saw the same congestion
+        if self._since_decrease is not None and self._since_decrease < self.limit():
+            return
+        self._limit = max( float( self._minimum ), self._limit * DEF_DECREASE )
+        self._since_decrease = 0
+
+    def update( self, kind, latency, contention = False ):
+        """
+            Feeds back one finished command, kind is its sub-command.
+        """
+        if self._since_decrease is not None:
+            self._since_decrease += 1
+        if contention:
+            self._decrease()
+            return
+
+        ## { kind: ( latency, monotonic time it was seen ) }, an old minimum ages out
+        now = time.monotonic()
+        best, seen = self._baseline.get( kind, ( None, None ) )
+        if best is None or latency < best or now - seen > self._window:
+            self._baseline[ kind ] = ( latency, now )
+            best = latency
+
+        if latency > best * self._tolerance and latency > 0.05:
+            self._decrease()
+        elif self._limit < self._maximum:
+            self._limit = min( float( self._maximum ), self._limit + 1.0 / self._limit )
+
+
+class FixedLimiter( object ):
+
+    def __init__( self, limit ):
+        self._limit = limit
+        self._sem = None
+
+    def limit( self ):
+        return self._limit
+
+    async def acquire( self ):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore( self._limit )
+        await self._sem.acquire()
+
+    async def release( self ):
+        self._sem.release()
+
+    def update( self, kind, latency, contention = False ):
+        pass
+
+
+class CommandExecutor( object ):
+
+    def __init__( self, limit = None, vm_limit = DEF_EXEC_VM_LIMIT, retries = DEF_RETRIES, **opt ):
+        self._debug = False
+        self._limit = limit
+        self._vm_limit = vm_limit
+        self._retries = retries
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+        if pyvbcc.KEY_SYSTEM_CONCURRENCY in opt and opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ]:
+            self._limit = opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ]
+
+        if pyvbcc.KEY_SYSTEM_VM_CONCURRENCY in opt and opt[ pyvbcc.KEY_SYSTEM_VM_CONCURRENCY ]:
+            self._vm_limit = int( opt[ pyvbcc.KEY_SYSTEM_VM_CONCURRENCY ] )
+
+        ## no limit given means adapt to what VBoxSVC keeps up with
+        self._adaptive = self._limit in ( None, "auto" )
+        if self._adaptive:
+            self._limit = DEF_EXEC_LIMIT
+        self._limit = int( self._limit )
+
+        if self._limit < 1 or self._vm_limit < 1:
+            raise AttributeError( "Executor limits must be at least 1, got %s and %s" % ( self._limit, self._vm_limit ) )
+
+        self._loop = None
+        self._global = None
+        self._machines = dict()
+        self._retried = 0
+
+    def adaptive( self ):
+        return self._adaptive
+
+    def limit( self ):
+        """
+            Current limit on commands in flight, it moves while an adaptive executor runs.
+        """
+        if self._global is not None:
+            return self._global.limit()
+        return self._limit
+
+    def retried( self ):
+        return self._retried
+
+    def vm_limit( self ):
+        return self._vm_limit
+
+    def _bind( self ):
+        ## semaphores belong to one event loop, start over when used from a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            if self._adaptive:
+                self._global = AdaptiveLimiter( self._limit )
+            else:
+                self._global = FixedLimiter( self._limit )
+            self._machines = dict()
+
+    def _machine_semaphore( self, machine ):
+        if machine not in self._machines:
+            self._machines[ machine ] = asyncio.Semaphore( self._vm_limit )
+        return self._machines[ machine ]
+
+    async def _execute( self, cmd, **opt ):
+        line = cmd._command_line()
+        kind = line[1] if len( line ) > 1 else None
+        attempt = 0
+        while True:
+            await self._global.acquire()
+            try:
+                result = await cmd.aexecute( **opt )
+            finally:
+                await self._global.release()
+
+            contention = isinstance( result, pyvbcc.command.GenericCommandResult ) and result.contention()
+            ## only a process that ran tells how busy VBoxSVC is
+            if isinstance( result, pyvbcc.command.GenericCommandResult ) and result.started() is not None:
+                self._global.update( kind, result.walltime(), contention )
+            if not contention or attempt >= self._retries:
+                return cmd.parse( result )
+
+            ## sleep without a slot, the busy lock is held by someone else
+            delay = backoff( attempt )
+            if self._debug: print( "%s hit %s, retry in %.2fs" % ( " ".join( cmd._command_line() ), result.errorcode(), delay ) )
+            self._retried += 1
+            attempt += 1
+            await asyncio.sleep( delay )
+
+    async def submit( self, cmd, **opt ):
+        self._bind()
+        machine = cmd.machine()
+
+        if machine is None:
+            return await self._execute( cmd, **opt )
+
+        ## take the machine slot first so waiting calls on a busy machine do not hold global slots
+        async with self._machine_semaphore( machine ):
+            return await self._execute( cmd, **opt )
+
+    async def gather( self, cmds, **opt ):
+        return await asyncio.gather( *[ self.submit( c, **opt ) for c in cmds ], return_exceptions=True )
+
+    def run( self, cmds, **opt ):
+        """
+            Runs all commands, returns their results in the same order as given.
+            A command that raised returns the exception instead of a result.
+        """
+        return asyncio.run( self.gather( cmds, **opt ) )
+
+
+def RunCommands( cmds, opt = {} ):
+    return CommandExecutor( **opt ).run( cmds )
+
+
+if __name__ == "__main__":
+    pass
@@ -13,27 +13,22 @@ import pyvbcc.validate
 
 import pyvbcc.command
 import pyvbcc.info.commands
+import pyvbcc.vm
+import pyvbcc.disk
+import pyvbcc.net
 
 
 def GetVmInfo( opt ):
-    res = None
-    if opt[ pyvbcc.KEY_VM_NAME ] == "all":
-        res = pyvbcc.info.commands.ListVmsCommand( ).run()
-    else:
-        res = pyvbcc.info.commands.InfoVmCommand( opt[ pyvbcc.KEY_VM_NAME ] ).run()
-    return res
+    return pyvbcc.vm.GetVmInfo( opt )
 
 def GetGroupInfo( opt ):
     return pyvbcc.info.commands.ListGroupCommand( opt[ pyvbcc.KEY_GROUP_NAME ] ).run()
 
 def GetDiskInfo( opt ):
-    return pyvbcc.info.commands.ListDiskCommand( opt[ pyvbcc.KEY_DISKS_NAME ] ).run()
+    return pyvbcc.disk.GetDiskInfo( opt )
 
 def GetNetworkInfo( opt ):
-    allnets = dict()
-    for t in ["intnets", "bridgedifs", "hostonlyifs", "natnets"]:
-        allnets[ t ] = pyvbcc.info.commands.ListNetworkCommand( t, opt[ pyvbcc.KEY_NETWORK_NAME ] ).run()
-    return allnets
+    return pyvbcc.net.GetNetworkInfo( opt )
 
 def GetSystemInfo( opt ):
     res = dict()
@@ -15,66 +15,72 @@ import pyvbcc.command
 
 
 
+RX_SPACE = re.compile( r"\s+" )
+
+def _property_records( lines ):
+    for line in lines:
+        line = line.replace( "\"", "" )
+        nldata = line.split( ":", 1 )
+
+        if len( nldata ) > 1:
+            key = RX_SPACE.sub( "", nldata[0].lstrip().rstrip().lower() )
+            val = nldata[1].lstrip().rstrip()
+            yield key, val
+
+
 class ListSystemPropertiesCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 3600
+    CACHE_TAGS = ( "system", )
+
     def __init__( self, vm = None, **opt ):
         super().__init__( [ "list", "systemproperties", "--long" ], **opt )
         self._vm = vm
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r":", line )
-
-            if len( nldata ) > 1:
-                key = re.sub( r"\s+", "", nldata[0].lstrip().rstrip().lower() )
-                val = nldata[1].lstrip().rstrip()
-                data[ key ] = val
+    def records( self, lines ):
+        return _property_records( lines )
 
-        return data
+    def parse( self, result ):
+        return dict( self.records( result.result() ) )
 
 
 class ListHostInfoCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 300
+    CACHE_TAGS = ( "host", )
+
     def __init__( self, vm = None, **opt ):
         super().__init__( [ "list", "hostinfo", "--long" ], **opt )
         self._vm = vm
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r":", line )
-
-            if len( nldata ) > 1:
-                key = re.sub( r"\s+", "", nldata[0].lstrip().rstrip().lower() )
-                val = nldata[1].lstrip().rstrip()
-                data[ key ] = val
+    def records( self, lines ):
+        return _property_records( lines )
 
-        return data
+    def parse( self, result ):
+        return dict( self.records( result.result() ) )
 
 
 class ListGroupCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 30
+    CACHE_TAGS = ( "groups", )
+
     def __init__( self, group, **opt ):
         super().__init__( [ "list", "groups", "--long" ], **opt )
         self._group = group
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-
-        for line in res:
-            line = re.compile( r"\"" ).sub(  "", line )
-            linex = re.compile( r"\/" ).sub(  "", line )
+    def records( self, lines ):
+        for line in lines:
+            line = line.replace( "\"", "" )
+            linex = line.replace( "/", "" )
             if len( linex ) == 0:
                 linex = "default"
-            data[linex] = { "name": linex, "path": line }
 
+            if self._group == "all" or linex == self._group:
+                yield linex, { "name": linex, "path": line }
+
+    def parse( self, result ):
         if self._group == "all":
-            return data
+            return dict( self.records( result.result() ) )
 
-        return [ data[x] for x in data if x == self._group ]
+        return [ x[1] for x in self.records( result.result() ) ]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import bisect
+import threading
+
+from pprint import pprint
+
+import pyvbcc
+
+"""
+    Process wide latency metrics of VBoxManage calls.
+
+    Every command that starts a VBoxManage process reports its sub-command, wall time, exit code, error
+    code and output size here. Latencies go into a fixed log scale histogram per sub-command, so any number
+    of calls costs the same memory and percentiles come out of the bucket counts. Cache hits and test runs
+    never started a process and are only counted.
+"""
+
+## histogram bucket upper bounds in seconds, 1ms to ~10min in steps of about 1.5x
+BUCKETS = [ round( 0.001 * ( 1.5 ** i ), 6 ) for i in range( 34 ) ]
+
+class Histogram( object ):
+
+    def __init__( self, buckets = BUCKETS ):
+        self._bounds = buckets
+        self._counts = [ 0 ] * ( len( buckets ) + 1 )
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe( self, value ):
+        self._counts[ bisect.bisect_left( self._bounds, value ) ] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min( self.min, value )
+        self.max = value if self.max is None else max( self.max, value )
+
+    def mean( self ):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile( self, p ):
+        """
+            Upper bound of the bucket holding the p-th percentile ( 0 - 100 ), capped by the largest value seen.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max( 1, int( round( self.count * p / 100.0 ) ) )
+        seen = 0
+        for idx, n in enumerate( self._counts ):
+            seen += n
+            if seen >= rank:
+                bound = self._bounds[ idx ] if idx < len( self._bounds ) else self.max
+                return min( bound, self.max )
+        return self.max
+
+    def buckets( self ):
+        return { ( "%g" % ( b ) if idx < len( self._bounds ) else "+Inf" ): n
+                 for idx, ( b, n ) in enumerate( zip( self._bounds + [ None ], self._counts ) ) if n > 0 }
+
+
+class CommandMetrics( object ):
+    __slots__ = ( "latency", "errors", "errorcodes", "bytes_out", "bytes_err", "cached" )
+
+    def __init__( self ):
+        self.latency = Histogram()
+        self.errors = 0
+        self.errorcodes = dict()
+        self.bytes_out = 0
+        self.bytes_err = 0
+        self.cached = 0
+
+    def to_dict( self ):
+        return {
+            "count": self.latency.count,
+            "cached": self.cached,
+            "errors": self.errors,
+            "errorcodes": dict( self.errorcodes ),
+            "total": round( self.latency.total, 6 ),
+            "mean": round( self.latency.mean(), 6 ),
+            "min": self.latency.min,
+            "p50": self.latency.percentile( 50 ),
+            "p90": self.latency.percentile( 90 ),
+            "p99": self.latency.percentile( 99 ),
+            "max": self.latency.max,
+            "bytes_out": self.bytes_out,
+            "bytes_err": self.bytes_err
+        }
+
+
+class MetricsRegistry( object ):
+
+    def __init__( self ):
+        self._lock = threading.Lock()
+        self._commands = dict()
+
+    def _get( self, subcommand ):
+        if subcommand not in self._commands:
+            self._commands[ subcommand ] = CommandMetrics()
+        return self._commands[ subcommand ]
+
+    def observe( self, result ):
+        """
+            Adds a GenericCommandResult of a VBoxManage process that ran.
+        """
+        with self._lock:
+            m = self._get( result.subcommand() )
+            m.latency.observe( result.walltime() )
+            m.bytes_out += result.bytes_out()
+            m.bytes_err += result.bytes_err()
+            if not result.ok():
+                m.errors += 1
+                code = result.errorcode() or "exit %s" % ( result.exitcode() )
+                m.errorcodes[ code ] = m.errorcodes.get( code, 0 ) + 1
+
+    def cached( self, subcommand ):
+        with self._lock:
+            self._get( subcommand ).cached += 1
+
+    def subcommands( self ):
+        with self._lock:
+            return sorted( self._commands.keys() )
+
+    def get( self, subcommand ):
+        with self._lock:
+            m = self._commands.get( subcommand )
+            return m.to_dict() if m is not None else None
+
+    def histogram( self, subcommand ):
+        with self._lock:
+            m = self._commands.get( subcommand )
+            return m.latency.buckets() if m is not None else dict()
+
+    def report( self ):
+        """
+            { subcommand: counts, latency percentiles and bytes }, the sub-commands taking the most time first.
+        """
+        with self._lock:
+            items = sorted( self._commands.items(), key=lambda kv: -kv[1].latency.total )
+            return { k: v.to_dict() for k, v in items }
+
+    def total( self ):
+        with self._lock:
+            return sum( m.latency.total for m in self._commands.values() )
+
+    def reset( self ):
+        with self._lock:
+            self._commands = dict()
+
+
+_registry = MetricsRegistry()
+
+def GetRegistry():
+    return _registry
+
+def Observe( result ):
+    _registry.observe( result )
+
+def Report():
+    return _registry.report()
+
+def Reset():
+    _registry.reset()
+
+
+if __name__ == "__main__":
+    pass
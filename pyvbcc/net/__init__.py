@@ -12,20 +12,45 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.executor
+import pyvbcc.records
 import pyvbcc.net.commands
 
 
 
 
-def GetNetworkInfo( opt ):
-    allnets = dict()
-    types = ["intnets", "bridgedifs", "hostonlyifs", "natnets"]
+NETWORK_TYPES = [ "intnets", "bridgedifs", "hostonlyifs", "natnets" ]
 
-    if pyvbcc.KEY_NETWORK_TYPE in opt and opt[ pyvbcc.KEY_NETWORK_TYPE ] in types:
+def GetNetworks( opt ):
+    """
+        Runs the list query of every network type at once, returns ( { type: networks }, { type: error } ).
+        A type that fails only shows up in the errors, the others are still returned.
+    """
+    types = NETWORK_TYPES
+    if pyvbcc.KEY_NETWORK_TYPE in opt and opt[ pyvbcc.KEY_NETWORK_TYPE ] in NETWORK_TYPES:
         types = [ opt[ pyvbcc.KEY_NETWORK_TYPE ] ]
 
-    for t in types:
-        allnets[ t ] = pyvbcc.net.commands.ListNetworkCommand( t, opt[ pyvbcc.KEY_NETWORK_NAME ] ).run()
+    net = opt.get( pyvbcc.KEY_NETWORK_NAME, "all" )
+    cmds = [ pyvbcc.net.commands.ListNetworkCommand( t, net, **opt ) for t in types ]
+    results = pyvbcc.executor.CommandExecutor( **opt ).run( cmds )
+
+    nets = dict()
+    errors = dict()
+    for t, cmd, res in zip( types, cmds, results ):
+        if isinstance( res, Exception ):
+            errors[ t ] = "%s: %s" % ( type( res ).__name__, res )
+        elif cmd.exitcode() not in ( 0, None ) and not cmd._test:
+            errors[ t ] = "list %s exited with %s" % ( t, cmd.exitcode() )
+        else:
+            nets[ t ] = res
+
+    return nets, errors
+
+def GetNetworkInfo( opt ):
+    nets, errors = GetNetworks( opt )
+    allnets = pyvbcc.records.to_dict( nets )
+    if len( errors ) > 0:
+        allnets[ "errors" ] = errors
     return allnets
 
 def CreateNatNetwork( opt ):
@@ -12,12 +12,23 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.records
 
 
 ###########################################################################################################################
 ## VM NIC modify
 ###########################################################################################################################
+## --nic<n> attachment kinds and the option naming the network they attach to
+NIC_NETNAME_FLAGS = {
+    "natnetwork": "nat-network",
+    "hostonly": "hostonlyadapter",
+    "intnet": "intnet",
+    "bridged": "bridgeadapter",
+    "generic": "nicgenericdrv"
+}
+
 class ModifyVmNicCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "nets" )
 
     def __init__( self, cfg = {}, **opt ):
 
@@ -27,7 +38,22 @@ class ModifyVmNicCommand( pyvbcc.command.GenericCommand ):
         self._vm = cfg[ pyvbcc.KEY_VM_NAME ]
         self._nic_id = cfg[ pyvbcc.KEY_NIC_ID ]
 
-        if pyvbcc.KEY_NIC_NET in cfg: self._nic_net = cfg.get( pyvbcc.KEY_NIC_NET, None ]
+        self._nic_net = None
+        self._nic_netname = None
+        self._nic_mac = None
+        self._nic_connected = None
+        self._nic_type = None
+        self._nic_trace = None
+        self._nic_trace_file = None
+        self._nic_property = None
+        self._nic_speed = None
+        self._nic_bootprio = None
+        self._nic_promisc = None
+        self._nic_bandwidth_group = None
+        self._nic_genericdrv = None
+
+        if pyvbcc.KEY_NIC_NETNAME in cfg: self._nic_netname = cfg.get( pyvbcc.KEY_NIC_NETNAME, None )
+        if pyvbcc.KEY_NIC_NET in cfg: self._nic_net = cfg.get( pyvbcc.KEY_NIC_NET, None )
         if pyvbcc.KEY_NIC_MAC in cfg: self._nic_mac = cfg.get( pyvbcc.KEY_NIC_MAC, None )
         if pyvbcc.KEY_NIC_CONNECTED in cfg: self._nic_connected = cfg.get( pyvbcc.KEY_NIC_CONNECTED, None )
         if pyvbcc.KEY_NIC_TYPE in cfg: self._nic_type = cfg.get( pyvbcc.KEY_NIC_TYPE, None )
@@ -42,12 +68,13 @@ class ModifyVmNicCommand( pyvbcc.command.GenericCommand ):
 
         params = [ "modifyvm", self._vm ]
         if self._nic_net: params += list( [ "--nic%s" % (self._nic_id), self._nic_net ] )
+        if self._nic_net in NIC_NETNAME_FLAGS and self._nic_netname: params += list( [ "--%s%s" % ( NIC_NETNAME_FLAGS[ self._nic_net ], self._nic_id ), self._nic_netname ] )
         if self._nic_mac: params += list( [ "--macaddress%s" % (self._nic_id), self._nic_mac ] )
         if self._nic_connected: params += list( [ "--cableconnected%s" % (self._nic_id), self._nic_connected ] )
         if self._nic_type: params += list( [ "--nictype%s" % (self._nic_id), self._nic_type ] )
         if self._nic_trace: params += list( [ "--nictrace%s" % (self._nic_id), self._nic_trace ] )
         if self._nic_trace_file: params += list( [ "--nictracefile%s" % (self._nic_id), self._nic_trace_file ] )
-        if self._nic_speed: params += list( [ "--nicspee%s" % (self._nic_id), self._nic_speed ] )
+        if self._nic_speed: params += list( [ "--nicspeed%s" % (self._nic_id), self._nic_speed ] )
         if self._nic_bootprio: params += list( [ "--nicbootprio%s" % (self._nic_id), self._nic_bootprio ] )
         if self._nic_promisc: params += list( [ "--nicpromisc%s" % (self._nic_id), self._nic_promisc ] )
         if self._nic_bandwidth_group: params += list( [ "--nicbandwidthgroup%s" % (self._nic_id), self._nic_bandwidth_group ] )
@@ -61,6 +88,8 @@ class ModifyVmNicCommand( pyvbcc.command.GenericCommand ):
 ## NAT netwrking
 ###########################################################################################################################
 class CreateNatNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_NETWORK_NAME not in cfg or pyvbcc.KEY_NETWORK_ADDR not in cfg or pyvbcc.KEY_NETWORK_CIDR not in cfg:
             raise AttributeError("Missing nat network name or network address or cidr")
@@ -98,6 +127,8 @@ class CreateNatNetworkCommand( pyvbcc.command.GenericCommand ):
 
 
 class ModifyNatNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_NETWORK_NAME not in cfg:
             raise AttributeError("Missing nat network name")
@@ -115,26 +146,20 @@ class ModifyNatNetworkCommand( pyvbcc.command.GenericCommand ):
         if pyvbcc.KEY_NETWORK_ENABLED in cfg: self._enabled = cfg[ pyvbcc.KEY_NETWORK_ENABLED ]
         if pyvbcc.KEY_NETWORK_IPV6 in cfg: self._ipv6 = cfg[ pyvbcc.KEY_NETWORK_IPV6 ]
         if pyvbcc.KEY_NETWORK_DHCP in cfg: self._dhcp = cfg[ pyvbcc.KEY_NETWORK_DHCP ]
-        if pyvbcc.KEY_NETWORK_ADDR in cfg: self._enabled = cfg[ pyvbcc.KEY_NETWORK_ADDR ]
-        if pyvbcc.KEY_NETWORK_CIDR in cfg: self._ipv6 = cfg[ pyvbcc.KEY_NETWORK_CIDR ]
-
-        enable_str = "--enable"
-        if not self._enabled: enable_str = "--disable"
-
-        dhcp_str = "on"
-        if not self._dhcp: dhcp_str = "off"
+        if pyvbcc.KEY_NETWORK_ADDR in cfg: self._network = cfg[ pyvbcc.KEY_NETWORK_ADDR ]
+        if pyvbcc.KEY_NETWORK_CIDR in cfg: self._cidr = cfg[ pyvbcc.KEY_NETWORK_CIDR ]
 
-        ipv6_str = "off"
-        if self._ipv6: ipv6_str = "on"
-
-        if self._enabled: params += list( [ enable_str ] )
-        if self._dhcp: params += list( [ "--dhcp", dhcp_str ] )
-        if self._ipv6: params += list( [ "--ipv6", ipv6_str ] )
+        ## only what is given changes, None leaves the setting alone
+        if self._enabled is not None: params += list( [ "--enable" if self._enabled else "--disable" ] )
+        if self._dhcp is not None: params += list( [ "--dhcp", "on" if self._dhcp else "off" ] )
+        if self._ipv6 is not None: params += list( [ "--ipv6", "on" if self._ipv6 else "off" ] )
         if self._network: params += list( [ "--network", "%s/%s" % (self._network, self._cidr) ] )
 
         super().__init__( params, **opt )
 
 class DeleteNatNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_NETWORK_NAME not in cfg:
             raise AttributeError("Missing nat network name")
@@ -146,6 +171,8 @@ class DeleteNatNetworkCommand( pyvbcc.command.GenericCommand ):
         super().__init__( params, **opt )
 
 class StartNatNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_NETWORK_NAME not in cfg:
             raise AttributeError("Missing nat network name")
@@ -157,6 +184,8 @@ class StartNatNetworkCommand( pyvbcc.command.GenericCommand ):
         super().__init__( params, **opt )
 
 class StopNatNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_NETWORK_NAME not in cfg:
             raise AttributeError("Missing nat network name")
@@ -174,6 +203,8 @@ class StopNatNetworkCommand( pyvbcc.command.GenericCommand ):
 ## HostOnly netwrking
 ###########################################################################################################################
 class CreateHostOnlyNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg or pyvbcc.KEY_NIC_ID not in cfg:
             raise AttributeError("Missing vm name and NIC id")
@@ -185,6 +216,8 @@ class CreateHostOnlyNetworkCommand( pyvbcc.command.GenericCommand ):
         super().__init__( params, **opt )
 
 class DeleteHostOnlyNetworkCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "nets", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg or pyvbcc.KEY_NIC_ID not in cfg:
             raise AttributeError("Missing vm name and NIC id")
@@ -201,14 +234,17 @@ class DeleteHostOnlyNetworkCommand( pyvbcc.command.GenericCommand ):
 ## IntNet netwrking
 ###########################################################################################################################
 class ModifyVmIntNetNicCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "nets" )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg or pyvbcc.KEY_NIC_ID not in cfg:
             raise AttributeError("Missing vm name and NIC id")
 
         self._vm = cfg[ pyvbcc.KEY_VM_NAME ]
         self._nic_id = cfg[ pyvbcc.KEY_NIC_ID ]
+        self._net_name = cfg.get( pyvbcc.KEY_NIC_NETNAME, cfg.get( pyvbcc.KEY_NETWORK_NAME, "intnet" ) )
 
-        params = [ "modifyvm", self._vm ]
+        params = [ "modifyvm", self._vm, "--nic%s" % ( self._nic_id ), "intnet", "--intnet%s" % ( self._nic_id ), self._net_name ]
 
         super().__init__( params, **opt )
 
@@ -217,38 +253,78 @@ class ModifyVmIntNetNicCommand( pyvbcc.command.GenericCommand ):
 ## Listing stuff commands
 ###########################################################################################################################
 
+RX_SPACE = re.compile( r"\s+" )
+
+def _mac( value ):
+    return value.lower()
+
+## list intnets/bridgedifs/hostonlyifs/natnets labels ( lowercased, no spaces ) to NetworkRecord fields
+NETWORK_FIELDS = {
+    "name": ( "name", None ),
+    #for some reason natnet names are called "NetworkName"
+    "networkname": ( "name", None ),
+    "ipaddress": ( "ip", None ),
+    "ip": ( "ip", None ),
+    "networkmask": ( "netmask", None ),
+    "network": ( "network", None ),
+    "hardwareaddress": ( "mac", _mac ),
+    "dhcp": ( "dhcp", pyvbcc.records.to_bool ),
+    "dhcpenabled": ( "dhcp", pyvbcc.records.to_bool ),
+    "enabled": ( "enabled", pyvbcc.records.to_bool ),
+    "ipv6enabled": ( "ipv6", pyvbcc.records.to_bool ),
+    "status": ( "status", None )
+}
+
 class ListNetworkCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 30
+    CACHE_TAGS = ( "nets", )
+
     def __init__( self, mode, net = None, **opt ):
         super().__init__( [ "list", mode ], **opt )
         self._net = net
         self._mode = mode
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        item = dict()
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r":", line )
+    def _selected( self, item ):
+        return self._net == "all" or item.name == self._net
+
+    def records( self, lines ):
+        """
+            Yields ( name, NetworkRecord ) per network.
+        """
+        item = None
+        for line in lines:
+            line = line.replace( "\"", "" )
+            nldata = line.split( ":", 1 )
 
             if len( nldata ) > 1:
-                key = nldata[0].lstrip().rstrip().lower()
+                label = RX_SPACE.sub( "", nldata[0].lstrip().rstrip().lower() )
                 val = nldata[1].lstrip().rstrip()
+                field = NETWORK_FIELDS.get( label )
+
+                if field is not None and field[0] == "name":
+                    if item is not None and self._selected( item ): yield item.name, item
+                    item = pyvbcc.records.NetworkRecord( val, self._mode )
+                    continue
 
-                #for some reason natnet names are called "NetworkName"
-                if key == "networkname" :
-                    key = "name"
+                if item is None:
+                    continue
 
-                if re.match( "name", key ) and len( item ) > 0:
-                    data[ item[ 'name' ] ] = item
-                    item = dict()
-                item[ key ] = val
+                if field is not None:
+                    setattr( item, field[0], field[1]( val ) if field[1] else val )
+                else:
+                    item.properties[ label ] = val
 
-            if len( line ) == 0 and len( item ) > 0:
-                data[ item['name'] ] = item
+            if len( line ) == 0 and item is not None:
+                if self._selected( item ): yield item.name, item
+                item = None
+
+        if item is not None and self._selected( item ):
+            yield item.name, item
+
+    def parse( self, result ):
+        data = dict( self.records( result.result() ) )
 
         if self._net == "all": return data
         elif self._net in data: return data[ self._net ]
 
         return []
-
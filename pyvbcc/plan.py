@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import asyncio
+import collections
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.executor
+import pyvbcc.vm.commands
+
+"""
+    Dependency graph of VBoxManage commands.
+
+    Each node is one command object plus the keys of the nodes that must succeed before it runs. The plan
+    starts every node as soon as its dependencies are done, the executor still caps how many commands run
+    at once and serialises commands on the same machine. A node whose dependency failed is skipped.
+
+    Run with a journal ( see pyvbcc.state.StateStore ) every node that succeeds is written to it, and a node
+    the journal already holds with the same command line is restored from it instead of being run again.
+"""
+
+STATE_PENDING="pending"
+STATE_DONE="done"
+STATE_FAILED="failed"
+STATE_SKIPPED="skipped"
+
+class PlanNode( object ):
+    __slots__ = ( "key", "cmd", "deps", "state", "result", "error", "resumed" )
+
+    def __init__( self, key, cmd, deps = () ):
+        self.key = key
+        self.cmd = cmd
+        self.deps = list( deps )
+        self.state = STATE_PENDING
+        self.result = None
+        self.error = None
+        self.resumed = False
+
+    def __repr__( self ):
+        return "PlanNode(%s, %s, deps=%s)" % ( self.key, self.state, self.deps )
+
+
+class Plan( object ):
+
+    def __init__( self, **opt ):
+        self._debug = False
+        self._opt = opt
+        self._nodes = dict()
+        self._merged = dict()
+        self._saved = 0
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+    def add( self, key, cmd, deps = () ):
+        if key in self._nodes:
+            raise RuntimeError( "Duplicate plan node %s" % ( key ) )
+        node = PlanNode( key, cmd, deps )
+        self._nodes[ key ] = node
+        return node
+
+    def node( self, key ):
+        return self._nodes.get( self._merged.get( key, key ) )
+
+    def nodes( self ):
+        return list( self._nodes.values() )
+
+    def __contains__( self, key ):
+        return key in self._nodes
+
+    def __len__( self ):
+        return len( self._nodes )
+
+    def order( self ):
+        """
+            Node keys in an order where every node comes after its dependencies.
+        """
+        deps = dict()
+        users = { k: list() for k in self._nodes }
+        for key, node in self._nodes.items():
+            for d in node.deps:
+                if d not in self._nodes:
+                    raise RuntimeError( "Plan node %s depends on unknown node %s" % ( key, d ) )
+                users[ d ].append( key )
+            deps[ key ] = len( set( node.deps ) )
+
+        ready = collections.deque( [ k for k in self._nodes if deps[ k ] == 0 ] )
+        result = list()
+        while len( ready ) > 0:
+            key = ready.popleft()
+            result.append( key )
+            for u in users[ key ]:
+                deps[ u ] -= 1
+                if deps[ u ] == 0: ready.append( u )
+
+        if len( result ) != len( self._nodes ):
+            raise RuntimeError( "Plan has a dependency cycle between %s" % ( ", ".join( sorted( k for k in deps if deps[ k ] > 0 ) ) ) )
+        return result
+
+    def depth( self ):
+        """
+            Number of nodes on the longest dependency chain.
+        """
+        levels = dict()
+        for key in self.order():
+            levels[ key ] = 1 + max( [ levels[ d ] for d in self._nodes[ key ].deps ] + [ 0 ] )
+        return max( levels.values() ) if len( levels ) > 0 else 0
+
+    def _modifyvm( self, node ):
+        ## vm name when the node is a plain modifyvm command
+        if not isinstance( node.cmd, pyvbcc.command.GenericCommand ):
+            return None
+        line = node.cmd._command_line()
+        if len( line ) > 2 and line[1] == "modifyvm":
+            return line[2]
+        return None
+
+    def coalesce( self ):
+        """
+            Merges the modifyvm nodes of each VM into one node, returns how many VBoxManage processes that saves.
+            Conflicting options raise RuntimeError, a VM whose merge would create a cycle keeps its nodes.
+        """
+        groups = dict()
+        for key, node in self._nodes.items():
+            vm = self._modifyvm( node )
+            if vm is not None:
+                groups.setdefault( vm, list() ).append( key )
+
+        saved = 0
+        for vm, keys in groups.items():
+            if len( keys ) < 2:
+                continue
+
+            cmd = pyvbcc.vm.commands.CoalescedModifyVmCommand( vm, [ self._nodes[ k ].cmd for k in keys ], **self._opt )
+            merged = "modifyvm:%s" % ( vm )
+            deps = list()
+            for k in keys:
+                deps += [ d for d in self._nodes[ k ].deps if d not in keys and d not in deps ]
+
+            nodes = dict()
+            for key, node in self._nodes.items():
+                if key == keys[0]:
+                    nodes[ merged ] = PlanNode( merged, cmd, deps )
+                elif key not in keys:
+                    nodes[ key ] = node
+
+            previous = self._nodes
+            self._nodes = nodes
+            users = [ n for n in nodes.values() if len( set( n.deps ) & set( keys ) ) > 0 ]
+            replaced = { n.key: n.deps for n in users }
+            for n in users:
+                n.deps = [ d for d in n.deps if d not in keys ] + [ merged ]
+
+            try:
+                self.order()
+            except RuntimeError:
+                self._nodes = previous
+                for n in users: n.deps = replaced[ n.key ]
+                continue
+
+            for k in keys: self._merged[ k ] = merged
+            saved += len( keys ) - 1
+
+        self._saved += saved
+        return saved
+
+    def saved( self ):
+        """
+            Processes saved by coalesce() so far.
+        """
+        return self._saved
+
+    def merged( self ):
+        """
+            { original key: merged key } of the nodes coalesce() merged.
+        """
+        return dict( self._merged )
+
+    def _resume( self, node, journal ):
+        if journal is None or not isinstance( node.cmd, pyvbcc.command.GenericCommand ):
+            return False
+        line = node.cmd._command_line()
+        entry = journal.journaled( node.key, line )
+        if entry is None:
+            return False
+
+        node.result = pyvbcc.command.GenericCommandResult( line, entry[1], entry[0] )
+        node.resumed = True
+        node.state = STATE_DONE
+        return True
+
+    async def _run_node( self, node, tasks, executor, journal = None ):
+        ok = await asyncio.gather( *[ tasks[ d ] for d in node.deps ] )
+        if not all( ok ):
+            node.state = STATE_SKIPPED
+            return False
+
+        if self._resume( node, journal ):
+            if self._debug: print( "Plan: resumed %s" % ( node.key ) )
+            return True
+
+        if self._debug: print( "Plan: running %s" % ( node.key ) )
+        try:
+            node.result = await executor.submit( node.cmd )
+        except Exception as e:
+            node.error = e
+            node.state = STATE_FAILED
+            return False
+
+        if hasattr( node.result, "ok" ) and not node.result.ok():
+            node.state = STATE_FAILED
+            return False
+
+        node.state = STATE_DONE
+        if journal is not None and node.result is not None:
+            journal.journal( node.key, node.cmd._command_line(), node.result )
+        return True
+
+    async def arun( self, executor = None, journal = None ):
+        if executor is None:
+            executor = pyvbcc.executor.CommandExecutor( **self._opt )
+
+        tasks = dict()
+        for key in self.order():
+            tasks[ key ] = asyncio.ensure_future( self._run_node( self._nodes[ key ], tasks, executor, journal ) )
+        await asyncio.gather( *tasks.values() )
+        return self.states()
+
+    def run( self, executor = None, journal = None ):
+        """
+            Runs the whole plan, returns { key: state }.
+        """
+        return asyncio.run( self.arun( executor, journal ) )
+
+    def resumed( self ):
+        """
+            Keys of the nodes restored from the journal instead of being run.
+        """
+        return [ k for k, n in self._nodes.items() if n.resumed ]
+
+    def states( self ):
+        return { k: n.state for k, n in self._nodes.items() }
+
+    def ok( self ):
+        return all( n.state == STATE_DONE for n in self._nodes.values() )
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import io
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+import contextlib
+
+from pprint import pprint
+
+import pyvbcc
+
+"""
+    Profiling of a whole CLI run, --profile and --profile-mem on bin/pyvbcc and bin/vbm.
+
+    --profile runs parse, action and output under cProfile, --profile-mem under tracemalloc. At the end the
+    top functions by own time and the top allocation sites are printed, the raw profile is dumped to
+    <prefix>.pstats ( snakeviz, pstats ) and a summary with the wall time of each section to <prefix>.json.
+"""
+
+DEF_TOP=20
+DEF_PREFIX="pyvbcc-profile"
+
+class Profiler( object ):
+
+    def __init__( self, cpu = True, mem = False, top = DEF_TOP ):
+        self._cpu = cpu
+        self._mem = mem
+        self._top = top
+        self._profile = cProfile.Profile() if cpu else None
+        self._snapshot = None
+        self._peak = None
+        self._sections = dict()
+        self._start = None
+        self._wall = None
+
+    def start( self ):
+        if self._mem and not tracemalloc.is_tracing():
+            tracemalloc.start( 10 )
+        if self._profile is not None:
+            self._profile.enable()
+        self._start = time.perf_counter()
+
+    def stop( self ):
+        self._wall = time.perf_counter() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+        if self._mem and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def section( self, name ):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sections[ name ] = self._sections.get( name, 0.0 ) + time.perf_counter() - start
+
+    def functions( self ):
+        """
+            Top functions by own time.
+        """
+        if self._profile is None:
+            return list()
+        stats = pstats.Stats( self._profile, stream=io.StringIO() )
+        rows = list()
+        for ( filename, line, func ), ( cc, nc, tt, ct, callers ) in stats.stats.items():
+            rows.append( { "function": func, "file": filename, "line": line, "calls": nc, "tottime": round( tt, 6 ), "cumtime": round( ct, 6 ) } )
+        rows.sort( key=lambda r: -r[ "tottime" ] )
+        return rows[ :self._top ]
+
+    def allocations( self ):
+        """
+            Top allocation sites by size still allocated at the end of the run.
+        """
+        if self._snapshot is None:
+            return list()
+        snapshot = self._snapshot.filter_traces( [ tracemalloc.Filter( False, tracemalloc.__file__ ) ] )
+        rows = list()
+        for stat in snapshot.statistics( "lineno" )[ :self._top ]:
+            frame = stat.traceback[0]
+            rows.append( { "file": frame.filename, "line": frame.lineno, "size": stat.size, "count": stat.count } )
+        return rows
+
+    def summary( self ):
+        res = { "wall": round( self._wall or 0.0, 6 ), "sections": { k: round( v, 6 ) for k, v in self._sections.items() } }
+        if self._cpu: res[ "functions" ] = self.functions()
+        if self._mem:
+            res[ "peak" ] = self._peak
+            res[ "allocations" ] = self.allocations()
+        return res
+
+    def dump( self, prefix = DEF_PREFIX ):
+        """
+            Writes <prefix>.pstats ( with --profile ) and <prefix>.json, returns the files written.
+        """
+        files = list()
+        if self._profile is not None:
+            self._profile.dump_stats( "%s.pstats" % ( prefix ) )
+            files.append( "%s.pstats" % ( prefix ) )
+        with open( "%s.json" % ( prefix ), "w" ) as fd:
+            json.dump( self.summary(), fd, indent=2 )
+        files.append( "%s.json" % ( prefix ) )
+        return files
+
+    def print_report( self, out = sys.stderr ):
+        summary = self.summary()
+        out.write( "# profile: %.3fs wall, %s\n" % ( summary[ "wall" ], ", ".join( "%s %.3fs" % ( k, v ) for k, v in summary[ "sections" ].items() ) ) )
+        if self._cpu:
+            out.write( "# %10s %10s %10s  %s\n" % ( "calls", "tottime", "cumtime", "function" ) )
+            for r in summary[ "functions" ]:
+                out.write( "  %10s %10.4f %10.4f  %s:%s(%s)\n" % ( r[ "calls" ], r[ "tottime" ], r[ "cumtime" ], r[ "file" ], r[ "line" ], r[ "function" ] ) )
+        if self._mem:
+            out.write( "# memory peak %s bytes\n" % ( summary[ "peak" ] ) )
+            out.write( "# %10s %8s  %s\n" % ( "bytes", "blocks", "allocated at" ) )
+            for r in summary[ "allocations" ]:
+                out.write( "  %10s %8s  %s:%s\n" % ( r[ "size" ], r[ "count" ], r[ "file" ], r[ "line" ] ) )
+
+
+_profiler = None
+
+def Start( cpu = True, mem = False, top = DEF_TOP ):
+    global _profiler
+    _profiler = Profiler( cpu, mem, top )
+    _profiler.start()
+    return _profiler
+
+def Section( name ):
+    if _profiler is None:
+        return contextlib.nullcontext()
+    return _profiler.section( name )
+
+def Stop( prefix = DEF_PREFIX, out = sys.stderr ):
+    """
+        Stops profiling, prints the report and dumps it, returns the files written.
+    """
+    global _profiler
+    if _profiler is None:
+        return list()
+    profiler, _profiler = _profiler, None
+    profiler.stop()
+    profiler.print_report( out )
+    return profiler.dump( prefix )
+
+
+if __name__ == "__main__":
+    pass
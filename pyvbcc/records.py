@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import enum
+import uuid
+
+from pprint import pprint
+
+"""
+    Typed records returned by the VBoxManage output parsers.
+
+    Records use __slots__ so large inventories do not carry a dict per object, numbers are parsed once into
+    ints ( sizes in bytes, memory in MiB ), states are VmState members and UUIDs are uuid.UUID.
+    to_dict() gives the plain structure used for printing.
+"""
+
+RX_SIZE = re.compile( r'^(\d+)\s*([KMGT]?)Bytes$' )
+
+SIZE_UNITS = { "": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4 }
+
+class VmState( str, enum.Enum ):
+    """
+        Machine states, values as showvminfo --machinereadable spells them. Members compare equal to those strings.
+    """
+    POWEROFF = "poweroff"
+    SAVED = "saved"
+    TELEPORTED = "teleported"
+    ABORTED = "aborted"
+    RUNNING = "running"
+    PAUSED = "paused"
+    GURUMEDITATION = "gurumeditation"
+    TELEPORTING = "teleporting"
+    LIVESNAPSHOTTING = "livesnapshotting"
+    STARTING = "starting"
+    STOPPING = "stopping"
+    SAVING = "saving"
+    RESTORING = "restoring"
+    DELETINGSNAPSHOT = "deletingsnapshot"
+    DELETINGSNAPSHOTLIVE = "deletingsnapshotlive"
+    INACCESSIBLE = "inaccessible"
+    UNKNOWN = "unknown"
+
+def to_state( value ):
+    if value is None:
+        return None
+    try:
+        return VmState( value )
+    except ValueError:
+        return VmState.UNKNOWN
+
+def to_uuid( value ):
+    if value is None or isinstance( value, uuid.UUID ):
+        return value
+    try:
+        return uuid.UUID( value )
+    except ( TypeError, ValueError, AttributeError ):
+        return None
+
+def to_bytes( value ):
+    """
+        "8192 MBytes" -> 8589934592, None if the value is not a size.
+    """
+    if value is None:
+        return None
+    m = RX_SIZE.match( value.lstrip().rstrip() )
+    if not m:
+        return None
+    return int( m.group(1) ) * SIZE_UNITS[ m.group(2) ]
+
+def to_bool( value ):
+    if value is None:
+        return None
+    return value.lstrip().rstrip().lower() in ( "yes", "true", "on", "enabled", "1" )
+
+def _plain( v ):
+    if isinstance( v, Record ):
+        return v.to_dict()
+    if isinstance( v, enum.Enum ):
+        return v.value
+    if isinstance( v, uuid.UUID ):
+        return str( v )
+    if type( v ).__name__ in ( "list", "tuple" ):
+        return [ _plain( x ) for x in v ]
+    if type( v ).__name__ == "dict":
+        return { _plain( x ): _plain( v[x] ) for x in v }
+    return v
+
+def to_dict( data ):
+    """
+        Plain dicts, lists and strings for anything holding records, for printing.
+    """
+    return _plain( data )
+
+
+class Record( object ):
+    __slots__ = ()
+
+    def to_dict( self ):
+        return { k: _plain( getattr( self, k ) ) for k in self.__slots__ }
+
+    def __repr__( self ):
+        return "%s(%s)" % ( type( self ).__name__, ", ".join( "%s=%r" % ( k, getattr( self, k ) ) for k in self.__slots__ ) )
+
+    def __eq__( self, other ):
+        return type( self ) is type( other ) and all( getattr( self, k ) == getattr( other, k ) for k in self.__slots__ )
+
+
+class VmRecord( Record ):
+    __slots__ = (
+        "name", "uuid", "ostype", "state", "state_since", "memory", "cpus", "groups", "cfgfile", "description",
+        "controllers", "storage", "nics", "forwarding", "properties"
+    )
+
+    def __init__( self, name = None, uuid = None ):
+        self.name = name
+        self.uuid = to_uuid( uuid )
+        self.ostype = None
+        self.state = None
+        self.state_since = None
+        ## MiB
+        self.memory = None
+        self.cpus = None
+        self.groups = list()
+        self.cfgfile = None
+        self.description = None
+        self.controllers = dict()
+        self.storage = dict()
+        self.nics = dict()
+        self.forwarding = list()
+        self.properties = dict()
+
+
+class DiskRecord( Record ):
+    __slots__ = (
+        "uuid", "parent", "state", "type", "location", "format", "capacity", "size", "encryption", "vms", "properties"
+    )
+
+    def __init__( self, uuid = None ):
+        self.uuid = to_uuid( uuid )
+        ## parent disk of a differencing image, None for a base image
+        self.parent = None
+        self.state = None
+        self.type = None
+        self.location = None
+        self.format = None
+        ## bytes
+        self.capacity = None
+        self.size = None
+        self.encryption = None
+        ## [ { "name": vm name, "uuid": vm uuid } ] of the VMs using the disk
+        self.vms = list()
+        self.properties = dict()
+
+
+class NetworkRecord( Record ):
+    __slots__ = (
+        "name", "type", "ip", "netmask", "network", "mac", "dhcp", "enabled", "ipv6", "status", "properties"
+    )
+
+    def __init__( self, name = None, type = None ):
+        self.name = name
+        ## intnets, bridgedifs, hostonlyifs or natnets
+        self.type = type
+        self.ip = None
+        self.netmask = None
+        ## address/prefix
+        self.network = None
+        self.mac = None
+        self.dhcp = None
+        self.enabled = None
+        self.ipv6 = None
+        self.status = None
+        self.properties = dict()
+
+
+class OsTypeRecord( Record ):
+    __slots__ = ( "id", "description", "family_id", "family_desc", "bits64", "properties" )
+
+    def __init__( self, id = None ):
+        self.id = id
+        self.description = None
+        self.family_id = None
+        self.family_desc = None
+        self.bits64 = None
+        self.properties = dict()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import time
+import sqlite3
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.utils
+import pyvbcc.vm.commands
+
+"""
+    What pyvbcc has created, kept in a small SQLite database next to etc/pyvbcc.json.
+
+    Every host, disk and network spec of an environment is fingerprinted over its canonical JSON form ( sorted
+    keys, no whitespace ) and stored once all of its commands succeeded, the next apply compares them with the
+    environment file and plans only new and changed entities. Next to the specs the store keeps the UUIDs,
+    disk paths, MACs and last known power state of the VMs, media and networks themselves, so info and destroy
+    know what is managed without asking VBoxManage first.
+
+    While a plan runs every finished command is journaled with its exit code and output, vbm create --resume
+    replays the journal instead of running those commands again.
+
+    VMs and networks are kept per group, a NAT network two groups use stays until the last one is destroyed.
+
+    The database runs in WAL mode, readers are never blocked by a running apply. It lives next to the main
+    configuration file, PYVBCC_STATE in the environment points the store at another file.
+"""
+
+STATE_FILE="pyvbcc.db"
+DEF_STATE_FILE=os.path.join( "etc", STATE_FILE )
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS entities (
+        grp TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL,
+        fingerprint TEXT NOT NULL, spec TEXT NOT NULL, updated REAL,
+        PRIMARY KEY ( grp, kind, name ) )""",
+    """CREATE TABLE IF NOT EXISTS vms (
+        grp TEXT NOT NULL, name TEXT NOT NULL, uuid TEXT, ostype TEXT, state TEXT, updated REAL,
+        PRIMARY KEY ( grp, name ) )""",
+    """CREATE TABLE IF NOT EXISTS media (
+        location TEXT PRIMARY KEY, uuid TEXT, grp TEXT, vm TEXT, size TEXT, format TEXT, updated REAL )""",
+    """CREATE TABLE IF NOT EXISTS nics (
+        vm TEXT NOT NULL, slot INTEGER NOT NULL, mac TEXT, type TEXT, network TEXT,
+        PRIMARY KEY ( vm, slot ) )""",
+    """CREATE TABLE IF NOT EXISTS networks (
+        grp TEXT NOT NULL, name TEXT NOT NULL, type TEXT, network TEXT, updated REAL,
+        PRIMARY KEY ( grp, name ) )""",
+    """CREATE TABLE IF NOT EXISTS journal (
+        grp TEXT NOT NULL, key TEXT NOT NULL, command TEXT NOT NULL, exitcode INTEGER, output TEXT, finished REAL,
+        PRIMARY KEY ( grp, key ) )""",
+    "CREATE INDEX IF NOT EXISTS vms_grp ON vms ( grp )",
+    "CREATE INDEX IF NOT EXISTS media_grp ON media ( grp )",
+    "CREATE INDEX IF NOT EXISTS media_vm ON media ( vm )"
+]
+
+def state_file( config = None ):
+    """
+        The state store's file: PYVBCC_STATE when set, else pyvbcc.db next to the main configuration file
+        config ( etc/pyvbcc.json when none is given ).
+    """
+    filename = pyvbcc.utils.read_env( "PYVBCC_STATE" )
+    if filename:
+        return filename
+    if config is None:
+        return DEF_STATE_FILE
+    return os.path.join( os.path.dirname( config ), STATE_FILE )
+
+def canonical( spec ):
+    return json.dumps( spec, sort_keys=True, separators=( ",", ":" ) )
+
+def fingerprint( spec ):
+    return pyvbcc.utils.data_hash( canonical( spec ), checksum="sha256" )
+
+
+class StateStore( object ):
+
+    def __init__( self, filename = DEF_STATE_FILE, group = None, **opt ):
+        self._debug = False
+        self._filename = filename
+        ## without a group the managed objects of every group are listed, specs are kept under ""
+        self._group = group
+        self._key = group if group else ""
+        self._conn = None
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+    def filename( self ):
+        return self._filename
+
+    def group( self ):
+        return self._group
+
+    def _db( self ):
+        if self._conn is not None:
+            return self._conn
+
+        if self._filename != ":memory:":
+            os.makedirs( os.path.dirname( os.path.abspath( self._filename ) ), exist_ok=True )
+        self._conn = sqlite3.connect( self._filename, timeout=30 )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute( "PRAGMA journal_mode=WAL" )
+        self._conn.execute( "PRAGMA synchronous=NORMAL" )
+        for stmt in SCHEMA:
+            self._conn.execute( stmt )
+        self._conn.commit()
+        return self._conn
+
+    def journal_mode( self ):
+        return self._db().execute( "PRAGMA journal_mode" ).fetchone()[0]
+
+    def save( self ):
+        if self._conn is not None:
+            self._conn.commit()
+
+    def close( self ):
+        if self._conn is not None:
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+    def _rows( self, query, args = () ):
+        return [ dict( r ) for r in self._db().execute( query, args ).fetchall() ]
+
+    def _scoped( self, query, args ):
+        ## a store without a group sees every group, VirtualBox keeps VM names unique anyway
+        if self._group is None:
+            return query, tuple( args )
+        return query + " AND grp = ?", tuple( args ) + ( self._key, )
+
+    def _select( self, table, order ):
+        if self._group is None:
+            return self._rows( "SELECT * FROM %s ORDER BY grp, %s" % ( table, order ) )
+        return self._rows( "SELECT * FROM %s WHERE grp = ? ORDER BY %s" % ( table, order ), ( self._group, ) )
+
+    ###################################################################################################################
+    ## Specs
+    ###################################################################################################################
+    def get( self, kind, name ):
+        """
+            { "fingerprint": ..., "spec": ... } of an entity, None if it was never created.
+        """
+        row = self._db().execute( "SELECT fingerprint, spec FROM entities WHERE grp = ? AND kind = ? AND name = ?", ( self._key, kind, name ) ).fetchone()
+        if row is None:
+            return None
+        return { "fingerprint": row[ "fingerprint" ], "spec": json.loads( row[ "spec" ] ) }
+
+    def put( self, kind, name, spec ):
+        self._db().execute( "INSERT OR REPLACE INTO entities VALUES ( ?, ?, ?, ?, ?, ? )",
+                            ( self._key, kind, name, fingerprint( spec ), canonical( spec ), time.time() ) )
+
+    def remove( self, kind, name ):
+        self._db().execute( "DELETE FROM entities WHERE grp = ? AND kind = ? AND name = ?", ( self._key, kind, name ) )
+
+    def names( self, kind ):
+        return [ r[0] for r in self._db().execute( "SELECT name FROM entities WHERE grp = ? AND kind = ? ORDER BY name", ( self._key, kind ) ) ]
+
+    def changed( self, kind, name, spec ):
+        """
+            None for a new entity, False when the spec is unchanged, the previous spec when it changed.
+        """
+        entry = self.get( kind, name )
+        if entry is None:
+            return None
+        if entry[ "fingerprint" ] == fingerprint( spec ):
+            return False
+        return entry[ "spec" ]
+
+    ###################################################################################################################
+    ## Managed objects
+    ###################################################################################################################
+    def put_vm( self, name, uuid = None, ostype = None, state = None ):
+        ## an update without a uuid keeps the one recorded at creation
+        old = self.vm( name )
+        if old is not None:
+            uuid = uuid if uuid is not None else old[ "uuid" ]
+            state = state if state is not None else old[ "state" ]
+        self._db().execute( "INSERT OR REPLACE INTO vms VALUES ( ?, ?, ?, ?, ?, ? )",
+                            ( self._key, name, uuid, ostype, state, time.time() ) )
+
+    def set_power( self, name, state ):
+        self._db().execute( *self._scoped( "UPDATE vms SET state = ?, updated = ? WHERE name = ?", ( state, time.time(), name ) ) )
+
+    def vm( self, name ):
+        rows = self._rows( *self._scoped( "SELECT * FROM vms WHERE name = ?", ( name, ) ) )
+        return rows[0] if len( rows ) > 0 else None
+
+    def vms( self ):
+        return self._select( "vms", "name" )
+
+    def put_medium( self, location, uuid = None, vm = None, size = None, format = None ):
+        old = self._rows( "SELECT uuid FROM media WHERE location = ?", ( location, ) )
+        if uuid is None and len( old ) > 0:
+            uuid = old[0][ "uuid" ]
+        self._db().execute( "INSERT OR REPLACE INTO media VALUES ( ?, ?, ?, ?, ?, ?, ? )",
+                            ( location, uuid, self._key, vm, size, format, time.time() ) )
+
+    def media( self, vm = None ):
+        if vm is None:
+            return self._select( "media", "location" )
+        return self._rows( "SELECT * FROM media WHERE vm = ? ORDER BY location", ( vm, ) )
+
+    def put_nic( self, vm, slot, mac = None, type = None, network = None ):
+        self._db().execute( "INSERT OR REPLACE INTO nics VALUES ( ?, ?, ?, ?, ? )", ( vm, int( slot ), mac, type, network ) )
+
+    def drop_nics( self, vm, first = 1 ):
+        self._db().execute( "DELETE FROM nics WHERE vm = ? AND slot >= ?", ( vm, int( first ) ) )
+
+    def nics( self, vm ):
+        return self._rows( "SELECT * FROM nics WHERE vm = ? ORDER BY slot", ( vm, ) )
+
+    def put_network( self, name, type = None, network = None ):
+        self._db().execute( "INSERT OR REPLACE INTO networks VALUES ( ?, ?, ?, ?, ? )", ( self._key, name, type, network, time.time() ) )
+
+    def networks( self ):
+        return self._select( "networks", "name" )
+
+    def network_groups( self, name ):
+        """
+            Other groups that declare the network or have a NIC on it.
+        """
+        rows = self._db().execute( "SELECT grp FROM networks WHERE name = ? AND grp != ? "
+                                   "UNION SELECT vms.grp FROM nics JOIN vms ON nics.vm = vms.name WHERE nics.network = ? AND vms.grp != ?",
+                                   ( name, self._key, name, self._key ) )
+        return sorted( r[0] for r in rows )
+
+    def drop_vm( self, name ):
+        """
+            Forgets a VM with its NICs and the media only it used.
+        """
+        db = self._db()
+        db.execute( "DELETE FROM nics WHERE vm = ?", ( name, ) )
+        db.execute( "DELETE FROM media WHERE vm = ?", ( name, ) )
+        db.execute( *self._scoped( "DELETE FROM vms WHERE name = ?", ( name, ) ) )
+
+    def drop_medium( self, location ):
+        self._db().execute( "DELETE FROM media WHERE location = ?", ( location, ) )
+
+    def drop_network( self, name ):
+        self._db().execute( *self._scoped( "DELETE FROM networks WHERE name = ?", ( name, ) ) )
+
+    def managed( self ):
+        vms = self.vms()
+        for vm in vms:
+            vm[ "nics" ] = self.nics( vm[ "name" ] )
+        return { "vms": vms, "media": self.media(), "networks": self.networks() }
+
+    ###################################################################################################################
+    ## Journal
+    ###################################################################################################################
+    def journal( self, key, command, result ):
+        """
+            Records a finished plan node, committed at once so a crashed build keeps it.
+        """
+        self._db().execute( "INSERT OR REPLACE INTO journal VALUES ( ?, ?, ?, ?, ?, ? )",
+                            ( self._key, key, json.dumps( command ), result.exitcode(), json.dumps( result.result() ), time.time() ) )
+        self._db().commit()
+
+    def journaled( self, key, command ):
+        """
+            ( exitcode, output ) of a node finished with exactly this command line, None otherwise.
+        """
+        row = self._db().execute( "SELECT command, exitcode, output FROM journal WHERE grp = ? AND key = ?", ( self._key, key ) ).fetchone()
+        if row is None or json.loads( row[ "command" ] ) != list( command ):
+            return None
+        return row[ "exitcode" ], json.loads( row[ "output" ] )
+
+    def journal_size( self ):
+        return self._db().execute( "SELECT COUNT(*) FROM journal WHERE grp = ?", ( self._key, ) ).fetchone()[0]
+
+    def clear_journal( self ):
+        self._db().execute( "DELETE FROM journal WHERE grp = ?", ( self._key, ) )
+        self._db().commit()
+
+
+def GetStateStore( group = None, opt = {}, filename = None ):
+    if filename is None:
+        filename = state_file( opt.get( pyvbcc.KEY_CONFIG_FILE ) )
+    return StateStore( filename, group, **opt )
+
+def GetManagedInfo( opt ):
+    """
+        Everything pyvbcc created, for one group when one is given. With --long the VMs are checked
+        against list vms and get a "registered" flag.
+    """
+    store = GetStateStore( opt.get( pyvbcc.KEY_GROUP_NAME ), opt )
+    res = store.managed()
+
+    if opt.get( pyvbcc.KEY_SYSTEM_LONG ):
+        registered = pyvbcc.vm.commands.ListVmsCommand( **opt ).run()
+        for vm in res[ "vms" ]:
+            vm[ "registered" ] = vm[ "name" ] in registered
+    store.close()
+    return res
+
+
+if __name__ == "__main__":
+    pass
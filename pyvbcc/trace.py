@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import time
+import threading
+import contextlib
+
+from pprint import pprint
+
+import pyvbcc
+
+"""
+    Spans of what a run spent its time on, written in the Chrome trace event format.
+
+    Front end steps ( parse, validate, plan ... ) are nested spans on the main lane. Every VBoxManage call
+    gets the lowest lane free while it runs, so calls that ran in parallel show up side by side and calls
+    that serialised share a lane. Command spans are tagged with the VM and sub-command. The file written by
+    Write() opens in chrome://tracing and in Perfetto.
+
+    Tracing is off unless Enable() was called, spans then cost one check.
+"""
+
+MAIN_LANE=0
+
+class Tracer( object ):
+
+    def __init__( self ):
+        self._lock = threading.Lock()
+        self._events = list()
+        self._busy = set()
+        self._lanes = 0
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+
+    def _now( self ):
+        return int( ( time.perf_counter() - self._origin ) * 1000000 )
+
+    def _lane( self ):
+        lane = 1
+        while lane in self._busy:
+            lane += 1
+        self._busy.add( lane )
+        self._lanes = max( self._lanes, lane )
+        return lane
+
+    def begin( self, name, cat = "pyvbcc", lane = False, **args ):
+        """
+            Starts a span, lane=True puts it on a lane of its own instead of the main one.
+        """
+        with self._lock:
+            return { "name": name, "cat": cat, "ts": self._now(), "tid": self._lane() if lane else MAIN_LANE, "args": args }
+
+    def end( self, token, **args ):
+        with self._lock:
+            event = dict( token )
+            event[ "ph" ] = "X"
+            event[ "pid" ] = self._pid
+            event[ "dur" ] = max( 0, self._now() - token[ "ts" ] )
+            event[ "args" ] = dict( token[ "args" ], **args )
+            self._events.append( event )
+            if token[ "tid" ] != MAIN_LANE:
+                self._busy.discard( token[ "tid" ] )
+
+    @contextlib.contextmanager
+    def span( self, name, cat = "pyvbcc", **args ):
+        token = self.begin( name, cat, **args )
+        try:
+            yield token
+        finally:
+            self.end( token )
+
+    def events( self ):
+        with self._lock:
+            return sorted( self._events, key=lambda e: ( e[ "ts" ], -e[ "dur" ] ) )
+
+    def to_dict( self ):
+        meta = [ { "name": "process_name", "ph": "M", "pid": self._pid, "tid": MAIN_LANE, "args": { "name": "pyvbcc" } },
+                 { "name": "thread_name", "ph": "M", "pid": self._pid, "tid": MAIN_LANE, "args": { "name": "main" } } ]
+        for lane in range( 1, self._lanes + 1 ):
+            meta.append( { "name": "thread_name", "ph": "M", "pid": self._pid, "tid": lane, "args": { "name": "VBoxManage %s" % ( lane ) } } )
+        return { "traceEvents": meta + self.events(), "displayTimeUnit": "ms" }
+
+    def write( self, filename ):
+        dirname = os.path.dirname( os.path.abspath( filename ) )
+        os.makedirs( dirname, exist_ok=True )
+        with open( filename, "w" ) as fd:
+            json.dump( self.to_dict(), fd )
+
+
+_tracer = None
+
+def Enable():
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
+
+def Disable():
+    global _tracer
+    _tracer = None
+
+def GetTracer():
+    return _tracer
+
+def Enabled():
+    return _tracer is not None
+
+def Begin( name, cat = "pyvbcc", lane = False, **args ):
+    if _tracer is None:
+        return None
+    return _tracer.begin( name, cat, lane, **args )
+
+def End( token, **args ):
+    if _tracer is None or token is None:
+        return
+    _tracer.end( token, **args )
+
+def Span( name, cat = "pyvbcc", **args ):
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.span( name, cat, **args )
+
+def Write( filename ):
+    if _tracer is not None:
+        _tracer.write( filename )
+
+
+if __name__ == "__main__":
+    pass
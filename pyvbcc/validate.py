@@ -8,6 +8,7 @@ from pprint import pprint
 
 import pyvbcc
 import pyvbcc.config
+import pyvbcc.trace
 
 
 class Validator( object ):
@@ -74,6 +75,10 @@ class Validator( object ):
 
 
     def validate( self, valdata, **opt ):
+        with pyvbcc.trace.Span( "validate", "validate" ):
+            return self._validate( valdata, **opt )
+
+    def _validate( self, valdata, **opt ):
         results = dict()
         if not type( valdata ).__name__ == "dict": raise AttributeError( "Validate input must be of type dict.")
 
@@ -4,31 +4,669 @@ import os, sys, re
 from pathlib import Path
 from pprint import pprint
 
+import pyvbcc
+import pyvbcc.utils
+import pyvbcc.plan
+import pyvbcc.state
+import pyvbcc.trace
+import pyvbcc.info.commands
+import pyvbcc.vm.commands
+import pyvbcc.vm.ostypes
+import pyvbcc.vm.pool
+import pyvbcc.disk
+import pyvbcc.disk.commands
+import pyvbcc.net.commands
+
+"""
+    Environment files ( see samples/env.json ) and the plan of VBoxManage commands that builds them.
+
+    Every network, VM, controller, disk, attachment and NIC becomes one plan node depending on what it needs:
+    NAT networks before the NICs using them, createvm before the VM's controllers, disks and NICs, the
+    controller and the disk before the attachment. Independent nodes run in parallel.
+
+    A host naming a template ( "templates" of the environment ) is not built from scratch but cloned with
+    clonevm --options link from the template's snapshot, sharing the template's disks through differencing
+    images. The template VM is registered ( when its "file" is given ) and snapshotted once, on the first
+    create, hosts then take seconds each. Its own disks go on a controller of their own, the clone keeps the
+    template's controllers.
+
+    A template with "pool": N keeps N clones ready in /pyvbcc-pool/<template> ( see pyvbcc/vm/pool.py ). New
+    hosts take a member with one modifyvm while there are some, the rest are cloned, and every create tops
+    the pools up in the background once it is done.
+"""
+
+RX_SIZE = re.compile( r'^(\d+)\s*([MGT]?)B?$', re.IGNORECASE )
+RX_MAC = re.compile( r'^[0-9A-F]{12}$' )
+## createvm and createmedium both report the new object as "UUID: ..."
+RX_CREATED_UUID = re.compile( r'UUID:\s*([0-9a-fA-F\-]{36})' )
+
+SIZE_MB = { "": 1, "M": 1, "G": 1024, "T": 1024 * 1024 }
+
+## env.json nic types to --nic<n> values, a NAT nic naming a network is attached to that NAT network
+NIC_TYPES = {
+    "nat": "nat",
+    "natnet": "natnetwork",
+    "natnetwork": "natnetwork",
+    "host": "hostonly",
+    "hostonly": "hostonly",
+    "intnet": "intnet",
+    "internal": "intnet",
+    "bridged": "bridged",
+    "bridge": "bridged"
+}
+
+DEF_CONTROLLER = { "type": "sata", "chipset": "IntelAHCI", "name": "SATA" }
+DEF_DVD_CONTROLLER = { "type": "ide", "chipset": "PIIX4", "name": "IDE" }
+## disks of a cloned host, the template's controllers already use the usual names
+DEF_CLONE_CONTROLLER = { "type": "sata", "chipset": "IntelAHCI", "name": "SATA-pyvbcc" }
+DEF_TEMPLATE_SNAPSHOT = "pyvbcc-base"
+
+def size_mb( value ):
+    """
+        "8G" -> "8192", plain numbers are MB.
+    """
+    m = RX_SIZE.match( str( value ).lstrip().rstrip() )
+    if not m:
+        raise AttributeError( "Invalid disk size %s" % ( value ) )
+    return str( int( m.group(1) ) * SIZE_MB[ m.group(2).upper() ] )
+
+def mac_address( value ):
+    """
+        "08:00:27:00:00:01" -> "080027000001" as modifyvm wants it.
+    """
+    mac = str( value ).replace( ":", "" ).replace( "-", "" ).upper()
+    if not RX_MAC.match( mac ):
+        raise AttributeError( "Invalid MAC address %s" % ( value ) )
+    return mac
+
 
 class VbEnvironment( object ):
 
     def __init__( self, mode, filename, **opt ):
+        self._debug = False
+        self._mode = mode
+        self._filename = filename
+        self._opt = opt
 
         if "debug" in opt and opt['debug'] in (True, False):
             self._debug = opt["debug"]
 
-        pass
+        if not pyvbcc.utils.file_is_json( filename ):
+            raise RuntimeError( "Unexpected environment file %s, must be json" % ( filename ) )
+
+        self._data = pyvbcc.utils.load_file( filename )
+        self._system = self._data.get( "system", dict() )
+        self._entities = dict()
+        self._pools = dict()
+        self._vms = None
+
+        ## an environment may name its own VBoxManage, "emulator" runs the stand-in of pyvbcc.emulator
+        if "command" in self._system and pyvbcc.KEY_SYSTEM_COMMAND not in self._opt:
+            self._opt[ pyvbcc.KEY_SYSTEM_COMMAND ] = self._system[ "command" ]
+
+    def mode( self ):
+        return self._mode
+
+    def group( self ):
+        return self._system.get( "group", Path( self._filename ).stem )
+
+    def command( self ):
+        return self._opt.get( pyvbcc.KEY_SYSTEM_COMMAND )
+
+    def machinefolder( self ):
+        if "machinefolder" not in self._system:
+            props = pyvbcc.info.commands.ListSystemPropertiesCommand( **self._opt ).run()
+            self._system[ "machinefolder" ] = props.get( "defaultmachinefolder", os.path.join( os.path.expanduser( "~" ), "VirtualBox VMs" ) )
+        return self._system[ "machinefolder" ]
+
+    def hosts( self ):
+        return self._data.get( "hosts", list() )
+
+    def networks( self ):
+        return self._data.get( "networks", list() )
+
+    def disks( self ):
+        return self._data.get( "disks", list() )
+
+    def templates( self ):
+        return self._data.get( "templates", list() )
+
+    def template( self, name ):
+        for tpl in self.templates():
+            if tpl[ "name" ] == name:
+                return tpl
+        raise AttributeError( "Unknown template %s" % ( name ) )
+
+    def template_vm( self, tpl ):
+        """
+            VM a template clones, ( name, snapshot ).
+        """
+        return tpl.get( "vm", tpl[ "name" ] ), tpl.get( "snapshot", DEF_TEMPLATE_SNAPSHOT )
+
+    def pool( self, tpl ):
+        """
+            VmPool of a template, None when it keeps no pool.
+        """
+        if int( tpl.get( "pool", 0 ) ) < 1:
+            return None
+        vm, snapshot = self.template_vm( tpl )
+        return pyvbcc.vm.pool.VmPool( tpl[ "name" ], vm, snapshot, tpl[ "pool" ], self.machinefolder(), **self._opt )
+
+    def refill( self ):
+        """
+            Starts filling the pool of every template that keeps one, returns the processes.
+        """
+        pools = [ self.pool( tpl ) for tpl in self.templates() ]
+        return [ p.refill() for p in pools if p is not None ]
+
+    def host_type( self, host ):
+        if "type" not in host and host.get( "template" ):
+            return pyvbcc.vm.ostypes.resolve( self.template( host[ "template" ] ).get( "type", "Other" ) )
+        return pyvbcc.vm.ostypes.resolve( host.get( "type", "Other" ) )
+
+    def disk_file( self, disk, host = None ):
+        if "file" in disk:
+            return disk[ "file" ]
+        name = "%s.%s" % ( disk[ "name" ], disk.get( "format", "vdi" ) )
+        if host is None:
+            return os.path.join( self.machinefolder(), self.group(), name )
+        return os.path.join( self.machinefolder(), self.group(), host[ "name" ], name )
+
+    ###################################################################################################################
+    ## Plan
+    ###################################################################################################################
+    def _add( self, plan, entity, key, cmd, deps = () ):
+        plan.add( key, cmd, [ d for d in deps if d is not None ] )
+        self._entities[ entity ][1].append( key )
+        return key
+
+    def _nat_cfg( self, net ):
+        address, sep, cidr = str( net[ "network" ] ).partition( "/" )
+        return {
+            pyvbcc.KEY_NETWORK_NAME: net[ "name" ],
+            pyvbcc.KEY_NETWORK_ADDR: address,
+            pyvbcc.KEY_NETWORK_CIDR: net.get( "cidr", cidr or "24" ),
+            pyvbcc.KEY_NETWORK_ENABLED: net.get( "enabled", True ),
+            pyvbcc.KEY_NETWORK_DHCP: net.get( "dhcp", True ),
+            pyvbcc.KEY_NETWORK_IPV6: net.get( "ipv6", False )
+        }
+
+    def _plan_network( self, plan, entity, net, previous ):
+        if net.get( "type", "natnet" ) not in ( "nat", "natnet", "natnetwork" ):
+            ## host-only and internal networks need no creation step, they must exist or appear on use
+            return
+
+        if previous is None:
+            self._add( plan, entity, "net:%s" % ( net[ "name" ] ), pyvbcc.net.commands.CreateNatNetworkCommand( self._nat_cfg( net ), **self._opt ) )
+        else:
+            self._add( plan, entity, "net:%s" % ( net[ "name" ] ), pyvbcc.net.commands.ModifyNatNetworkCommand( self._nat_cfg( net ), **self._opt ) )
+
+    def _plan_template( self, plan, entity, tpl, previous ):
+        """
+            Registers the template VM and takes the snapshot hosts are cloned from unless the VM has it already,
+            other groups and earlier state stores share it. A changed template gets a new snapshot, clones made
+            before keep the old one.
+        """
+        key = "template:%s" % ( tpl[ "name" ] )
+        vm, snapshot = self.template_vm( tpl )
+        old = previous if previous is not None else dict()
+
+        register = None
+        if tpl.get( "file" ) and tpl.get( "file" ) != old.get( "file" ):
+            register = self._add( plan, entity, "%s:register" % ( key ), pyvbcc.vm.commands.RegisterVmCommand( { pyvbcc.KEY_DISKS_FILE: tpl[ "file" ] }, **self._opt ) )
+
+        ## a VM registered by this plan cannot be asked yet
+        snapshots = dict() if register is not None else pyvbcc.vm.commands.ListSnapshotsCommand( vm, **self._opt ).run()
+        if snapshot not in snapshots:
+            cfg = { pyvbcc.KEY_VM_NAME: vm, pyvbcc.KEY_VM_SNAPSHOT: snapshot, pyvbcc.KEY_VM_DESCRIPTION: "pyvbcc template %s" % ( tpl[ "name" ] ) }
+            self._add( plan, entity, key, pyvbcc.vm.commands.TakeSnapshotCommand( cfg, **self._opt ), [ register ] )
+
+    def _disk_cfg( self, disk, host = None ):
+        return {
+            pyvbcc.KEY_DISKS_FILE: self.disk_file( disk, host ),
+            pyvbcc.KEY_DISKS_SIZE: size_mb( disk[ "size" ] ),
+            pyvbcc.KEY_DISKS_FORMAT: disk.get( "format", "vdi" )
+        }
+
+    def _plan_disk( self, plan, entity, key, disk, previous, deps = (), host = None ):
+        """
+            Creates a new disk or grows a changed one, returns the key of the node or None.
+        """
+        if previous is None:
+            return self._add( plan, entity, key, pyvbcc.disk.commands.CreateDiskCommand( self._disk_cfg( disk, host ), **self._opt ), deps )
+
+        if int( size_mb( disk[ "size" ] ) ) > int( size_mb( previous[ "size" ] ) ):
+            return self._add( plan, entity, key, pyvbcc.disk.commands.ResizeDiskCommand( self._disk_cfg( disk, host ), **self._opt ), deps )
+
+        ## media never shrink and keep their format, nothing else to change
+        return None
+
+    def _controller( self, plan, entity, host, ctl, ports, deps, modify = False ):
+        key = "vm:%s:storagectl:%s" % ( host[ "name" ], ctl[ "name" ] )
+        cfg = {
+            pyvbcc.KEY_VM_NAME: host[ "name" ],
+            pyvbcc.KEY_CONTROLLER_TYPE: ctl[ "type" ],
+            pyvbcc.KEY_CONTROLLER_CHIPSET: ctl[ "chipset" ],
+            pyvbcc.KEY_CONTROLLER_NAME: ctl[ "name" ],
+            pyvbcc.KEY_CONTROLLER_PCOUNT: str( max( ports, 1 ) ),
+            pyvbcc.KEY_CONTROLLER_BOOTABLE: "on"
+        }
+        if modify:
+            return self._add( plan, entity, key, pyvbcc.disk.commands.ModifyControllerCommand( cfg, **self._opt ), deps )
+        return self._add( plan, entity, key, pyvbcc.disk.commands.CreateControllerCommand( cfg, **self._opt ), deps )
 
+    def _ports( self, name, controller, disks, olddisks, added, previous ):
+        """
+            ( { disk name: port } of the disks to attach, port count the controller needs ). A new host takes them
+            in order, on an existing one they go to the free ports, disks dropped from the spec keep theirs until destroy.
+        """
+        if previous is None:
+            return { d[ "name" ]: idx for idx, d in enumerate( disks ) }, len( disks )
+        used = set( range( len( olddisks ) ) )
+        if len( added ) > 0:
+            used.update( pyvbcc.disk.GetMediaIndex( self._opt ).ports( name, controller[ "name" ] ) )
+        ports = dict()
+        port = 0
+        for disk in added:
+            while port in used: port += 1
+            ports[ disk[ "name" ] ] = port
+            port += 1
+        ## a medium above a gap still needs its port
+        return ports, max( used | set( ports.values() ) | { -1 } ) + 1
+
+    def _attach( self, plan, entity, key, cfg, deps, previous ):
+        """
+            storageattach node, none when the media index shows the medium on that slot of an existing VM already.
+        """
+        if previous is not None and not pyvbcc.disk.AttachNeeded( cfg, self._opt ):
+            return None
+        return self._add( plan, entity, key, pyvbcc.disk.commands.AttachDiskCommand( cfg, **self._opt ), deps )
+
+    def _nic_cfg( self, name, idx, nic ):
+        kind = NIC_TYPES.get( nic.get( "type", "nat" ) )
+        if kind is None:
+            raise AttributeError( "Unknown nic type %s on %s" % ( nic.get( "type" ), name ) )
+
+        cfg = { pyvbcc.KEY_VM_NAME: name, pyvbcc.KEY_NIC_ID: str( idx ) }
+        if nic.get( "network" ):
+            if kind == "nat": kind = "natnetwork"
+            cfg[ pyvbcc.KEY_NIC_NETNAME ] = nic[ "network" ]
+        cfg[ pyvbcc.KEY_NIC_NET ] = kind
+        if nic.get( "mac" ): cfg[ pyvbcc.KEY_NIC_MAC ] = mac_address( nic[ "mac" ] )
+        return cfg
+
+    def _claim( self, tpl, host ):
+        """
+            Command taking a pool member of the template as host, None when the pool is empty or there is none.
+            The member stays reserved until release(), other plans skip it.
+        """
+        if tpl[ "name" ] not in self._pools:
+            self._pools[ tpl[ "name" ] ] = self.pool( tpl )
+        pool = self._pools[ tpl[ "name" ] ]
+        member = pool.reserve() if pool is not None else None
+        if member is None:
+            return None
+        return pool.claim( member, host[ "name" ], self.group() )
+
+    def _exists( self, name ):
+        """
+            True when a VM of that name is in the group already, a claim or clone of an interrupted run.
+        """
+        if self._vms is None:
+            vms = pyvbcc.vm.commands.ListVmsLongCommand( **self._opt ).run()
+            self._vms = vms if type( vms ).__name__ == "dict" else dict()
+        return name in self._vms and "/" + self.group().strip( "/" ) in self._vms[ name ].groups
+
+    def release( self ):
+        """
+            Gives back the pool members reserved by the last plan.
+        """
+        for pool in self._pools.values():
+            if pool is not None: pool.release()
+        self._pools = dict()
+
+    def _plan_clone( self, plan, entity, host ):
+        tpl = self.template( host[ "template" ] )
+        ## a resumed create renamed a member or cloned already, the journal cannot match a random member
+        if self._exists( host[ "name" ] ):
+            return None
+        claim = self._claim( tpl, host )
+        if claim is not None:
+            return self._add( plan, entity, "vm:%s" % ( host[ "name" ] ), claim )
+
+        source, snapshot = self.template_vm( tpl )
+        cfg = {
+            pyvbcc.KEY_VM_NAME: host[ "name" ],
+            pyvbcc.KEY_VM_TEMPLATE: source,
+            pyvbcc.KEY_VM_SNAPSHOT: snapshot,
+            pyvbcc.KEY_GROUP_NAME: self.group(),
+            pyvbcc.KEY_VM_BASEFOLDER: self.machinefolder()
+        }
+        ## no node takes the snapshot when the template VM has it already
+        prepared = "template:%s" % ( tpl[ "name" ] )
+        return self._add( plan, entity, "vm:%s" % ( host[ "name" ] ), pyvbcc.vm.commands.CloneVmCommand( cfg, **self._opt ), [ prepared if prepared in plan else None ] )
+
+    def _plan_host( self, plan, entity, host, previous ):
+        """
+            Nodes creating a new host, or bringing a host created from the previous spec up to date.
+            Disks dropped from a changed host stay attached, detaching is left to destroy. A host is cloned
+            from its template only when it is created, a template changed later does not touch it.
+        """
+        name = host[ "name" ]
+        vm = "vm:%s" % ( name )
+        old = previous if previous is not None else dict()
+
+        if host.get( "template" ) and host.get( "iso" ):
+            raise AttributeError( "Host %s names both a template and an iso" % ( name ) )
+
+        if previous is None and host.get( "template" ):
+            self._plan_clone( plan, entity, host )
+        elif previous is None:
+            cfg = {
+                pyvbcc.KEY_VM_NAME: name,
+                pyvbcc.KEY_VM_OSTYPE: self.host_type( host ),
+                pyvbcc.KEY_GROUP_NAME: self.group(),
+                pyvbcc.KEY_VM_BASEFOLDER: self.machinefolder()
+            }
+            self._add( plan, entity, vm, pyvbcc.vm.commands.CreateVmCommand( cfg, **self._opt ) )
+
+        ## an existing host, or one a resumed run made already, has no node creating it
+        created = vm if vm in plan else None
+
+        cfg = { pyvbcc.KEY_VM_NAME: name }
+        if previous is not None and host.get( "type" ) != old.get( "type" ):
+            cfg[ pyvbcc.KEY_VM_OSTYPE ] = self.host_type( host )
+        if "cpus" in host and str( host[ "cpus" ] ) != str( old.get( "cpus" ) ): cfg[ pyvbcc.KEY_VM_CPUS ] = str( host[ "cpus" ] )
+        if "mem" in host and str( host[ "mem" ] ) != str( old.get( "mem" ) ): cfg[ pyvbcc.KEY_VM_MEMORY ] = str( host[ "mem" ] )
+        if len( cfg ) > 1:
+            self._add( plan, entity, "%s:modify" % ( vm ), pyvbcc.vm.commands.ModifyVmCommand( cfg, **self._opt ), [ created ] )
+
+        disks = host.get( "disks", list() )
+        olddisks = { d[ "name" ]: d for d in old.get( "disks", list() ) }
+        added = [ d for d in disks if d[ "name" ] not in olddisks ]
+
+        controller = DEF_CLONE_CONTROLLER if host.get( "template" ) else DEF_CONTROLLER
+        ports, portcount = self._ports( name, controller, disks, olddisks, added, previous )
+        ctl = None
+        if len( olddisks ) == 0 and len( disks ) > 0:
+            ctl = self._controller( plan, entity, host, controller, portcount, [ created ] )
+        elif len( added ) > 0:
+            ctl = self._controller( plan, entity, host, controller, portcount, [ created ], modify=True )
+
+        for disk in disks:
+            ## createvm makes the machine folder the disk goes into
+            key = self._plan_disk( plan, entity, "%s:disk:%s" % ( vm, disk[ "name" ] ), disk, olddisks.get( disk[ "name" ] ), [ created ], host )
+            if disk[ "name" ] in olddisks:
+                continue
+
+            cfg = {
+                pyvbcc.KEY_VM_NAME: name,
+                pyvbcc.KEY_CONTROLLER_NAME: controller[ "name" ],
+                pyvbcc.KEY_DISKS_FILE: self.disk_file( disk, host ),
+                pyvbcc.KEY_DISKS_PORT: str( ports[ disk[ "name" ] ] )
+            }
+            self._attach( plan, entity, "%s:attach:%s" % ( vm, disk[ "name" ] ), cfg, [ ctl, key ], previous )
+
+        if host.get( "iso" ) and host.get( "iso" ) != old.get( "iso" ):
+            ide = None
+            if not old.get( "iso" ):
+                ide = self._controller( plan, entity, host, DEF_DVD_CONTROLLER, 2, [ created ] )
+            cfg = {
+                pyvbcc.KEY_VM_NAME: name,
+                pyvbcc.KEY_CONTROLLER_NAME: DEF_DVD_CONTROLLER[ "name" ],
+                pyvbcc.KEY_DISKS_FILE: host[ "iso" ],
+                pyvbcc.KEY_DISKS_TYPE: "dvddrive"
+            }
+            self._attach( plan, entity, "%s:attach:iso" % ( vm ), cfg, [ created, ide ], previous )
+
+        nics = host.get( "nics", list() )
+        oldnics = old.get( "nics", list() )
+        for idx, nic in enumerate( nics, 1 ):
+            if idx <= len( oldnics ) and oldnics[ idx - 1 ] == nic:
+                continue
+            deps = [ created ]
+            ## networks this plan does not create or change exist already
+            if nic.get( "network" ) and "net:%s" % ( nic[ "network" ] ) in plan: deps.append( "net:%s" % ( nic[ "network" ] ) )
+            self._add( plan, entity, "%s:nic%s" % ( vm, idx ), pyvbcc.net.commands.ModifyVmNicCommand( self._nic_cfg( name, idx, nic ), **self._opt ), deps )
+
+        for idx in range( len( nics ) + 1, len( oldnics ) + 1 ):
+            cfg = { pyvbcc.KEY_VM_NAME: name, pyvbcc.KEY_NIC_ID: str( idx ), pyvbcc.KEY_NIC_NET: "none" }
+            self._add( plan, entity, "%s:nic%s" % ( vm, idx ), pyvbcc.net.commands.ModifyVmNicCommand( cfg, **self._opt ), [ created ] )
+
+    def _entity_specs( self ):
+        for tpl in self.templates():
+            yield "templates", tpl[ "name" ], tpl
+        for net in self.networks():
+            yield "networks", net[ "name" ], net
+        for disk in self.disks():
+            yield "disks", disk[ "name" ], disk
+        for host in self.hosts():
+            yield "hosts", host[ "name" ], host
+
+    def plan( self, state = None ):
+        """
+            Plan creating every network, disk and host of the environment. With a StateStore only new and
+            changed entities are planned, unchanged ones get no nodes at all.
+        """
+        plan = pyvbcc.plan.Plan( **self._opt )
+        self._entities = dict()
+        self.release()
+        self._vms = None
+
+        for kind, name, spec in self._entity_specs():
+            previous = None
+            if state is not None:
+                previous = state.changed( kind, name, spec )
+                if previous is False:
+                    continue
+
+            entity = ( kind, name )
+            self._entities[ entity ] = ( spec, list() )
+            if kind == "networks":
+                self._plan_network( plan, entity, spec, previous )
+            elif kind == "disks":
+                self._plan_disk( plan, entity, "disk:%s" % ( name ), spec, previous )
+            elif kind == "templates":
+                self._plan_template( plan, entity, spec, previous )
+            else:
+                self._plan_host( plan, entity, spec, previous )
+
+        ## fails early on dangling dependencies and conflicting settings
+        plan.order()
+        saved = plan.coalesce()
+        if self._debug: print( "Coalescing modifyvm saved %s VBoxManage calls" % ( saved ) )
+        return plan
+
+    def _created_uuid( self, plan, key ):
+        node = plan.node( key )
+        if node is None or node.result is None or node.key != key:
+            return None
+        for line in node.result.result() or list():
+            m = RX_CREATED_UUID.search( line )
+            if m: return m.group(1)
+        return None
+
+    def _record_entity( self, plan, state, kind, name, spec ):
+        if kind == "networks":
+            state.put_network( name, spec.get( "type", "natnet" ), spec.get( "network" ) )
+        elif kind == "disks":
+            state.put_medium( self.disk_file( spec ), self._created_uuid( plan, "disk:%s" % ( name ) ), None, size_mb( spec[ "size" ] ), spec.get( "format", "vdi" ) )
+        elif kind == "templates":
+            ## the template VM is not the group's, destroy leaves it and its snapshot alone
+            return
+        else:
+            vm = "vm:%s" % ( name )
+            state.put_vm( name, self._created_uuid( plan, vm ), self.host_type( spec ), "poweroff" if vm in plan else None )
+            for disk in spec.get( "disks", list() ):
+                state.put_medium( self.disk_file( disk, spec ), self._created_uuid( plan, "%s:disk:%s" % ( vm, disk[ "name" ] ) ), name, size_mb( disk[ "size" ] ), disk.get( "format", "vdi" ) )
+            nics = spec.get( "nics", list() )
+            for idx, nic in enumerate( nics, 1 ):
+                state.put_nic( name, idx, mac_address( nic[ "mac" ] ) if nic.get( "mac" ) else None, nic.get( "type", "nat" ), nic.get( "network" ) )
+            state.drop_nics( name, len( nics ) + 1 )
+
+    def record( self, plan, state ):
+        """
+            Stores every planned entity whose nodes all succeeded, its spec and what it created, returns how many were stored.
+        """
+        count = 0
+        for ( kind, name ), ( spec, keys ) in self._entities.items():
+            if all( plan.node( k ).state == pyvbcc.plan.STATE_DONE for k in keys ):
+                state.put( kind, name, spec )
+                self._record_entity( plan, state, kind, name, spec )
+                count += 1
+        state.save()
+        return count
+
+    ###################################################################################################################
+    ## Destroy
+    ###################################################################################################################
+    def destroy( self, state, registered = None ):
+        """
+            Plan removing everything the state store lists for this group. registered is { vm name: uuid } as
+            list vms reports it, VMs the store knows but VirtualBox no longer does are only forgotten.
+        """
+        plan = pyvbcc.plan.Plan( **self._opt )
+        self._entities = dict()
+
+        vms = list()
+        for vm in state.vms():
+            entity = ( "hosts", vm[ "name" ] )
+            self._entities[ entity ] = ( vm, list() )
+            if registered is not None and vm[ "name" ] not in registered:
+                continue
+            ## unregistervm --delete removes the attached media with the machine
+            vms.append( self._add( plan, entity, "destroy:vm:%s" % ( vm[ "name" ] ), pyvbcc.vm.commands.DeleteVmCommand( { pyvbcc.KEY_VM_NAME: vm[ "name" ] }, **self._opt ) ) )
+
+        for medium in state.media():
+            if medium[ "vm" ] is not None:
+                continue
+            entity = ( "disks", Path( medium[ "location" ] ).stem )
+            self._entities[ entity ] = ( medium, list() )
+            cfg = { pyvbcc.KEY_DISKS_FILE: medium[ "location" ] }
+            try:
+                ## the VMs destroyed above may still hold it, anything else keeps the medium
+                pyvbcc.disk.CheckClose( cfg, self._opt, [ vm[ "name" ] for vm in state.vms() ] )
+            except RuntimeError as e:
+                if self._debug: print( "Keeping %s: %s" % ( medium[ "location" ], e ) )
+                del self._entities[ entity ]
+                continue
+            self._add( plan, entity, "destroy:disk:%s" % ( entity[1] ), pyvbcc.disk.commands.CloseDiskCommand( cfg, **self._opt ), vms )
+
+        for net in state.networks():
+            entity = ( "networks", net[ "name" ] )
+            self._entities[ entity ] = ( net, list() )
+            if net[ "type" ] not in ( "nat", "natnet", "natnetwork" ):
+                continue
+            ## NAT networks are global, another group still using it keeps it
+            others = state.network_groups( net[ "name" ] )
+            if len( others ) > 0:
+                if self._debug: print( "Keeping %s, used by %s" % ( net[ "name" ], ", ".join( others ) ) )
+                continue
+            self._add( plan, entity, "destroy:net:%s" % ( net[ "name" ] ), pyvbcc.net.commands.DeleteNatNetworkCommand( { pyvbcc.KEY_NETWORK_NAME: net[ "name" ] }, **self._opt ), vms )
+
+        plan.order()
+        return plan
+
+    def forget( self, plan, state ):
+        """
+            Drops every destroyed entity from the state store, returns how many were dropped.
+        """
+        count = 0
+        for ( kind, name ), ( row, keys ) in self._entities.items():
+            if not all( plan.node( k ).state == pyvbcc.plan.STATE_DONE for k in keys ):
+                continue
+            state.remove( kind, name )
+            if kind == "hosts": state.drop_vm( name )
+            elif kind == "disks": state.drop_medium( row[ "location" ] )
+            else: state.drop_network( name )
+            count += 1
+        state.save()
+        return count
 
 
 class VbManage(object):
 
     def __init__( self, config, opt ):
+        self._debug = False
+        self._opt = dict( opt )
 
         if "debug" in opt and opt['debug'] in (True, False):
             self._debug = opt["debug"]
 
-        self._main_condfig = config
-        self._env_config = pyvbcc.vbm.VbEnvironment( opt[ pyvbcc.KEY_SYSTEM_MODE ], opt[ pyvbcc.KEY_SYSTEM_ENVFILE ], **opt  )
+        self._main_config = config
+        ## the state store is found next to it
+        self._opt[ pyvbcc.KEY_CONFIG_FILE ] = config.filename
+        self._env_config = VbEnvironment( opt[ pyvbcc.KEY_SYSTEM_MODE ], opt[ pyvbcc.KEY_SYSTEM_ENVFILE ], **self._opt )
+        if self._env_config.command() is not None:
+            self._opt[ pyvbcc.KEY_SYSTEM_COMMAND ] = self._env_config.command()
+
+    def environment( self ):
+        return self._env_config
+
+    def state( self ):
+        """
+            State store of the environment's group, next to the main configuration file unless PYVBCC_STATE is set.
+        """
+        return pyvbcc.state.GetStateStore( self._env_config.group(), self._opt )
+
+    def _report( self, plan ):
+        failed = [ n for n in plan.nodes() if n.state == pyvbcc.plan.STATE_FAILED ]
+        for n in failed:
+            print( "Failed %s: %s" % ( n.key, n.error if n.error else " ".join( n.cmd._command_line() ) ) )
+
+    def run( self ):
+        """
+            Runs the mode given on the command line, returns { plan node: state }.
+        """
+        mode = self._env_config.mode()
+
+        if mode == "create":
+            state = self.state()
+            journal = None
+            ## a test run created nothing, there is nothing to journal or record
+            if not self._opt.get( "test" ):
+                journal = state
+                if not self._opt.get( pyvbcc.KEY_SYSTEM_RESUME ):
+                    state.clear_journal()
+            with pyvbcc.trace.Span( "plan", "plan" ):
+                plan = self._env_config.plan( state )
+            with pyvbcc.trace.Span( "run", "plan", nodes=len( plan ) ):
+                states = plan.run( journal=journal )
+            if journal is not None:
+                with pyvbcc.trace.Span( "record", "state" ):
+                    self._env_config.record( plan, state )
+                if plan.ok(): state.clear_journal()
+            self._env_config.release()
+            if self._debug and len( plan.resumed() ) > 0: print( "Resumed %s finished commands" % ( len( plan.resumed() ) ) )
+            state.close()
+            self._report( plan )
+            ## pools refill on their own, the caller does not wait for the clones
+            if not self._opt.get( "test" ):
+                self._env_config.refill()
+            return states
 
-        pass
+        if mode == "destroy":
+            state = self.state()
+            registered = None
+            if not self._opt.get( "test" ):
+                ## the store says what is managed, VBoxManage only confirms it still exists
+                registered = pyvbcc.vm.commands.ListVmsCommand( **self._opt ).run()
+            with pyvbcc.trace.Span( "plan", "plan" ):
+                plan = self._env_config.destroy( state, registered )
+            with pyvbcc.trace.Span( "run", "plan", nodes=len( plan ) ):
+                states = plan.run()
+            if not self._opt.get( "test" ):
+                self._env_config.forget( plan, state )
+            state.close()
+            self._report( plan )
+            return states
 
+        if mode == "validate":
+            with pyvbcc.trace.Span( "plan", "plan" ):
+                plan = self._env_config.plan()
+            return { k: plan.node( k ).deps for k in plan.order() }
 
+        raise RuntimeError( "Mode %s is not supported yet" % ( mode ) )
 
 
 if __name__ == "__main__":
@@ -12,8 +12,12 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.records
 
 import pyvbcc.vm.commands
+import pyvbcc.vm.inventory
+import pyvbcc.vm.ostypes
+import pyvbcc.vm.power
 
 #import pyvbcc.info
 #import pyvbcc.disk
@@ -27,16 +31,60 @@ def GetVmInfo( opt ):
         vm = opt[ pyvbcc.KEY_VM_NAME ]
         return GetVm( vm, opt )
 
+_inventory = None
+
+def GetInventory( opt ):
+    global _inventory
+    if _inventory is None:
+        _inventory = pyvbcc.vm.inventory.VmInventory( **opt )
+    return _inventory
+
 def GetVms( opt ):
+    if opt.get( pyvbcc.KEY_SYSTEM_LONG ):
+        inventory = GetInventory( opt )
+        inventory.refresh()
+        res = inventory.records()
+        return { name: res[ name ].to_dict() for name in res }
     return pyvbcc.vm.commands.ListVmsCommand( **opt ).run()
 
 def GetVm( vm, opt ):
-    return pyvbcc.vm.commands.InfoVmCommand( vm, **opt ).run()
+    rec = pyvbcc.vm.commands.InfoVmCommand( vm, **opt ).run()
+    GetInventory( opt ).update( rec )
+    return rec.to_dict()
 
-def GetOsTypesInfo( opt ):
+def StreamVms( opt ):
+    if opt.get( pyvbcc.KEY_SYSTEM_WATCH ):
+        watch = GetInventory( opt ).watch( float( opt[ pyvbcc.KEY_SYSTEM_WATCH ] ) )
+        return ( ( name, rec.to_dict() if rec else None ) for name, rec in watch )
+    if opt.get( pyvbcc.KEY_SYSTEM_LONG ):
+        return ( ( name, rec.to_dict() ) for name, rec in pyvbcc.vm.commands.ListVmsLongCommand( **opt ).iterate() )
+    return pyvbcc.vm.commands.ListVmsCommand( **opt ).iterate()
+
+def _ostypes( opt ):
+    index = pyvbcc.vm.ostypes.GetCatalogue( opt ).records()
     if opt[ pyvbcc.KEY_VM_OSTYPE ] == "all":
-        del opt[ pyvbcc.KEY_VM_OSTYPE ]
-    return pyvbcc.vm.commands.ListOsTypesCommand( **opt ).run()
+        return index
+    return { k: index[ k ] for k in [ opt[ pyvbcc.KEY_VM_OSTYPE ] ] if k in index }
+
+def GetOsTypesInfo( opt ):
+    return pyvbcc.records.to_dict( _ostypes( opt ) )
+
+def StreamOsTypesInfo( opt ):
+    return ( ( name, rec.to_dict() ) for name, rec in _ostypes( opt ).items() )
+
+def StartGroup( opt ):
+    """
+        Starts the VMs of --group ( or the one --vm ) and waits until their guests are ready.
+    """
+    names = [ opt[ pyvbcc.KEY_VM_NAME ] ] if pyvbcc.KEY_VM_NAME in opt else None
+    return pyvbcc.vm.power.GroupPower( opt.get( pyvbcc.KEY_GROUP_NAME ), **opt ).start( names )
+
+def StopGroup( opt ):
+    """
+        Shuts the VMs of --group ( or the one --vm ) down, ACPI first and hard after --timeout.
+    """
+    names = [ opt[ pyvbcc.KEY_VM_NAME ] ] if pyvbcc.KEY_VM_NAME in opt else None
+    return pyvbcc.vm.power.GroupPower( opt.get( pyvbcc.KEY_GROUP_NAME ), **opt ).stop( names )
 
 def RunOnVm( vm, cmd, cmdargs, opt ):
     pass
@@ -12,72 +12,142 @@ import pyvbcc.utils
 import pyvbcc.validate
 
 import pyvbcc.command
+import pyvbcc.records
+import pyvbcc.vm.machinereadable
+import pyvbcc.vm.longformat
+import pyvbcc.vm.ostypes
 
 ###########################################################################################################################
 ## VM listing
 ###########################################################################################################################
 
+RX_SPACE = re.compile( r"\s+" )
+RX_LIST_VM = re.compile( r"\"(.+)\"\s+{(.+)}" )
+
 class ListVmsCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 30
+    CACHE_TAGS = ( "vms", )
+
     def __init__( self, **opt ):
         super().__init__( [ "list", "vms", "--sorted"], **opt )
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        for r in res:
-            m = re.match(r"\"(.+)\"\s+{(.+)}", r )
-            if m.group(1) != "<inaccessible>":
-                data[ m.group(1) ] = m.group(2)
-        return data
+    def records( self, lines ):
+        for r in lines:
+            m = RX_LIST_VM.match( r )
+            if m and m.group(1) != "<inaccessible>":
+                yield m.group(1), m.group(2)
+
+    def parse( self, result ):
+        return dict( self.records( result.result() ) )
+
+class ListRunningVmsCommand( ListVmsCommand ):
+    ## polled to see state changes, never served from cache
+    CACHE_TTL = None
+    INVALIDATES = ()
+
+    def __init__( self, **opt ):
+        pyvbcc.command.GenericCommand.__init__( self, [ "list", "runningvms", "--sorted" ], **opt )
+
+class ListVmsLongCommand( pyvbcc.command.GenericCommand ):
+    """
+        Details of every VM from a single list --long vms, records are VmRecord keyed by name.
+    """
+    CACHE_TTL = 5
+    CACHE_TAGS = ( "vms", )
+
+    def __init__( self, **opt ):
+        super().__init__( [ "list", "--long", "vms", "--sorted" ], **opt )
+
+    def records( self, lines ):
+        return pyvbcc.vm.longformat.records( lines )
+
+    def parse( self, result ):
+        return dict( self.records( result.result() ) )
+
+class ListRunningVmsLongCommand( ListVmsLongCommand ):
+    """
+        Details of the running and paused VMs only, with the time of their last state change.
+    """
+    ## polled to see state changes, never served from cache
+    CACHE_TTL = None
+    INVALIDATES = ()
+
+    def __init__( self, **opt ):
+        pyvbcc.command.GenericCommand.__init__( self, [ "list", "--long", "runningvms", "--sorted" ], **opt )
 
 class InfoVmCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 5
+    CACHE_TAGS = ( "vms", )
+
     def __init__( self, vm, **opt ):
         super().__init__( [ "showvminfo", "--machinereadable", "--details",vm ], **opt )
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
+    def parse( self, result ):
+        return pyvbcc.vm.machinereadable.parse( result.result() )
 
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r"=", line )
-            data[ nldata[0] ] = nldata[1]
-        return data
 
+## list ostypes labels ( lowercased, spaces to _ ) to OsTypeRecord fields
+OSTYPE_FIELDS = {
+    "description": ( "description", None ),
+    "family_id": ( "family_id", None ),
+    "family_desc": ( "family_desc", None ),
+    "64_bit": ( "bits64", pyvbcc.records.to_bool )
+}
 
 class ListOsTypesCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 86400
+    CACHE_TAGS = ( "ostypes", )
+
     def __init__( self, **opt ):
         super().__init__( [ "list", "ostypes", "--sorted"], **opt )
+        self._ostype = None
+        if pyvbcc.KEY_VM_OSTYPE in opt:
+            self._ostype = opt[ pyvbcc.KEY_VM_OSTYPE ]
 
-    def run( self ):
-        data = dict()
-        res = super().run().result()
-        item = dict()
+    def _selected( self, item ):
+        return self._ostype is None or item.id == self._ostype
 
-        for line in res:
-            line = re.compile( "\"" ).sub(  "", line )
-            nldata = re.split(r":", line )
+    def records( self, lines ):
+        """
+            Yields ( id, OsTypeRecord ) per os type.
+        """
+        item = None
+
+        for line in lines:
+            line = line.replace( "\"", "" )
+            nldata = line.split( ":", 1 )
 
             if len( nldata ) > 1:
                 key = nldata[0].lstrip().rstrip().lower()
                 val = nldata[1].lstrip().rstrip()
 
-                key = re.sub( "\s+", "_", key )
+                key = RX_SPACE.sub( "_", key )
+
+                if key == "id":
+                    if item is not None and self._selected( item ): yield item.id, item
+                    item = pyvbcc.records.OsTypeRecord( val )
+                elif item is not None:
+                    field = OSTYPE_FIELDS.get( key )
+                    if field is not None:
+                        setattr( item, field[0], field[1]( val ) if field[1] else val )
+                    else:
+                        item.properties[ key ] = val
 
-                if re.match( "id", key ) and len( item ) > 0:
-                    data[ item[ 'id' ] ] = item
-                    item = dict()
-                item[ key ] = val
+            if len( line ) == 0 and item is not None:
+                if self._selected( item ): yield item.id, item
+                item = None
 
-            if len( line ) == 0 and len( item ) > 0:
-                data[ item['id'] ] = item
+        if item is not None and self._selected( item ):
+            yield item.id, item
 
-        return data
+    def parse( self, result ):
+        return dict( self.records( result.result() ) )
 
 ###########################################################################################################################
 ## VM basic management
 ###########################################################################################################################
 class RegisterVmCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "groups", "hdds" )
 
     def __init__( self, cfg = {}, **opt ):
         self._cfg = cfg
@@ -96,14 +166,17 @@ class RegisterVmCommand( pyvbcc.command.GenericCommand ):
         ], **opt )
 
 class CreateVmCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "groups" )
 
     def __init__( self, cfg = {}, **opt ):
         self._cfg = cfg
+        self._opt = dict( opt )
         self._validmap = {
             pyvbcc.KEY_VM_NAME: { "match": ["^[a-zA-Z0-9\-\._ ]+$"], "mandatory":True },
             pyvbcc.KEY_VM_OSTYPE: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
             pyvbcc.KEY_GROUP_NAME: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
-            pyvbcc.KEY_VM_REGISTER: { "match":["True", "False"] }
+            pyvbcc.KEY_VM_REGISTER: { "match":["True", "False"] },
+            pyvbcc.KEY_VM_BASEFOLDER: { "match": ["^[a-zA-Z0-9\-\._/ ]+$"] }
         }
 
         opt["strict"] = False
@@ -121,12 +194,20 @@ class CreateVmCommand( pyvbcc.command.GenericCommand ):
             "--name", self._cfg[ pyvbcc.KEY_VM_NAME ],
             "--groups", "/%s" % (  self._cfg[ pyvbcc.KEY_GROUP_NAME ] ),
             "--ostype", self._cfg[  pyvbcc.KEY_VM_OSTYPE ],
+            "--basefolder" if pyvbcc.KEY_VM_BASEFOLDER in self._cfg else "",
+            self._cfg.get( pyvbcc.KEY_VM_BASEFOLDER, "" ),
             reg_str
         ], **opt )
 
+    def check( self ):
+        ## only checked when it runs, building a plan asks VBoxManage nothing. Test runs never reach it.
+        if not self._test and not pyvbcc.vm.ostypes.GetCatalogue( self._opt ).known( self._cfg[ pyvbcc.KEY_VM_OSTYPE ] ):
+            raise RuntimeError( "Unknown os type %s" % ( self._cfg[ pyvbcc.KEY_VM_OSTYPE ] ) )
+
 
 
 class DeleteVmCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "groups", "hdds" )
 
     def __init__( self, cfg = {}, **opt ):
         self._cfg = cfg
@@ -152,6 +233,7 @@ class DeleteVmCommand( pyvbcc.command.GenericCommand ):
 ## Modify VM
 ###########################################################################################################################
 class ModifyVmCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "groups" )
 
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg:
@@ -221,19 +303,93 @@ class ModifyVmCommand( pyvbcc.command.GenericCommand ):
 
 
 
+class RenameVmCommand( pyvbcc.command.GenericCommand ):
+    """
+        Renames a VM and optionally moves it to another group, how a VM is taken from a pool.
+    """
+    INVALIDATES = ( "vms", "groups" )
+
+    def __init__( self, cfg = {}, **opt ):
+        self._cfg = cfg
+        self._validmap = {
+            pyvbcc.KEY_VM_NAME: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_VM_NEWNAME: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_GROUP_NAME: { "match": ["^/?[a-zA-Z0-9\-\._/]+$"] }
+        }
+
+        opt["strict"] = False
+        pyvbcc.validate.Validator( self._validmap, **opt ).validate( self._cfg )
+
+        params = [ "modifyvm", self._cfg[ pyvbcc.KEY_VM_NAME ], "--name", self._cfg[ pyvbcc.KEY_VM_NEWNAME ] ]
+        if self._cfg.get( pyvbcc.KEY_GROUP_NAME ): params += [ "--groups", "/" + self._cfg[ pyvbcc.KEY_GROUP_NAME ].strip( "/" ) ]
+
+        super().__init__( params, **opt )
+
+
 class ModifyVmBootCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg or pyvbcc.KEY_BOOT_ORDER not in cfg:
             raise AttributeError("Missing vm name or boot order index")
 
         self._vm = cfg[ pyvbcc.KEY_VM_NAME ]
         self._boot_order = cfg[ pyvbcc.KEY_BOOT_ORDER ]
+        self._boot_device = "none"
 
-        params = [ "modifyvm", self._vm ]
+        if str( self._boot_order ) not in ( "1", "2", "3", "4" ):
+            raise AttributeError("Boot order index must be 1-4, got %s" % ( self._boot_order ) )
+
+        if pyvbcc.KEY_BOOT_DEVICE in cfg:
+            if cfg[ pyvbcc.KEY_BOOT_DEVICE ] not in ( "none", "floppy", "dvd", "disk", "net" ):
+                raise AttributeError("Unknown boot device %s" % ( cfg[ pyvbcc.KEY_BOOT_DEVICE ] ) )
+            self._boot_device = cfg[ pyvbcc.KEY_BOOT_DEVICE ]
+
+        params = [ "modifyvm", self._vm, "--boot%s" % ( self._boot_order ), self._boot_device ]
 
         super().__init__( params, **opt )
 
 
+class CoalescedModifyVmCommand( pyvbcc.command.GenericCommand ):
+    """
+        One modifyvm carrying the options of several modifyvm commands on the same VM.
+    """
+    INVALIDATES = ( "vms", )
+
+    def __init__( self, vm, cmds, **opt ):
+        self._vm = vm
+        self._merged = list( cmds )
+        self._options = dict()
+
+        for cmd in self._merged:
+            line = cmd._command_line()[1:]
+            if len( line ) < 2 or line[0] != "modifyvm" or line[1] != vm or len( line ) % 2 != 0:
+                raise AttributeError( "Not a modifyvm of %s: %s" % ( vm, " ".join( line ) ) )
+
+            for flag, value in zip( line[2::2], line[3::2] ):
+                if flag in self._options and self._options[ flag ] != value:
+                    raise RuntimeError( "Conflicting modifyvm %s for %s: %s and %s" % ( flag, vm, self._options[ flag ], value ) )
+                self._options[ flag ] = value
+
+        params = [ "modifyvm", vm ]
+        for flag, value in self._options.items():
+            params += [ flag, value ]
+
+        super().__init__( params, **opt )
+
+        tags = set()
+        for cmd in self._merged:
+            if cmd.INVALIDATES is None:
+                tags = None
+                break
+            tags |= set( cmd.INVALIDATES )
+        self.INVALIDATES = tuple( sorted( tags ) ) if tags is not None else None
+
+        ## never run for real what was only meant as a test
+        self._test = self._test or any( c._test for c in self._merged )
+
+    def merged( self ):
+        return list( self._merged )
 
 
 
@@ -241,6 +397,8 @@ class ModifyVmBootCommand( pyvbcc.command.GenericCommand ):
 ## Power manage
 ###########################################################################################################################
 class ModifyVmPowerOffCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg:
             raise AttributeError("Missing vm name")
@@ -258,6 +416,8 @@ class ModifyVmPowerOffCommand( pyvbcc.command.GenericCommand ):
         super().__init__( params, **opt )
 
 class ModifyVmStartCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
+
     def __init__( self, cfg = {}, **opt ):
         if pyvbcc.KEY_VM_NAME not in cfg:
             raise AttributeError("Missing vm name")
@@ -270,3 +430,137 @@ class ModifyVmStartCommand( pyvbcc.command.GenericCommand ):
         params = [ "startvm", self._vm, "--type", self._type ]
 
         super().__init__( params, **opt )
+
+###########################################################################################################################
+## Guest properties
+###########################################################################################################################
+## set by the guest additions once the guest network is up, the usual sign a guest is usable
+DEF_READY_PROPERTY="/VirtualBox/GuestInfo/Net/0/V4/IP"
+
+RX_GUESTPROPERTY_VALUE = re.compile( r"^Value:\s*(.*)$" )
+RX_GUESTPROPERTY_WAIT = re.compile( r"^Name:\s*(.+?),\s*value:\s*(.*?),\s*flags:.*$" )
+
+class GetGuestPropertyCommand( pyvbcc.command.GenericCommand ):
+    ## polled while a guest boots, never served from cache and drops nothing
+    CACHE_TTL = None
+    INVALIDATES = ()
+
+    def __init__( self, vm, prop = DEF_READY_PROPERTY, **opt ):
+        self._vm = vm
+        self._prop = prop
+        super().__init__( [ "guestproperty", "get", vm, prop ], **opt )
+
+    def parse( self, result ):
+        """
+            Value of the property, None when it is not set.
+        """
+        for line in result.result():
+            m = RX_GUESTPROPERTY_VALUE.match( line )
+            if m:
+                return m.group(1)
+        return None
+
+class WaitGuestPropertyCommand( pyvbcc.command.GenericCommand ):
+    """
+        Blocks until a property matching the pattern changes, or the timeout ( seconds ) passes.
+    """
+    CACHE_TTL = None
+    INVALIDATES = ()
+
+    def __init__( self, vm, pattern = DEF_READY_PROPERTY, timeout = 10, **opt ):
+        self._vm = vm
+        self._pattern = pattern
+        params = [ "guestproperty", "wait", vm, pattern, "--timeout", str( int( float( timeout ) * 1000 ) ), "--fail-on-timeout" ]
+        super().__init__( params, **opt )
+
+    def parse( self, result ):
+        """
+            ( name, value ) of the property that changed, None on timeout.
+        """
+        for line in result.result():
+            m = RX_GUESTPROPERTY_WAIT.match( line )
+            if m:
+                return m.group(1), m.group(2)
+        return None
+
+###########################################################################################################################
+## Snapshots and clones
+###########################################################################################################################
+## SnapshotName="base", SnapshotName-1="next", ... one key per snapshot of the tree
+RX_SNAPSHOT_NAME = re.compile( r'^SnapshotName(-[0-9\-]+)?="(.*)"$' )
+RX_SNAPSHOT_UUID = re.compile( r'^SnapshotUUID(-[0-9\-]+)?="(.*)"$' )
+
+class TakeSnapshotCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", "hdds" )
+
+    def __init__( self, cfg = {}, **opt ):
+        self._cfg = cfg
+        self._validmap = {
+            pyvbcc.KEY_VM_NAME: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_VM_SNAPSHOT: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_VM_DESCRIPTION: { "match": [".*"] }
+        }
+
+        opt["strict"] = False
+        pyvbcc.validate.Validator( self._validmap, **opt ).validate( self._cfg )
+
+        params = [ "snapshot", self._cfg[ pyvbcc.KEY_VM_NAME ], "take", self._cfg[ pyvbcc.KEY_VM_SNAPSHOT ] ]
+        if self._cfg.get( pyvbcc.KEY_VM_DESCRIPTION ): params += [ "--description", self._cfg[ pyvbcc.KEY_VM_DESCRIPTION ] ]
+
+        super().__init__( params, **opt )
+
+class ListSnapshotsCommand( pyvbcc.command.GenericCommand ):
+    CACHE_TTL = 5
+    CACHE_TAGS = ( "vms", )
+
+    def __init__( self, vm, **opt ):
+        self._vm = vm
+        super().__init__( [ "snapshot", vm, "list", "--machinereadable" ], **opt )
+
+    def parse( self, result ):
+        """
+            { snapshot name: uuid } in the order VirtualBox lists them, empty when the VM has none.
+        """
+        names = dict()
+        uuids = dict()
+        for line in result.result():
+            m = RX_SNAPSHOT_NAME.match( line )
+            if m: names[ m.group(1) ] = m.group(2)
+            m = RX_SNAPSHOT_UUID.match( line )
+            if m: uuids[ m.group(1) ] = m.group(2)
+        return { name: uuids.get( key ) for key, name in names.items() }
+
+class CloneVmCommand( pyvbcc.command.GenericCommand ):
+    """
+        Clones a registered VM into a new registered one. A linked clone ( the default ) shares the disks of
+        the snapshot through differencing images, it takes seconds and almost no space.
+    """
+    INVALIDATES = ( "vms", "groups", "hdds" )
+
+    def __init__( self, cfg = {}, **opt ):
+        self._cfg = cfg
+        self._validmap = {
+            pyvbcc.KEY_VM_TEMPLATE: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_VM_NAME: { "match": ["^[a-zA-Z0-9\-\._]+$"], "mandatory":True },
+            pyvbcc.KEY_VM_SNAPSHOT: { "match": ["^[a-zA-Z0-9\-\._]+$"] },
+            pyvbcc.KEY_GROUP_NAME: { "match": ["^/?[a-zA-Z0-9\-\._/]+$"] },
+            pyvbcc.KEY_VM_BASEFOLDER: { "match": ["^[a-zA-Z0-9\-\._/ ]+$"] },
+            pyvbcc.KEY_VM_LINKED: { "match": ["True", "False"] }
+        }
+
+        opt["strict"] = False
+        pyvbcc.validate.Validator( self._validmap, **opt ).validate( self._cfg )
+
+        self._linked = self._cfg.get( pyvbcc.KEY_VM_LINKED, True ) not in ( False, "False" )
+        if self._linked and not self._cfg.get( pyvbcc.KEY_VM_SNAPSHOT ):
+            raise AttributeError( "A linked clone of %s needs a snapshot" % ( self._cfg[ pyvbcc.KEY_VM_TEMPLATE ] ) )
+
+        params = [ "clonevm", self._cfg[ pyvbcc.KEY_VM_TEMPLATE ] ]
+        if self._cfg.get( pyvbcc.KEY_VM_SNAPSHOT ): params += [ "--snapshot", self._cfg[ pyvbcc.KEY_VM_SNAPSHOT ] ]
+        if self._linked: params += [ "--options", "link" ]
+        params += [ "--name", self._cfg[ pyvbcc.KEY_VM_NAME ] ]
+        if self._cfg.get( pyvbcc.KEY_GROUP_NAME ): params += [ "--groups", "/" + self._cfg[ pyvbcc.KEY_GROUP_NAME ].strip( "/" ) ]
+        if self._cfg.get( pyvbcc.KEY_VM_BASEFOLDER ): params += [ "--basefolder", self._cfg[ pyvbcc.KEY_VM_BASEFOLDER ] ]
+        params += [ "--register" ]
+
+        super().__init__( params, **opt )
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.executor
+import pyvbcc.records
+import pyvbcc.vm.commands
+
+"""
+    VM inventory that only re-reads machines that changed.
+
+    The first load takes every VM from one list --long vms. A refresh runs list vms and list --long runningvms
+    and compares them with what is known: new and renamed machines, machines that started or stopped, running
+    machines whose VMStateChangeTime moved ( running <-> paused ) and machines whose config file ( the .vbox,
+    rewritten by VirtualBox on every settings or saved state change ) changed on disk are read again with
+    showvminfo, everything else is kept. Each refresh therefore costs two VBoxManage calls plus one per changed
+    machine, the long listing only details the running ones.
+"""
+
+class VmInventory( object ):
+
+    def __init__( self, **opt ):
+        self._debug = False
+        self._opt = dict( opt )
+        ## always ask VBoxManage, the point is to see changes
+        self._opt[ pyvbcc.KEY_SYSTEM_CACHE ] = False
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+        self._records = dict()
+        self._fingerprints = dict()
+        self._running = set()
+        self._loaded = False
+
+    def _fingerprint( self, rec ):
+        ## config file stat, no subprocess needed to see that VirtualBox rewrote it
+        if not rec.cfgfile:
+            return None
+        try:
+            st = os.stat( rec.cfgfile )
+            return ( st.st_mtime_ns, st.st_size )
+        except OSError:
+            return None
+
+    def _store( self, rec ):
+        self._records[ rec.uuid ] = rec
+        self._fingerprints[ rec.uuid ] = ( rec.state_since, self._fingerprint( rec ) )
+
+    def _drop( self, uuid ):
+        if uuid in self._records: del self._records[ uuid ]
+        if uuid in self._fingerprints: del self._fingerprints[ uuid ]
+
+    def load( self ):
+        """
+            Reads every VM with one list --long vms, returns the names read.
+        """
+        self._records = dict()
+        self._fingerprints = dict()
+
+        res = pyvbcc.vm.commands.ListVmsLongCommand( **self._opt ).run()
+        for name in res:
+            self._store( res[ name ] )
+
+        self._running = set( [ r.uuid for r in self._records.values() if r.state in ( pyvbcc.records.VmState.RUNNING, pyvbcc.records.VmState.PAUSED ) ] )
+        self._loaded = True
+        return sorted( res.keys() )
+
+    def changed( self, vms, running, since = None ):
+        """
+            Uuids of the machines that need a fresh showvminfo, given name->uuid of all and of running VMs and
+            uuid->state change time of the running ones when known.
+        """
+        result = list()
+        running = set( pyvbcc.records.to_uuid( u ) for u in running.values() )
+        since = { pyvbcc.records.to_uuid( u ): t for u, t in ( since or dict() ).items() }
+
+        for name in vms:
+            uuid = pyvbcc.records.to_uuid( vms[ name ] )
+            if uuid not in self._records:
+                result.append( vms[ name ] )
+            elif self._records[ uuid ].name != name:
+                result.append( vms[ name ] )
+            elif ( uuid in running ) != ( uuid in self._running ):
+                result.append( vms[ name ] )
+            elif uuid in since and since[ uuid ] != self._fingerprints[ uuid ][0]:
+                result.append( vms[ name ] )
+            elif self._fingerprints[ uuid ][1] != self._fingerprint( self._records[ uuid ] ):
+                result.append( vms[ name ] )
+
+        return result
+
+    def refresh( self ):
+        """
+            Brings the inventory up to date, returns ( changed names, removed names ).
+        """
+        if not self._loaded:
+            return ( self.load(), [] )
+
+        vms = pyvbcc.vm.commands.ListVmsCommand( **self._opt ).run()
+        details = pyvbcc.vm.commands.ListRunningVmsLongCommand( **self._opt ).run()
+        running = { name: rec.uuid for name, rec in details.items() }
+        since = { rec.uuid: rec.state_since for rec in details.values() }
+
+        current = set( pyvbcc.records.to_uuid( u ) for u in vms.values() )
+        removed = [ self._records[ u ].name for u in list( self._records.keys() ) if u not in current ]
+        for u in [ u for u in list( self._records.keys() ) if u not in current ]:
+            self._drop( u )
+
+        stale = self.changed( vms, running, since )
+        results = pyvbcc.executor.CommandExecutor( **self._opt ).run( [ pyvbcc.vm.commands.InfoVmCommand( u, **self._opt ) for u in stale ] )
+
+        changed = list()
+        for u, rec in zip( stale, results ):
+            if isinstance( rec, Exception ) or rec.uuid is None:
+                ## gone between the listing and showvminfo
+                self._drop( pyvbcc.records.to_uuid( u ) )
+                continue
+            self._store( rec )
+            changed.append( rec.name )
+
+        self._running = set( pyvbcc.records.to_uuid( u ) for u in running.values() )
+        return ( sorted( changed ), sorted( removed ) )
+
+    def update( self, rec ):
+        if rec.uuid is not None:
+            self._store( rec )
+
+    def state_change_time( self, uuid ):
+        uuid = pyvbcc.records.to_uuid( uuid )
+        if uuid in self._fingerprints:
+            return self._fingerprints[ uuid ][0]
+        return None
+
+    def get( self, name ):
+        uuid = pyvbcc.records.to_uuid( name )
+        for rec in self._records.values():
+            if rec.name == name or ( uuid is not None and rec.uuid == uuid ):
+                return rec
+        return None
+
+    def records( self ):
+        return { r.name: r for r in self._records.values() }
+
+    def watch( self, interval = 5 ):
+        """
+            Refreshes every interval seconds, yields ( name, record ) for changed VMs and ( name, None ) for removed ones.
+        """
+        try:
+            while True:
+                changed, removed = self.refresh()
+                recs = self.records()
+                for name in changed:
+                    yield name, recs[ name ]
+                for name in removed:
+                    yield name, None
+                time.sleep( interval )
+        except KeyboardInterrupt:
+            return
+
+
+if __name__ == "__main__":
+    pass
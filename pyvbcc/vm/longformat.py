@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.records
+
+"""
+    Parser for the human readable VM description printed by list --long vms ( and plain showvminfo ).
+
+    list --long vms prints one description per VM. Blank lines also show up inside a description, so a
+    record starts at a "Name:" line directly followed by "Groups:" ( or "Encryption:" on newer VirtualBox ),
+    other "Name:" lines belong to shared folders and snapshots of the current VM.
+"""
+
+RX_FIELD = re.compile( r'^([^:]+?):\s*(.*)$' )
+RX_MEMORY = re.compile( r'^Memory size:?\s+(\d+)\s*MB' )
+RX_STATE = re.compile( r'^(.+?) \(since (.+)\)$' )
+RX_CONTROLLER = re.compile( r'^Storage Controller (Name|Type|Instance Number|Max Port Count|Port Count|Bootable) \((\d+)\)$' )
+RX_ATTACHMENT = re.compile( r'^(.+) \((\d+), (\d+)\): (.+?)(?: \(UUID: ([0-9a-fA-F-]+)\))?$' )
+RX_NIC = re.compile( r'^NIC (\d+):\s+(.*)$' )
+RX_RULE = re.compile( r'^NIC (\d+) Rule\(\d+\):\s+(.*)$' )
+RX_ATTACHED = re.compile( r"^(.+?)(?: '(.*)')?$" )
+
+## record starts on Name: followed by one of these
+RECORD_SECOND = ( "Groups:", "Encryption:" )
+
+CONTROLLER_FIELDS = {
+    "Name": "name",
+    "Type": "type",
+    "Instance Number": "instance",
+    "Max Port Count": "maxportcount",
+    "Port Count": "portcount",
+    "Bootable": "bootable"
+}
+
+## Human readable machine states in the spelling showvminfo --machinereadable uses
+STATES = {
+    "powered off": "poweroff",
+    "saved": "saved",
+    "teleported": "teleported",
+    "aborted": "aborted",
+    "running": "running",
+    "paused": "paused",
+    "guru meditation": "gurumeditation",
+    "teleporting": "teleporting",
+    "live snapshotting": "livesnapshotting",
+    "starting": "starting",
+    "stopping": "stopping",
+    "saving": "saving",
+    "restoring": "restoring",
+    "deleting snapshot": "deletingsnapshot",
+    "deleting snapshot live": "deletingsnapshotlive",
+    "inaccessible": "inaccessible"
+}
+
+## NIC attachment as printed, to the nic<n> value and the key holding the attached network name
+ATTACHMENTS = {
+    "NAT": ( "nat", None ),
+    "NAT Network": ( "natnetwork", "nat-network" ),
+    "Host-only Interface": ( "hostonly", "hostonlyadapter" ),
+    "Internal Network": ( "intnet", "intnet" ),
+    "Bridged Interface": ( "bridged", "bridgeadapter" ),
+    "Generic": ( "generic", "genericdrv" ),
+    "none": ( "none", None )
+}
+
+NIC_FIELDS = {
+    "MAC": "macaddress",
+    "Cable connected": "cableconnected",
+    "Type": "nictype",
+    "Reported speed": "nicspeed",
+    "Boot priority": "nicbootprio",
+    "Promisc Policy": "nicpromisc",
+    "Bandwidth group": "nicbandwidthgroup"
+}
+
+RULE_FIELDS = {
+    "name": "name",
+    "protocol": "protocol",
+    "host ip": "hostip",
+    "host port": "hostport",
+    "guest ip": "guestip",
+    "guest port": "guestport"
+}
+
+
+def _int( value ):
+    try:
+        return int( value )
+    except ( TypeError, ValueError ):
+        return None
+
+def _nic( rec, idx, value ):
+    nic = rec.nics.setdefault( idx, dict() )
+    if value == "disabled":
+        nic[ "nic" ] = "none"
+        return
+
+    for part in value.split( ", " ):
+        key, sep, val = part.partition( ": " )
+        if not sep:
+            continue
+
+        if key == "Attachment":
+            m = RX_ATTACHED.match( val )
+            kind, attached = ATTACHMENTS.get( m.group(1), ( m.group(1).lower(), None ) )
+            nic[ "nic" ] = kind
+            if attached and m.group(2) is not None:
+                nic[ attached ] = m.group(2)
+        elif key in NIC_FIELDS:
+            if key == "MAC": val = val.lower()
+            nic[ NIC_FIELDS[ key ] ] = val
+
+def _rule( rec, idx, value ):
+    rule = dict()
+    for part in value.split( ", " ):
+        key, sep, val = part.partition( " = " )
+        if key in RULE_FIELDS:
+            rule[ RULE_FIELDS[ key ] ] = val.rstrip()
+    rule[ "nic" ] = idx
+    rec.forwarding.append( rule )
+
+def _line( rec, line ):
+    m = RX_MEMORY.match( line )
+    if m:
+        rec.memory = int( m.group(1) )
+        return
+
+    if line.startswith( "Storage Controller " ):
+        m = RX_CONTROLLER.match( line.partition( ":" )[0] )
+        if m:
+            rec.controllers.setdefault( int( m.group(2) ), dict() )[ CONTROLLER_FIELDS[ m.group(1) ] ] = line.partition( ":" )[2].lstrip()
+            return
+
+    if line.startswith( "NIC " ):
+        m = RX_RULE.match( line )
+        if m:
+            _rule( rec, int( m.group(1) ), m.group(2) )
+            return
+        m = RX_NIC.match( line )
+        if m:
+            _nic( rec, int( m.group(1) ), m.group(2) )
+            return
+
+    if " (" in line and "):" in line:
+        m = RX_ATTACHMENT.match( line )
+        if m and m.group(1) in [ c.get( "name" ) for c in rec.controllers.values() ]:
+            slot = "%s-%s-%s" % ( m.group(1), m.group(2), m.group(3) )
+            entry = { "controller": m.group(1), "port": int( m.group(2) ), "device": int( m.group(3) ), "medium": m.group(4) }
+            if m.group(4) == "Empty": entry[ "medium" ] = "emptydrive"
+            if m.group(5): entry[ "uuid" ] = pyvbcc.records.to_uuid( m.group(5) )
+            rec.storage[ slot ] = entry
+            return
+
+    m = RX_FIELD.match( line )
+    if not m:
+        return
+
+    key, value = m.group(1), m.group(2)
+    if key == "Groups": rec.groups = [ g for g in value.split( "," ) if len( g ) > 0 ]
+    elif key == "Guest OS": rec.ostype = value
+    elif key == "UUID" and rec.uuid is None: rec.uuid = pyvbcc.records.to_uuid( value )
+    elif key == "Config file": rec.cfgfile = value
+    elif key == "Number of CPUs": rec.cpus = _int( value )
+    elif key == "State":
+        sm = RX_STATE.match( value )
+        if sm:
+            rec.state = pyvbcc.records.to_state( STATES.get( sm.group(1), sm.group(1).replace( " ", "" ) ) )
+            rec.state_since = sm.group(2)
+        else:
+            rec.state = pyvbcc.records.to_state( STATES.get( value, value.replace( " ", "" ) ) )
+    elif key not in rec.properties:
+        rec.properties[ key ] = value
+
+
+def records( lines ):
+    """
+        Yields ( name, VmRecord ) for each VM description, as soon as the next one starts.
+        Inaccessible VMs are skipped, like list vms does.
+    """
+    rec = None
+    held = None
+
+    for line in lines:
+        if held is not None:
+            name = held
+            held = None
+            if line.startswith( RECORD_SECOND ) or name.startswith( "<inaccessible" ):
+                if rec is not None and rec.state != "inaccessible":
+                    yield rec.name, rec
+                rec = pyvbcc.records.VmRecord( name )
+                if name.startswith( "<inaccessible" ): rec.state = pyvbcc.records.VmState.INACCESSIBLE
+            elif rec is not None:
+                _line( rec, "Name: %s" % ( name ) )
+
+        if line.startswith( "Name:" ):
+            held = line[5:].lstrip()
+            continue
+
+        if rec is not None and len( line ) > 0:
+            _line( rec, line )
+
+    if held is not None and rec is not None:
+        _line( rec, "Name: %s" % ( held ) )
+
+    if rec is not None and rec.state != "inaccessible":
+        yield rec.name, rec
+
+
+def parse( lines ):
+    return dict( records( lines ) )
+
+
+if __name__ == "__main__":
+    pass
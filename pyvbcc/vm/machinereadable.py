@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.records
+
+"""
+    Parser for showvminfo --machinereadable output.
+
+    Every line is key=value, the key is bare ( memory, Forwarding(0) ) or quoted ( "SATA-0-0" ) and the value
+    is a bare number/word or a quoted string. Quoted strings can contain '=', escaped quotes and, for
+    descriptions, span several lines. The whole dump is tokenized and classified in one pass with a single
+    precompiled pattern.
+"""
+
+## One token per key=value entry, quoted or bare key, quoted ( possibly multi-line ) or bare value, with the
+## indexed keys split out so the whole dump is classified in the same pass:
+## storagecontroller<field><n> | <nic field><n> | Forwarding(<n>) | "<controller>-[ImageUUID-]<port>-<device>" | other key
+RX_ENTRY = re.compile(
+    r'^(?:storagecontroller(name|type|instance|maxportcount|portcount|bootable)(\d+)'
+    r'|(nic|nictype|nicspeed|nictrace|nictracefile|nicbootprio|nicpromisc|macaddress|cableconnected|natnet|nat-network|hostonlyadapter|bridgeadapter|intnet|genericdrv)(\d+)'
+    r'|Forwarding\((\d+)\)'
+    r'|"([^"\\\n]+?)-(?:(ImageUUID|IsEjected|tempeject)-)?(\d+)-(\d+)"'
+    r'|"([^"\\\n]*(?:\\.[^"\\\n]*)*)"'
+    r'|([^="\n]+))'
+    r'=(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([^\n]*))$', re.M )
+RX_UNESCAPE = re.compile( r'\\(.)' )
+
+UNESCAPES = { "n": "\n", "t": "\t" }
+
+FORWARDING_FIELDS = ( "name", "protocol", "hostip", "hostport", "guestip", "guestport" )
+
+
+def _unescape( value ):
+    return RX_UNESCAPE.sub( lambda m: UNESCAPES.get( m.group(1), m.group(1) ), value )
+
+def _int( value ):
+    try:
+        return int( value )
+    except ( TypeError, ValueError ):
+        return None
+
+def _groups( value ):
+    return [ g for g in value.split( "," ) if len( g ) > 0 ]
+
+## Top level keys copied straight onto the record, with their converter
+FIELDS = {
+    "name": ( "name", None ),
+    "UUID": ( "uuid", pyvbcc.records.to_uuid ),
+    "ostype": ( "ostype", None ),
+    "VMState": ( "state", pyvbcc.records.to_state ),
+    "VMStateChangeTime": ( "state_since", None ),
+    "memory": ( "memory", _int ),
+    "cpus": ( "cpus", _int ),
+    "groups": ( "groups", _groups ),
+    "CfgFile": ( "cfgfile", None ),
+    "description": ( "description", None )
+}
+
+
+def parse( lines ):
+    """
+        Builds a VmRecord from showvminfo --machinereadable output lines.
+    """
+    rec = pyvbcc.records.VmRecord()
+    nic = None
+    slots = list()
+    controllers = rec.controllers
+    nics = rec.nics
+    forwarding = rec.forwarding
+    properties = rec.properties
+    fields = FIELDS
+
+    for cfield, cidx, nfield, nidx, fwd, ctl, skind, port, device, qkey, key, value, bvalue in RX_ENTRY.findall( "\n".join( lines ) ):
+        ## findall gives '' for groups that did not take part
+        if bvalue:
+            value = bvalue
+        elif "\\" in value:
+            value = _unescape( value )
+
+        if cfield:
+            cidx = int( cidx )
+            if cidx not in controllers: controllers[ cidx ] = dict()
+            controllers[ cidx ][ cfield ] = value
+
+        elif nfield:
+            nic = int( nidx )
+            if nic not in nics: nics[ nic ] = dict()
+            nics[ nic ][ nfield ] = value
+
+        elif fwd:
+            rule = dict( zip( FORWARDING_FIELDS, value.split( "," ) ) )
+            rule[ "nic" ] = nic
+            forwarding.append( rule )
+
+        elif ctl:
+            slots.append( ( ctl, skind, port, device, value ) )
+
+        else:
+            if qkey:
+                key = _unescape( qkey ) if "\\" in qkey else qkey
+            field = fields.get( key )
+            if field is not None:
+                setattr( rec, field[0], field[1]( value ) if field[1] else value )
+            else:
+                properties[ key ] = value
+
+    ## storage keys look like any other quoted key, only those naming a known controller are attachments
+    names = set( c.get( "name" ) for c in controllers.values() )
+    storage = rec.storage
+    for ctl, skind, port, device, value in slots:
+        if ctl not in names:
+            properties[ "-".join( [ x for x in ( ctl, skind, port, device ) if x ] ) ] = value
+            continue
+
+        slot = "%s-%s-%s" % ( ctl, port, device )
+        entry = storage.get( slot )
+        if entry is None:
+            entry = storage[ slot ] = { "controller": ctl, "port": int( port ), "device": int( device ) }
+        if not skind: entry[ "medium" ] = value
+        elif skind == "ImageUUID": entry[ "uuid" ] = pyvbcc.records.to_uuid( value )
+        else: entry[ skind.lower() ] = value
+
+    return rec
+
+
+if __name__ == "__main__":
+    pass
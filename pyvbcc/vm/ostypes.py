@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.utils
+import pyvbcc.records
+import pyvbcc.info.commands
+import pyvbcc.vm.commands
+
+"""
+    Os type catalogue kept on disk per VirtualBox API version.
+
+    list ostypes only changes when VirtualBox is upgraded, so its records are stored under the "API version"
+    list systemproperties reports and read back until that version changes. The file is only read on first
+    use and the records are indexed by id in memory.
+
+    PYVBCC_OSTYPES in the environment points the catalogue at another file, "off" keeps it in memory only.
+"""
+
+## Short names used in environment files, to VirtualBox os type ids
+OSTYPE_ALIASES = {
+    "centos": "RedHat_64",
+    "centos7": "RedHat_64",
+    "centos8": "RedHat_64",
+    "rhel": "RedHat_64",
+    "rhel7": "RedHat_64",
+    "rhel8": "RedHat_64",
+    "fedora": "Fedora_64",
+    "oracle": "Oracle_64",
+    "debian": "Debian_64",
+    "ubuntu": "Ubuntu_64",
+    "opensuse": "OpenSUSE_64",
+    "freebsd": "FreeBSD_64",
+    "windows10": "Windows10_64",
+    "windows2019": "Windows2019_64",
+    "linux": "Linux_64"
+}
+
+def resolve( ostype ):
+    """
+        VirtualBox os type id for an alias, anything else is returned as given.
+    """
+    return OSTYPE_ALIASES.get( ostype.lower(), ostype )
+
+DEF_CATALOGUE_FILE=os.path.join( os.path.expanduser( "~" ), ".cache", "pyvbcc", "ostypes.json" )
+
+class OsTypeCatalogue( object ):
+
+    def __init__( self, filename = DEF_CATALOGUE_FILE, **opt ):
+        self._debug = False
+        self._filename = filename
+        self._opt = dict( opt )
+        self._version = None
+        self._index = None
+
+        if pyvbcc.KEY_VM_OSTYPE in self._opt:
+            del self._opt[ pyvbcc.KEY_VM_OSTYPE ]
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+    def version( self ):
+        if self._version is None:
+            ## never from cache, an upgrade must show at once
+            opt = dict( self._opt, **{ pyvbcc.KEY_SYSTEM_CACHE: False } )
+            props = pyvbcc.info.commands.ListSystemPropertiesCommand( **opt ).run()
+            self._version = props.get( "apiversion" )
+        return self._version
+
+    def _read( self ):
+        if not self._filename or not os.path.exists( self._filename ):
+            return dict()
+        try:
+            with open( self._filename, "r" ) as fd:
+                return json.load( fd )
+        except Exception as e:
+            ## a broken catalogue file is just a cold one
+            if self._debug: print( "Ignoring os type catalogue %s: %s" % ( self._filename, e ) )
+            return dict()
+
+    def _write( self, data ):
+        if not self._filename:
+            return
+        try:
+            os.makedirs( os.path.dirname( self._filename ), exist_ok=True )
+            tmpfile = "%s.%s.tmp" % ( self._filename, os.getpid() )
+            with open( tmpfile, "w" ) as fd:
+                json.dump( data, fd )
+            os.replace( tmpfile, self._filename )
+        except Exception as e:
+            if self._debug: print( "Could not write os type catalogue %s: %s" % ( self._filename, e ) )
+
+    def _record( self, data ):
+        rec = pyvbcc.records.OsTypeRecord( data.get( "id" ) )
+        for k in rec.__slots__:
+            if k in data: setattr( rec, k, data[ k ] )
+        return rec
+
+    def load( self ):
+        """
+            Builds the in-memory index, from the catalogue file when it has this version, from list ostypes otherwise.
+        """
+        version = self.version()
+        data = self._read()
+
+        ## --no-cache asks VBoxManage again and rewrites the catalogue
+        if version is not None and version in data and self._opt.get( pyvbcc.KEY_SYSTEM_CACHE ) is not False:
+            self._index = { k: self._record( v ) for k, v in data[ version ].items() }
+            return self._index
+
+        self._index = pyvbcc.vm.commands.ListOsTypesCommand( **self._opt ).run()
+        if version is not None and len( self._index ) > 0:
+            ## only the running version is worth keeping
+            self._write( { version: pyvbcc.records.to_dict( self._index ) } )
+        return self._index
+
+    def records( self ):
+        if self._index is None:
+            self.load()
+        return self._index
+
+    def get( self, ostype ):
+        return self.records().get( ostype )
+
+    def known( self, ostype ):
+        """
+            False only when the catalogue could be read and does not list ostype.
+        """
+        index = self.records()
+        return len( index ) == 0 or ostype in index
+
+    def __contains__( self, ostype ):
+        return ostype in self.records()
+
+
+_catalogue = None
+
+def GetCatalogue( opt = {} ):
+    global _catalogue
+
+    if _catalogue is None:
+        filename = pyvbcc.utils.read_env( "PYVBCC_OSTYPES" )
+        if filename in ("off", "false", "0"):
+            filename = None
+        elif not filename:
+            filename = DEF_CATALOGUE_FILE
+        _catalogue = OsTypeCatalogue( filename, **opt )
+
+    return _catalogue
+
+def SetCatalogue( catalogue ):
+    global _catalogue
+    _catalogue = catalogue
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import uuid
+import fcntl
+import getopt
+import subprocess
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.cache
+import pyvbcc.executor
+import pyvbcc.records
+import pyvbcc.utils
+import pyvbcc.vm.commands
+
+"""
+    Warm pool of powered off linked clones, kept per template in the group /pyvbcc-pool/<template>.
+
+    A create taking a host from the pool renames a member and moves it into the environment's group with one
+    modifyvm, then configures it like any clone. That takes well under a second, cloning takes several. The
+    pool is refilled afterwards by a process of its own, the create does not wait for it:
+
+        python3 -m pyvbcc.vm.pool --template name --vm vm --snapshot snapshot --size N [--machinefolder dir] [--command cmd]
+
+    Only powered off members are handed out, modifyvm cannot rename a VM in saved state. Two fills of the same
+    template never run at once, the second one returns right away. A member is reserved with a lock of its own
+    until the create is done with it, concurrent creates never hand out the same one.
+
+    The locks live in ~/.cache/pyvbcc, PYVBCC_POOL_LOCKS in the environment points them at another directory.
+"""
+
+DEF_POOL_GROUP="pyvbcc-pool"
+DEF_POOL_SIZE=2
+DEF_LOCK_DIR=os.path.join( os.path.expanduser( "~" ), ".cache", "pyvbcc" )
+
+def lock_dir():
+    return pyvbcc.utils.read_env( "PYVBCC_POOL_LOCKS" ) or DEF_LOCK_DIR
+
+def pool_group( template ):
+    """
+        "centos" -> "/pyvbcc-pool/centos" as VirtualBox lists groups.
+    """
+    return "/%s/%s" % ( DEF_POOL_GROUP, template )
+
+class VmPool( object ):
+
+    def __init__( self, template, vm, snapshot, size = DEF_POOL_SIZE, machinefolder = None, **opt ):
+        self._debug = False
+        self._test = False
+        self._template = template
+        self._vm = vm
+        self._snapshot = snapshot
+        self._size = int( size )
+        self._machinefolder = machinefolder
+        self._opt = dict( opt )
+        self._reserved = dict()
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+        if "test" in opt and opt['test'] in (True, False):
+            self._test = opt["test"]
+
+        if pyvbcc.KEY_SYSTEM_DEBUG in opt and opt[ pyvbcc.KEY_SYSTEM_DEBUG ] in (True,False):
+            self._debug = opt[ pyvbcc.KEY_SYSTEM_DEBUG ]
+
+        ## members come and go under us, never answer from cache
+        self._opt[ pyvbcc.KEY_SYSTEM_CACHE ] = False
+
+    def group( self ):
+        return pool_group( self._template )
+
+    def size( self ):
+        return self._size
+
+    def members( self ):
+        """
+            Names of the powered off members, sorted.
+        """
+        vms = pyvbcc.vm.commands.ListVmsLongCommand( **self._opt ).run()
+        if type( vms ).__name__ != "dict":
+            return list()
+        return sorted( name for name, rec in vms.items() if self.group() in rec.groups and rec.state == pyvbcc.records.VmState.POWEROFF )
+
+    def reserve( self ):
+        """
+            Locks a member nobody else holds and returns its name, None when there is none left.
+        """
+        os.makedirs( lock_dir(), exist_ok=True )
+        for member in self.members():
+            if member in self._reserved:
+                continue
+            lock = open( os.path.join( lock_dir(), "claim-%s.lock" % ( member ) ), "a+" )
+            try:
+                fcntl.flock( lock, fcntl.LOCK_EX | fcntl.LOCK_NB )
+            except OSError:
+                lock.close()
+                continue
+            ## the holder before us may have renamed it already
+            if member not in self.members():
+                lock.close()
+                continue
+            self._reserved[ member ] = lock
+            return member
+        return None
+
+    def release( self ):
+        """
+            Drops every reservation, the locks of members taken out of the pool are removed.
+        """
+        members = self.members() if len( self._reserved ) > 0 else list()
+        for member, lock in self._reserved.items():
+            if member not in members:
+                try:
+                    os.unlink( lock.name )
+                except OSError:
+                    pass
+            lock.close()
+        self._reserved = dict()
+
+    def claim( self, member, name, group ):
+        """
+            Command taking member out of the pool as name in group.
+        """
+        cfg = { pyvbcc.KEY_VM_NAME: member, pyvbcc.KEY_VM_NEWNAME: name, pyvbcc.KEY_GROUP_NAME: group }
+        return pyvbcc.vm.commands.RenameVmCommand( cfg, **self._opt )
+
+    def _clone( self, name ):
+        cfg = {
+            pyvbcc.KEY_VM_NAME: name,
+            pyvbcc.KEY_VM_TEMPLATE: self._vm,
+            pyvbcc.KEY_VM_SNAPSHOT: self._snapshot,
+            pyvbcc.KEY_GROUP_NAME: self.group()
+        }
+        if self._machinefolder: cfg[ pyvbcc.KEY_VM_BASEFOLDER ] = self._machinefolder
+        return pyvbcc.vm.commands.CloneVmCommand( cfg, **self._opt )
+
+    def fill( self ):
+        """
+            Clones members until the pool is full, returns the names of the new ones.
+        """
+        os.makedirs( lock_dir(), exist_ok=True )
+        with open( os.path.join( lock_dir(), "pool-%s.lock" % ( self._template ) ), "a+" ) as lock:
+            try:
+                fcntl.flock( lock, fcntl.LOCK_EX | fcntl.LOCK_NB )
+            except OSError:
+                if self._debug: print( "Pool %s is being filled already" % ( self._template ) )
+                return list()
+
+            try:
+                names = [ "%s-pool-%s" % ( self._template, uuid.uuid4().hex[:8] ) for i in range( self._size - len( self.members() ) ) ]
+                results = pyvbcc.executor.CommandExecutor( **self._opt ).run( [ self._clone( n ) for n in names ] )
+                created = list()
+                for name, result in zip( names, results ):
+                    if isinstance( result, Exception ) or not result.ok():
+                        if self._debug: print( "Cloning %s failed: %s" % ( name, result ) )
+                        continue
+                    created.append( name )
+                return created
+            finally:
+                fcntl.flock( lock, fcntl.LOCK_UN )
+
+    def refill( self ):
+        """
+            Fills the pool from a detached process, returns its Popen. Nothing is started for a test run.
+        """
+        if self._test:
+            return None
+        argv = [ sys.executable, "-m", "pyvbcc.vm.pool", "--template", self._template, "--vm", self._vm,
+                 "--snapshot", self._snapshot, "--size", str( self._size ) ]
+        if self._machinefolder: argv += [ "--machinefolder", self._machinefolder ]
+        if self._opt.get( pyvbcc.KEY_SYSTEM_COMMAND ): argv += [ "--command", self._opt[ pyvbcc.KEY_SYSTEM_COMMAND ] ]
+
+        env = dict( os.environ )
+        ## the child uses the cache this process uses, or none
+        cache = pyvbcc.cache.GetCache()
+        env[ "PYVBCC_CACHE" ] = cache.filename() if cache is not None else "off"
+        root = os.path.dirname( os.path.dirname( os.path.abspath( pyvbcc.__file__ ) ) )
+        env[ "PYTHONPATH" ] = os.pathsep.join( [ root ] + [ p for p in env.get( "PYTHONPATH", "" ).split( os.pathsep ) if p ] )
+        return subprocess.Popen( argv, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True )
+
+
+def main( argv = None ):
+    opts, args = getopt.getopt( sys.argv[1:] if argv is None else argv, "d", [ "debug", "template=", "vm=", "snapshot=", "size=", "machinefolder=", "command=" ] )
+    cfg = { "size": DEF_POOL_SIZE, "machinefolder": None }
+    opt = dict()
+    for o, a in opts:
+        if o in ( "-d", "--debug" ): opt[ "debug" ] = True
+        elif o == "--command": opt[ pyvbcc.KEY_SYSTEM_COMMAND ] = a
+        else: cfg[ o[2:] ] = a
+
+    if "template" not in cfg or "vm" not in cfg or "snapshot" not in cfg:
+        raise AttributeError( "pool needs --template, --vm and --snapshot" )
+    created = VmPool( cfg[ "template" ], cfg[ "vm" ], cfg[ "snapshot" ], cfg[ "size" ], cfg[ "machinefolder" ], **opt ).fill()
+    if opt.get( "debug" ): print( "Cloned %s" % ( ", ".join( created ) ) )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit( main() )
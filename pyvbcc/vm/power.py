@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import asyncio
+
+from pprint import pprint
+
+import pyvbcc
+import pyvbcc.executor
+import pyvbcc.records
+import pyvbcc.state
+import pyvbcc.trace
+import pyvbcc.info.commands
+import pyvbcc.vm.commands
+import pyvbcc.vm.inventory
+
+"""
+    Power control of a whole VirtualBox group.
+
+    start() runs startvm on every VM of the group that is not running yet, at most --concurrency at a time
+    ( each startvm spawns a VM process and keeps VBoxSVC busy ), and then waits until every guest is usable.
+    A guest counts as ready once its guest additions set /VirtualBox/GuestInfo/Net/0/V4/IP. The property is
+    read first and then waited on with guestproperty wait in slices until the timeout, so an address set
+    before the wait began is not missed. The waits run next to the starts, a VM that boots fast is reported
+    ready while others are still starting.
+
+    Every VM reports its state and the seconds from the start of the run until startvm returned and until
+    the guest was ready.
+
+    stop() presses the ACPI power button of every running VM at once and then polls with one list runningvms
+    per tick, not one query per VM. Guests still running when the timeout passes are powered off hard. Every
+    VM reports the seconds until it was off, stopping a group takes about as long as its slowest guest.
+"""
+
+DEF_START_CONCURRENCY=4
+DEF_READY_TIMEOUT=300
+## longest single guestproperty wait, the deadline is checked between them
+DEF_WAIT_SLICE=10
+## a wait that returns sooner than this without a value failed, do not spin on it
+DEF_POLL=1.0
+DEF_STOP_TIMEOUT=60
+## seconds between the list runningvms of a stop
+DEF_STOP_POLL=1.0
+
+STATE_READY="ready"
+STATE_STARTED="started"
+STATE_FAILED="failed"
+STATE_TIMEOUT="timeout"
+STATE_STOPPED="stopped"
+STATE_FORCED="forced"
+
+def group_path( group ):
+    """
+        "g1", "/g1" -> "/g1" as VirtualBox lists groups.
+    """
+    return "/" + str( group ).strip( "/" )
+
+class GroupPower( object ):
+
+    def __init__( self, group = None, **opt ):
+        self._debug = False
+        self._test = False
+        self._group = group_path( group ) if group else None
+        self._opt = dict( opt )
+        self._concurrency = DEF_START_CONCURRENCY
+        self._timeout = DEF_READY_TIMEOUT
+        self._prop = pyvbcc.vm.commands.DEF_READY_PROPERTY
+        self._wait = True
+        self._type = "headless"
+        self._hard = False
+        self._stop_timeout = DEF_STOP_TIMEOUT
+        self._poll = DEF_STOP_POLL
+
+        if "debug" in opt and opt['debug'] in (True, False):
+            self._debug = opt["debug"]
+
+        if "test" in opt and opt['test'] in (True, False):
+            self._test = opt["test"]
+
+        if pyvbcc.KEY_SYSTEM_DEBUG in opt and opt[ pyvbcc.KEY_SYSTEM_DEBUG ] in (True,False):
+            self._debug = opt[ pyvbcc.KEY_SYSTEM_DEBUG ]
+
+        if pyvbcc.KEY_SYSTEM_CONCURRENCY in opt and opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ]:
+            self._concurrency = int( opt[ pyvbcc.KEY_SYSTEM_CONCURRENCY ] )
+
+        if pyvbcc.KEY_SYSTEM_TIMEOUT in opt and opt[ pyvbcc.KEY_SYSTEM_TIMEOUT ]:
+            self._timeout = float( opt[ pyvbcc.KEY_SYSTEM_TIMEOUT ] )
+            self._stop_timeout = float( opt[ pyvbcc.KEY_SYSTEM_TIMEOUT ] )
+
+        if pyvbcc.KEY_VM_READY in opt and opt[ pyvbcc.KEY_VM_READY ]:
+            self._prop = opt[ pyvbcc.KEY_VM_READY ]
+
+        if pyvbcc.KEY_SYSTEM_WAIT in opt and opt[ pyvbcc.KEY_SYSTEM_WAIT ] in (False, "False", "false"):
+            self._wait = False
+
+        if pyvbcc.KEY_VM_STYPE in opt and opt[ pyvbcc.KEY_VM_STYPE ]:
+            self._type = opt[ pyvbcc.KEY_VM_STYPE ]
+
+        if pyvbcc.KEY_VM_OFFTYPE in opt and opt[ pyvbcc.KEY_VM_OFFTYPE ] == "hard":
+            self._hard = True
+
+        ## power states change under us, never answer from cache
+        self._opt[ pyvbcc.KEY_SYSTEM_CACHE ] = False
+
+    def group( self ):
+        return self._group
+
+    def members( self, names = None ):
+        """
+            { name: VmRecord } of the VMs in the group and its subgroups, every VM when no group is set.
+            names limits them further.
+        """
+        if self._group is not None and not self._test:
+            groups = pyvbcc.info.commands.ListGroupCommand( "all", **self._opt ).run()
+            if self._group not in [ g[ "path" ] for g in groups.values() ]:
+                raise AttributeError( "Unknown group %s" % ( self._group ) )
+
+        inventory = pyvbcc.vm.inventory.VmInventory( **self._opt )
+        inventory.load()
+        res = dict()
+        for name, rec in inventory.records().items():
+            if names is not None and name not in names:
+                continue
+            if self._group is None or any( g == self._group or g.startswith( self._group + "/" ) for g in rec.groups ):
+                res[ name ] = rec
+        return res
+
+    def _record( self, states, power ):
+        ## keep the power state of managed VMs in the state store current, unknown VMs are left alone
+        if self._test:
+            return
+        store = pyvbcc.state.GetStateStore( None, self._opt )
+        for name, res in states.items():
+            if res[ "state" ] != STATE_FAILED:
+                store.set_power( name, power )
+        store.close()
+
+    ###################################################################################################################
+    ## Start
+    ###################################################################################################################
+    async def _ready( self, name, deadline ):
+        """
+            Value of the readiness property once the guest set it, None when the deadline passed first.
+        """
+        while True:
+            value = await pyvbcc.vm.commands.GetGuestPropertyCommand( name, self._prop, **self._opt ).arun()
+            if value:
+                return value
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+
+            start = time.monotonic()
+            changed = await pyvbcc.vm.commands.WaitGuestPropertyCommand( name, self._prop, min( remaining, DEF_WAIT_SLICE ), **self._opt ).arun()
+            if changed is not None and changed[1]:
+                return changed[1]
+            if time.monotonic() - start < DEF_POLL:
+                await asyncio.sleep( DEF_POLL )
+
+    async def _start( self, executor, name, rec, origin ):
+        res = { "state": STATE_STARTED, "start": None, "ready": None, "ip": None }
+
+        if rec.state not in ( pyvbcc.records.VmState.RUNNING, pyvbcc.records.VmState.PAUSED ):
+            cfg = { pyvbcc.KEY_VM_NAME: name, pyvbcc.KEY_VM_STYPE: self._type }
+            try:
+                result = await executor.submit( pyvbcc.vm.commands.ModifyVmStartCommand( cfg, **self._opt ) )
+            except Exception as e:
+                result = e
+            if isinstance( result, Exception ) or not result.ok():
+                res[ "state" ] = STATE_FAILED
+                res[ "error" ] = str( result ) if isinstance( result, Exception ) else "; ".join( result.errors() )
+                return name, res
+        res[ "start" ] = round( time.monotonic() - origin, 3 )
+
+        ## a test run started nothing, there is nothing to wait for
+        if not self._wait or self._test:
+            return name, res
+
+        value = await self._ready( name, origin + self._timeout )
+        if value is None:
+            res[ "state" ] = STATE_TIMEOUT
+        else:
+            res[ "state" ] = STATE_READY
+            res[ "ready" ] = round( time.monotonic() - origin, 3 )
+            res[ "ip" ] = value
+        if self._debug: print( "%s %s after %ss" % ( name, res[ "state" ], res[ "ready" ] or self._timeout ) )
+        return name, res
+
+    async def astart( self, names = None ):
+        members = self.members( names )
+        executor = pyvbcc.executor.CommandExecutor( self._concurrency, **self._opt )
+        origin = time.monotonic()
+        done = await asyncio.gather( *[ self._start( executor, name, rec, origin ) for name, rec in sorted( members.items() ) ] )
+        return dict( done )
+
+    def start( self, names = None ):
+        """
+            Starts the group's VMs and waits for them, returns { name: { state, start, ready, ip } }.
+        """
+        with pyvbcc.trace.Span( "start", "power", group=self._group ):
+            states = asyncio.run( self.astart( names ) )
+        self._record( states, pyvbcc.records.VmState.RUNNING.value )
+        return states
+
+    ###################################################################################################################
+    ## Stop
+    ###################################################################################################################
+    async def _power_off( self, executor, names, offtype ):
+        """
+            Sends poweroff ( "hard" ) or acpipowerbutton ( "soft" ) to all names at once, returns { name: error } of the failed ones.
+        """
+        cmds = [ pyvbcc.vm.commands.ModifyVmPowerOffCommand( { pyvbcc.KEY_VM_NAME: n, pyvbcc.KEY_VM_OFFTYPE: offtype }, **self._opt ) for n in names ]
+        results = await executor.gather( cmds )
+        failed = dict()
+        for name, result in zip( names, results ):
+            if isinstance( result, Exception ):
+                failed[ name ] = str( result )
+            elif not result.ok():
+                failed[ name ] = "; ".join( result.errors() )
+        return failed
+
+    async def _running( self ):
+        """
+            Names of the running VMs from one list runningvms, None when the list failed.
+        """
+        cmd = pyvbcc.vm.commands.ListRunningVmsCommand( **self._opt )
+        result = await cmd.aexecute()
+        if not result.ok():
+            return None
+        return set( cmd.parse( result ).keys() )
+
+    async def astop( self, names = None ):
+        members = self.members( names )
+        running = sorted( n for n, r in members.items() if r.state in ( pyvbcc.records.VmState.RUNNING, pyvbcc.records.VmState.PAUSED ) )
+        ## paused guests cannot react to the power button, they go off hard right away
+        paused = [ n for n in running if members[ n ].state == pyvbcc.records.VmState.PAUSED ]
+        soft = [ n for n in running if n not in paused and not self._hard ]
+        hard = [ n for n in running if n not in soft ]
+
+        states = { n: { "state": STATE_STOPPED, "stop": 0.0, "method": None } for n in members if n not in running }
+        executor = pyvbcc.executor.CommandExecutor( **self._opt )
+        origin = time.monotonic()
+
+        failed = await self._power_off( executor, soft, "soft" )
+        failed.update( await self._power_off( executor, hard, "hard" ) )
+        for n in running:
+            states[ n ] = { "state": STATE_FORCED if n in hard else STATE_STOPPED, "stop": None, "method": "poweroff" if n in hard else "acpi" }
+        for n, error in failed.items():
+            states[ n ].update( { "state": STATE_FAILED, "error": error } )
+
+        waiting = set( n for n in running if n not in failed )
+        deadline = origin + self._stop_timeout
+        forced = False
+        while len( waiting ) > 0 and not self._test:
+            still = await self._running()
+            now = round( time.monotonic() - origin, 3 )
+            ## a failed list says nothing about the guests, look again next tick
+            if still is not None:
+                for n in waiting - still:
+                    states[ n ][ "stop" ] = now
+                waiting &= still
+            if len( waiting ) == 0 or forced:
+                break
+
+            if time.monotonic() >= deadline:
+                ## out of patience, pull the plug on the stragglers and look once more
+                if self._debug: print( "Powering off %s" % ( ", ".join( sorted( waiting ) ) ) )
+                for n in waiting:
+                    states[ n ].update( { "state": STATE_FORCED, "method": "poweroff" } )
+                for n, error in ( await self._power_off( executor, sorted( waiting ), "hard" ) ).items():
+                    states[ n ].update( { "state": STATE_FAILED, "error": error } )
+                    waiting.discard( n )
+                forced = True
+                continue
+
+            await asyncio.sleep( min( self._poll, max( deadline - time.monotonic(), 0 ) ) )
+
+        for n in waiting:
+            states[ n ].update( { "state": STATE_FAILED, "error": "still running" } )
+        return dict( sorted( states.items() ) )
+
+    def stop( self, names = None ):
+        """
+            Shuts the group's VMs down, returns { name: { state, stop, method } }.
+        """
+        with pyvbcc.trace.Span( "stop", "power", group=self._group ):
+            states = asyncio.run( self.astop( names ) )
+        self._record( states, pyvbcc.records.VmState.POWEROFF.value )
+        return states
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.cache
+import pyvbcc.emulator
+
+"""
+    Environments and the emulator test case shared by the plan, state and emulator tests.
+"""
+
+def environment( hosts ):
+    return {
+        "system": { "machinefolder": "/tmp/vms", "group": "bench" },
+        "networks": [ { "name": "nat1", "type": "natnet", "network": "10.0.2.0/24" } ],
+        "hosts": [ {
+            "name": "vm%s" % ( i ), "type": "centos7", "cpus": "1", "mem": "1024",
+            "disks": [ { "name": "vm%sd%s" % ( i, d ), "size": "2G", "format": "vdi" } for d in range( 2 ) ],
+            "nics": [ { "type": "nat", "network": "nat1" }, { "type": "host", "network": "vboxnet0", "mac": "08:00:27:00:00:%02x" % ( i ) } ]
+        } for i in range( hosts ) ]
+    }
+
+class EmulatorTestCase( unittest.TestCase ):
+    """
+        Runs every test against an emulator, state store and command cache of its own in a temporary
+        directory, nothing is read from or written to the user's home.
+    """
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        self._env = dict( os.environ )
+        os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( self._dir.name, "emulator.json" )
+        os.environ[ "PYVBCC_STATE" ] = os.path.join( self._dir.name, "pyvbcc.db" )
+        os.environ[ "PYVBCC_OSTYPES" ] = "off"
+        os.environ[ "PYVBCC_CACHE" ] = "off"
+        pyvbcc.cache.Disable()
+        self._opt = { pyvbcc.KEY_SYSTEM_COMMAND: "emulator" }
+
+    def tearDown( self ):
+        os.environ.clear()
+        os.environ.update( self._env )
+        pyvbcc.cache.SetCache( None )
+        self._dir.cleanup()
+
+    def _run( self, *argv ):
+        emulator = pyvbcc.emulator.Emulator()
+        self.assertEqual( emulator.run( list( argv ) ), 0 )
+        return emulator.out
+
+    def _config( self ):
+        filename = os.path.join( self._dir.name, "pyvbcc.json" )
+        with open( filename, "w" ) as fd:
+            json.dump( { "system": {} }, fd )
+        return filename
+
+    def _environment( self, data ):
+        ## the environment runs in the temporary directory against the emulator
+        data = dict( data, system = dict( { "machinefolder": self._dir.name, "group": "emu", "command": "emulator" }, **data.get( "system", {} ) ) )
+        filename = os.path.join( self._dir.name, "env.json" )
+        with open( filename, "w" ) as fd:
+            json.dump( data, fd )
+        return filename
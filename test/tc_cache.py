@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.cache
+import pyvbcc.command
+import pyvbcc.emulator
+import pyvbcc.executor
+import pyvbcc.vm.commands
+
+class EchoVmsCommand( pyvbcc.vm.commands.ListVmsCommand ):
+    """
+        list vms stand-in, prints a new uuid on every call.
+    """
+    def _command_line( self ):
+        return [ sys.executable, "-c", "import uuid; print( '\"vm1\" {%s}' % ( uuid.uuid4() ) )" ]
+
+class TouchCommand( pyvbcc.command.GenericCommand ):
+    INVALIDATES = ( "vms", )
+
+    def _command_line( self ):
+        return [ sys.executable, "-c", "pass" ]
+
+class TestCache( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        self._file = os.path.join( self._dir.name, "cache.db" )
+        pyvbcc.cache.SetCache( pyvbcc.cache.CommandCache( self._file ) )
+
+    def tearDown( self ):
+        pyvbcc.cache.SetCache( None )
+        self._dir.cleanup()
+
+    def test_ttl_expiry( self ):
+        cache = pyvbcc.cache.CommandCache( self._file )
+        cache.put( "a", ["x"], 0.05, ["vms"] )
+        self.assertEqual( cache.get( "a" ), ["x"] )
+        time.sleep( 0.1 )
+        self.assertEqual( cache.get( "a" ), None )
+
+    def test_invalidate_by_tag( self ):
+        cache = pyvbcc.cache.CommandCache( self._file )
+        cache.put( "a", ["x"], 60, ["vms"] )
+        cache.put( "b", ["y"], 60, ["hdds"] )
+        self.assertEqual( cache.invalidate( ["vms"] ), 1 )
+        self.assertEqual( cache.get( "a" ), None )
+        self.assertEqual( cache.get( "b" ), ["y"] )
+
+    def test_persisted( self ):
+        pyvbcc.cache.CommandCache( self._file ).put( "a", ["x"], 60, ["vms"] )
+        self.assertEqual( pyvbcc.cache.CommandCache( self._file ).get( "a" ), ["x"] )
+
+    def test_shared_invalidation( self ):
+        ## a process invalidating vms is not undone by another one putting an unrelated entry
+        first = pyvbcc.cache.CommandCache( self._file )
+        second = pyvbcc.cache.CommandCache( self._file )
+        first.put( "a", ["x"], 60, ["vms"] )
+        self.assertEqual( second.get( "a" ), ["x"] )
+        self.assertEqual( first.invalidate( ["vms"] ), 1 )
+        second.put( "b", ["y"], 60, ["hdds"] )
+        self.assertEqual( first.get( "a" ), None )
+        self.assertEqual( second.get( "a" ), None )
+        self.assertEqual( first.get( "b" ), ["y"] )
+
+    def test_broken_file( self ):
+        with open( self._file, "w" ) as fd:
+            fd.write( "{ not a database" )
+        cache = pyvbcc.cache.CommandCache( self._file )
+        cache.put( "a", ["x"], 60 )
+        self.assertEqual( cache.get( "a" ), None )
+
+    def test_emulator_states( self ):
+        ## two emulator state files are two VirtualBoxes, their listings are cached apart
+        env = dict( os.environ )
+        opt = { pyvbcc.KEY_SYSTEM_COMMAND: "emulator" }
+        try:
+            os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( self._dir.name, "a.json" )
+            self.assertEqual( pyvbcc.emulator.Emulator().run( [ "createvm", "--name", "vm1", "--register" ] ), 0 )
+            self.assertEqual( list( pyvbcc.vm.commands.ListVmsCommand( **opt ).run() ), [ "vm1" ] )
+            os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( self._dir.name, "b.json" )
+            self.assertEqual( list( pyvbcc.vm.commands.ListVmsCommand( **opt ).run() ), [] )
+        finally:
+            os.environ.clear()
+            os.environ.update( env )
+
+    def test_command_cached( self ):
+        first = EchoVmsCommand().run()
+        self.assertEqual( EchoVmsCommand().run(), first )
+
+    def test_command_invalidated( self ):
+        first = EchoVmsCommand().run()
+        TouchCommand( [] ).run()
+        self.assertNotEqual( EchoVmsCommand().run(), first )
+
+    def test_async_cached( self ):
+        first = EchoVmsCommand().run()
+        res = pyvbcc.executor.RunCommands( [ EchoVmsCommand() ] )
+        self.assertEqual( res[0], first )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
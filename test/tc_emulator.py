@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import unittest
+
+import pyvbcc
+import pyvbcc.config
+import pyvbcc.emulator
+import pyvbcc.plan
+import pyvbcc.vbm
+import pyvbcc.vm.commands
+import pyvbcc.vm.longformat
+import pyvbcc.vm.machinereadable
+import pyvbcc.disk.commands
+
+from helpers import EmulatorTestCase
+
+class TestEmulator( EmulatorTestCase ):
+
+    def test_parsers( self ):
+        self._run( "createvm", "--name", "vm1", "--groups", "/g1", "--ostype", "Ubuntu_64", "--register" )
+        self._run( "storagectl", "vm1", "--name", "SATA", "--add", "sata", "--portcount", "2" )
+        self._run( "createmedium", "disk", "--filename", "/tmp/vm1d0.vdi", "--size", "2048", "--format", "VDI" )
+        self._run( "storageattach", "vm1", "--storagectl", "SATA", "--port", "0", "--device", "0", "--type", "hdd", "--medium", "/tmp/vm1d0.vdi" )
+        self._run( "modifyvm", "vm1", "--cpus", "2", "--memory", "1024", "--nic2", "natnetwork", "--nat-network2", "nat1" )
+
+        rec = pyvbcc.vm.machinereadable.parse( self._run( "showvminfo", "vm1", "--machinereadable" ) )
+        self.assertEqual( ( rec.name, rec.cpus, rec.memory, rec.groups ), ( "vm1", 2, 1024, [ "/g1" ] ) )
+        self.assertEqual( rec.storage[ "SATA-0-0" ][ "medium" ], "/tmp/vm1d0.vdi" )
+
+        recs = pyvbcc.vm.longformat.parse( self._run( "list", "--long", "vms" ) )
+        self.assertEqual( list( recs ), [ "vm1" ] )
+        self.assertEqual( recs[ "vm1" ].uuid, rec.uuid )
+
+        self._run( "startvm", "vm1", "--type", "headless" )
+        emulator = pyvbcc.emulator.Emulator()
+        self.assertEqual( emulator.run( [ "modifyvm", "vm1", "--cpus", "1" ] ), 1 )
+
+    def test_command( self ):
+        ## system.command selects the emulator for every GenericCommand
+        opt = { pyvbcc.KEY_SYSTEM_COMMAND: "emulator" }
+        self._run( "createvm", "--name", "vm1", "--register" )
+        self.assertEqual( list( pyvbcc.vm.commands.ListVmsCommand( **opt ).run() ), [ "vm1" ] )
+
+        os.environ[ "PYVBCC_EMULATOR_CONTENTION" ] = "1"
+        cmd = pyvbcc.vm.commands.ModifyVmPowerOffCommand( { pyvbcc.KEY_VM_NAME: "vm1" }, **opt )
+        res = cmd.execute()
+        self.assertFalse( res.ok() )
+        self.assertTrue( res.contention() )
+
+    def test_create_destroy( self ):
+        config = self._config()
+        envfile = self._environment( {
+            "networks": [ { "name": "nat1", "type": "natnet", "network": "10.0.2.0/24" } ],
+            "hosts": [ { "name": "vm%s" % ( i ), "type": "centos7", "disks": [ { "name": "vm%sd0" % ( i ), "size": "1G" } ],
+                         "nics": [ { "type": "nat", "network": "nat1" } ] } for i in range( 2 ) ]
+        } )
+
+        for mode in ( "create", "destroy" ):
+            opt = { pyvbcc.KEY_SYSTEM_MODE: mode, pyvbcc.KEY_SYSTEM_ENVFILE: envfile }
+            res = pyvbcc.vbm.VbManage( pyvbcc.config.Configuration( config ), opt ).run()
+            self.assertNotIn( pyvbcc.plan.STATE_FAILED, res.values() )
+            if mode == "create":
+                self.assertEqual( sorted( self._run( "list", "vms" ) )[0][:5], "\"vm0\"" )
+
+        self.assertEqual( self._run( "list", "vms" ), [] )
+
+    def test_linked_clone( self ):
+        self._run( "createvm", "--name", "golden", "--groups", "/templates", "--ostype", "RedHat_64", "--register" )
+        self._run( "storagectl", "golden", "--name", "SATA", "--add", "sata", "--portcount", "1" )
+        self._run( "createmedium", "disk", "--filename", "/tmp/golden.vdi", "--size", "8192", "--format", "VDI" )
+        self._run( "storageattach", "golden", "--storagectl", "SATA", "--port", "0", "--device", "0", "--type", "hdd", "--medium", "/tmp/golden.vdi" )
+
+        config = self._config()
+        envfile = self._environment( {
+            "templates": [ { "name": "centos", "vm": "golden" } ],
+            "hosts": [ { "name": "vm%s" % ( i ), "template": "centos", "mem": "512" } for i in range( 3 ) ]
+        } )
+
+        for mode in ( "create", "create", "destroy" ):
+            opt = { pyvbcc.KEY_SYSTEM_MODE: mode, pyvbcc.KEY_SYSTEM_ENVFILE: envfile }
+            res = pyvbcc.vbm.VbManage( pyvbcc.config.Configuration( config ), opt ).run()
+            self.assertNotIn( pyvbcc.plan.STATE_FAILED, res.values() )
+            if mode == "create":
+                ## the snapshot is taken once, the second create has nothing to do
+                snapshots = pyvbcc.vm.commands.ListSnapshotsCommand( "golden", **{ pyvbcc.KEY_SYSTEM_COMMAND: "emulator" } ).run()
+                self.assertEqual( list( snapshots ), [ "pyvbcc-base" ] )
+                rec = pyvbcc.vm.machinereadable.parse( self._run( "showvminfo", "vm1", "--machinereadable" ) )
+                self.assertEqual( ( rec.memory, rec.groups ), ( 512, [ "/emu" ] ) )
+                hdds = pyvbcc.disk.commands.ListDiskCommand( "all", **{ pyvbcc.KEY_SYSTEM_COMMAND: "emulator" } ).run()
+                self.assertEqual( len( hdds ), 4 )
+                self.assertEqual( len( [ h for h in hdds.values() if h.parent is not None ] ), 3 )
+
+        ## the clones and their differencing images are gone, the template and its disk stay
+        self.assertEqual( self._run( "list", "vms" )[0][:8], "\"golden\"" )
+        self.assertEqual( len( self._run( "list", "vms" ) ), 1 )
+        self.assertEqual( len( pyvbcc.disk.commands.ListDiskCommand( "all", **{ pyvbcc.KEY_SYSTEM_COMMAND: "emulator" } ).run() ), 1 )
+
+
+if __name__ == "__main__":
+    unittest.main()
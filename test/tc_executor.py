@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import asyncio
+import unittest
+from unittest import mock
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.executor
+import pyvbcc.vm.commands
+
+class SleepCommand( pyvbcc.command.GenericCommand ):
+    """
+        Stands in for a VBoxManage call, tracks how many instances run at the same time.
+    """
+    running = dict()
+    peak = dict()
+
+    def __init__( self, cmd, **opt ):
+        super().__init__( cmd, **opt )
+
+    async def aexecute( self, **opt ):
+        key = self.machine()
+        SleepCommand.running[ key ] = SleepCommand.running.get( key, 0 ) + 1
+        SleepCommand.running[ "all" ] = SleepCommand.running.get( "all", 0 ) + 1
+        SleepCommand.peak[ key ] = max( SleepCommand.peak.get( key, 0 ), SleepCommand.running[ key ] )
+        SleepCommand.peak[ "all" ] = max( SleepCommand.peak.get( "all", 0 ), SleepCommand.running[ "all" ] )
+        await asyncio.sleep( 0.01 )
+        SleepCommand.running[ key ] -= 1
+        SleepCommand.running[ "all" ] -= 1
+        return pyvbcc.command.GenericCommandResult( self._command_line(), [], 0 )
+
+class BusyCommand( pyvbcc.command.GenericCommand ):
+    """
+        Fails with a lock error the first times it runs.
+    """
+    def __init__( self, cmd, busy, **opt ):
+        super().__init__( cmd, **opt )
+        self.busy = busy
+        self.calls = 0
+
+    async def aexecute( self, **opt ):
+        self.calls += 1
+        if self.calls <= self.busy:
+            return pyvbcc.command.GenericCommandResult( self._command_line(), [], 1, [
+                "VBoxManage: error: The machine 'vm1' is already locked for a session (or being unlocked)",
+                "VBoxManage: error: Details: code VBOX_E_INVALID_OBJECT_STATE (0x80bb0007), component MachineWrap, interface IMachine"
+            ] )
+        return pyvbcc.command.GenericCommandResult( self._command_line(), [], 0 )
+
+class CongestedCommand( pyvbcc.command.GenericCommand ):
+    """
+        Gets slower once more than 6 run at the same time, like VBoxSVC does.
+    """
+    running = 0
+    peak = 0
+
+    async def aexecute( self, **opt ):
+        CongestedCommand.running += 1
+        CongestedCommand.peak = max( CongestedCommand.peak, CongestedCommand.running )
+        started = time.time()
+        await asyncio.sleep( 0.002 * max( 1, CongestedCommand.running - 5 ) ** 2 )
+        CongestedCommand.running -= 1
+        return pyvbcc.command.GenericCommandResult( self._command_line(), [], 0, started=started, walltime=time.time() - started )
+
+class TestExecutor( unittest.TestCase ):
+
+    def setUp( self ):
+        SleepCommand.running = dict()
+        SleepCommand.peak = dict()
+
+    def test_machine_from_positional( self ):
+        self.assertEqual( pyvbcc.command.GenericCommand( ["modifyvm", "vm1", "--cpus", "2"] ).machine(), "vm1" )
+        self.assertEqual( pyvbcc.command.GenericCommand( ["showvminfo", "--machinereadable", "--details", "vm2"] ).machine(), "vm2" )
+        self.assertEqual( pyvbcc.command.GenericCommand( ["guestproperty", "wait", "vm3", "/a"] ).machine(), "vm3" )
+        self.assertEqual( pyvbcc.command.GenericCommand( ["list", "vms"] ).machine(), None )
+
+    def test_machine_from_createvm( self ):
+        cmd = pyvbcc.vm.commands.CreateVmCommand( { pyvbcc.KEY_VM_NAME: "vm1", pyvbcc.KEY_VM_OSTYPE: "Linux_64", pyvbcc.KEY_GROUP_NAME: "g1" }, test=True )
+        self.assertEqual( cmd.machine(), "vm1" )
+
+    def test_global_limit( self ):
+        cmds = [ SleepCommand( ["modifyvm", "vm%s" % ( i ), "--cpus", "1"] ) for i in range( 20 ) ]
+        res = pyvbcc.executor.CommandExecutor( limit=4 ).run( cmds )
+        self.assertEqual( len( res ), 20 )
+        self.assertEqual( SleepCommand.peak[ "all" ], 4 )
+
+    def test_machine_limit( self ):
+        cmds = [ SleepCommand( ["modifyvm", "vm%s" % ( i % 2 ), "--cpus", "1"] ) for i in range( 10 ) ]
+        pyvbcc.executor.CommandExecutor( limit=8, vm_limit=1 ).run( cmds )
+        self.assertEqual( SleepCommand.peak[ "vm0" ], 1 )
+        self.assertEqual( SleepCommand.peak[ "vm1" ], 1 )
+        self.assertEqual( SleepCommand.peak[ "all" ], 2 )
+
+    def test_test_mode_arun( self ):
+        res = pyvbcc.executor.RunCommands( [ pyvbcc.vm.commands.ListVmsCommand( test=True ) ] )
+        self.assertEqual( res, [ dict() ] )
+
+    def test_error_classes( self ):
+        res = pyvbcc.command.GenericCommandResult( [], [], 1, [ "VBoxManage: error: Details: code VBOX_E_OBJECT_NOT_FOUND (0x80bb0001)" ] )
+        self.assertEqual( res.errorcode(), "VBOX_E_OBJECT_NOT_FOUND" )
+        self.assertFalse( res.contention() )
+        res = pyvbcc.command.GenericCommandResult( [], [], 1, [ "VBoxManage: error: Details: code VBOX_E_INVALID_OBJECT_STATE (0x80bb0007)" ] )
+        self.assertTrue( res.contention() )
+        self.assertFalse( pyvbcc.command.GenericCommandResult( [], [], 0, [ "VBOX_E_INVALID_OBJECT_STATE" ] ).contention() )
+
+    def test_retry_contention( self ):
+        executor = pyvbcc.executor.CommandExecutor( limit=2 )
+        cmds = [ BusyCommand( ["modifyvm", "vm1", "--cpus", "1"], 2 ), BusyCommand( ["modifyvm", "vm2", "--cpus", "1"], 10 ) ]
+        with mock.patch.object( pyvbcc.executor, "backoff", lambda attempt: 0.001 ):
+            res = executor.run( cmds )
+        self.assertTrue( res[0].ok() )
+        self.assertEqual( cmds[0].calls, 3 )
+        self.assertFalse( res[1].ok() )
+        self.assertEqual( cmds[1].calls, pyvbcc.executor.DEF_RETRIES + 1 )
+
+    def test_aimd( self ):
+        limiter = pyvbcc.executor.AdaptiveLimiter( 4 )
+        for i in range( 40 ):
+            limiter.update( "modifyvm", 0.1 )
+        self.assertGreater( limiter.limit(), 8 )
+        grown = limiter.limit()
+        limiter.update( "modifyvm", 0.1, contention=True )
+        self.assertEqual( limiter.limit(), grown // 2 )
+        ## the rest of the window saw the same congestion
+        limiter.update( "modifyvm", 1.0 )
+        self.assertEqual( limiter.limit(), grown // 2 )
+
+    def test_first_decrease( self ):
+        ## contention right at the start backs off at once, the window only holds off the next one
+        limiter = pyvbcc.executor.AdaptiveLimiter( 8 )
+        limiter.update( "modifyvm", 0.1, contention=True )
+        self.assertEqual( limiter.limit(), 4 )
+        limiter.update( "modifyvm", 0.1, contention=True )
+        self.assertEqual( limiter.limit(), 4 )
+
+    def test_baseline( self ):
+        ## an old minimum ages out, later latencies are measured against what VBoxSVC does now
+        limiter = pyvbcc.executor.AdaptiveLimiter( 4, window=0.05 )
+        limiter.update( "modifyvm", 0.0002 )
+        time.sleep( 0.1 )
+        for i in range( 40 ):
+            limiter.update( "modifyvm", 0.12 )
+        self.assertGreater( limiter.limit(), 8 )
+
+    def test_feedback_needs_process( self ):
+        ## cache hits and test runs return without a process, they must not set the baseline
+        executor = pyvbcc.executor.CommandExecutor()
+        updates = list()
+        with mock.patch.object( pyvbcc.executor.AdaptiveLimiter, "update", lambda self, *args, **kw: updates.append( args ) ):
+            executor.run( [ pyvbcc.vm.commands.ListVmsCommand( test=True ), CongestedCommand( ["modifyvm", "vm1", "--cpus", "1"] ) ] )
+        self.assertEqual( [ u[0] for u in updates ], [ "modifyvm" ] )
+        self.assertFalse( pyvbcc.command.GenericCommandResult( [], [], 1, [ "VBoxManage: error: Details: code E_ACCESSDENIED (0x80070005)" ] ).contention() )
+
+    def test_adaptive_executor( self ):
+        CongestedCommand.running = 0
+        CongestedCommand.peak = 0
+        executor = pyvbcc.executor.CommandExecutor()
+        self.assertTrue( executor.adaptive() )
+        executor.run( [ CongestedCommand( ["modifyvm", "vm%s" % ( i ), "--cpus", "1"] ) for i in range( 300 ) ] )
+        self.assertLessEqual( CongestedCommand.peak, 16 )
+        self.assertFalse( pyvbcc.executor.CommandExecutor( limit=4 ).adaptive() )
+
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
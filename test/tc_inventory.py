@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.emulator
+import pyvbcc.records
+import pyvbcc.vm.inventory
+
+UUIDS = [ "5d1c1a9e-2222-4c4c-8b8b-00000000000%s" % ( i ) for i in range( 4 ) ]
+
+class TestInventory( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        self._inv = pyvbcc.vm.inventory.VmInventory( test=True )
+
+        for i in range( 3 ):
+            rec = pyvbcc.records.VmRecord( "vm%s" % ( i ), UUIDS[ i ] )
+            rec.cfgfile = os.path.join( self._dir.name, "vm%s.vbox" % ( i ) )
+            rec.state = "running" if i == 0 else "poweroff"
+            rec.state_since = "2020-01-01T10:00:00.000000000"
+            with open( rec.cfgfile, "w" ) as fd:
+                fd.write( "<VirtualBox/>" )
+            self._inv.update( rec )
+
+        self._inv._running = set( [ pyvbcc.records.to_uuid( UUIDS[0] ) ] )
+        self._vms = { "vm0": UUIDS[0], "vm1": UUIDS[1], "vm2": UUIDS[2] }
+
+    def tearDown( self ):
+        self._dir.cleanup()
+
+    def test_unchanged( self ):
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] } ), [] )
+
+    def test_new_vm( self ):
+        self._vms[ "vm3" ] = UUIDS[3]
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] } ), [ UUIDS[3] ] )
+
+    def test_started_and_stopped( self ):
+        self.assertEqual( sorted( self._inv.changed( self._vms, { "vm1": UUIDS[1] } ) ), [ UUIDS[0], UUIDS[1] ] )
+
+    def test_renamed( self ):
+        del self._vms[ "vm2" ]
+        self._vms[ "vm2b" ] = UUIDS[2]
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] } ), [ UUIDS[2] ] )
+
+    def test_config_rewritten( self ):
+        with open( self._inv.get( "vm1" ).cfgfile, "w" ) as fd:
+            fd.write( "<VirtualBox version=\"1.16\"/>" )
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] } ), [ UUIDS[1] ] )
+
+    def test_state_change_time( self ):
+        self.assertEqual( self._inv.state_change_time( UUIDS[1] ), "2020-01-01T10:00:00.000000000" )
+
+    def test_paused( self ):
+        ## still in list runningvms, only the state change time tells
+        since = { UUIDS[0]: "2020-01-01T10:00:00.000000000" }
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] }, since ), [] )
+        since[ UUIDS[0] ] = "2020-01-01T10:05:00.000000000"
+        self.assertEqual( self._inv.changed( self._vms, { "vm0": UUIDS[0] }, since ), [ UUIDS[0] ] )
+
+    def test_refresh_pause( self ):
+        env = dict( os.environ )
+        opt = { pyvbcc.KEY_SYSTEM_COMMAND: "emulator" }
+        try:
+            os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( self._dir.name, "emulator.json" )
+            os.environ[ "PYVBCC_CACHE" ] = "off"
+            for argv in ( [ "createvm", "--name", "vm0", "--register" ], [ "createvm", "--name", "vm1", "--register" ], [ "startvm", "vm0" ] ):
+                self.assertEqual( pyvbcc.emulator.Emulator().run( argv ), 0 )
+            inv = pyvbcc.vm.inventory.VmInventory( **opt )
+            inv.load()
+            self.assertEqual( inv.refresh(), ( [], [] ) )
+
+            time.sleep( 0.01 )
+            self.assertEqual( pyvbcc.emulator.Emulator().run( [ "controlvm", "vm0", "pause" ] ), 0 )
+            self.assertEqual( inv.refresh(), ( [ "vm0" ], [] ) )
+            self.assertEqual( inv.get( "vm0" ).state, pyvbcc.records.VmState.PAUSED )
+        finally:
+            os.environ.clear()
+            os.environ.update( env )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
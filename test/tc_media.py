@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import unittest
+
+import pyvbcc
+import pyvbcc.disk
+import pyvbcc.disk.index
+import pyvbcc.disk.commands
+import pyvbcc.command
+
+BASE = "0b8a5c0e-1111-4c4c-8b8b-000000000001"
+DIFF = "0b8a5c0e-1111-4c4c-8b8b-000000000002"
+FREE = "0b8a5c0e-1111-4c4c-8b8b-000000000003"
+
+HDDS = [
+    "UUID:           %s" % ( BASE ),
+    "Parent UUID:    base",
+    "State:          created",
+    "Type:           multiattach",
+    "Location:       /tmp/vms/base.vdi",
+    "Storage format: VDI",
+    "Capacity:       8192 MBytes",
+    "Encryption:     disabled",
+    "In use by VMs:  vm1 (UUID: 5d1c1a9e-2222-4c4c-8b8b-000000000001), vm 2 (UUID: 5d1c1a9e-2222-4c4c-8b8b-000000000002)",
+    "",
+    "UUID:           %s" % ( DIFF ),
+    "Parent UUID:    %s" % ( BASE ),
+    "State:          created",
+    "Type:           normal (differencing)",
+    "Location:       /tmp/vms/vm1/Snapshots/{0b8a5c0e}.vdi",
+    "Storage format: VDI",
+    "Capacity:       8192 MBytes",
+    "Encryption:     disabled",
+    "In use by VMs:  vm1 (UUID: 5d1c1a9e-2222-4c4c-8b8b-000000000001) [s1 (UUID: 7e1c1a9e-2222-4c4c-8b8b-000000000001)]",
+    "",
+    "UUID:           %s" % ( FREE ),
+    "Parent UUID:    base",
+    "State:          created",
+    "Type:           normal (base)",
+    "Location:       /tmp/vms/free.vdi",
+    "Storage format: VDI",
+    "Capacity:       1 GBytes",
+    "Encryption:     disabled",
+    ""
+]
+
+class TestMediaIndex( unittest.TestCase ):
+
+    def setUp( self ):
+        records = pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).records( HDDS )
+        self._index = pyvbcc.disk.index.MediaIndex( test=True ).load( records )
+
+    def test_lookups( self ):
+        self.assertEqual( len( self._index ), 3 )
+        self.assertEqual( self._index.by_uuid( FREE ).capacity, 1024 ** 3 )
+        self.assertEqual( str( self._index.by_location( "/tmp/vms//free.vdi" ).uuid ), FREE )
+        self.assertEqual( str( self._index.get( "/tmp/vms/base.vdi" ).uuid ), BASE )
+
+    def test_shared_medium( self ):
+        self.assertEqual( [ v["name"] for v in self._index.by_uuid( BASE ).vms ], [ "vm1", "vm 2" ] )
+        self.assertEqual( sorted( str( r.uuid ) for r in self._index.by_vm( "vm1" ) ), [ BASE, DIFF ] )
+        self.assertEqual( [ str( r.uuid ) for r in self._index.by_vm( "vm 2" ) ], [ BASE ] )
+        self.assertEqual( [ str( r.uuid ) for r in self._index.by_vm( "5d1c1a9e-2222-4c4c-8b8b-000000000002" ) ], [ BASE ] )
+
+    def test_chain( self ):
+        self.assertEqual( [ str( r.uuid ) for r in self._index.children( BASE ) ], [ DIFF ] )
+        self.assertEqual( [ str( r.uuid ) for r in self._index.chain( DIFF ) ], [ BASE, DIFF ] )
+
+    def test_remove( self ):
+        self._index.remove( DIFF )
+        self.assertEqual( self._index.children( BASE ), [] )
+        self.assertEqual( [ str( r.uuid ) for r in self._index.by_vm( "vm1" ) ], [ BASE ] )
+
+    def test_attach_and_close( self ):
+        opt = { "test": True }
+        pyvbcc.disk.index._index = self._index
+        self._index._slots[ "vm1" ] = { "SATA-0-0": "/tmp/vms/base.vdi" }
+        try:
+            cfg = { pyvbcc.KEY_VM_NAME: "vm1", pyvbcc.KEY_CONTROLLER_NAME: "SATA", pyvbcc.KEY_DISKS_FILE: "/tmp/vms/base.vdi" }
+            self.assertEqual( pyvbcc.disk.AttachDisk( dict( cfg ), opt ), None )
+
+            ## same medium on another port is attached
+            self.assertNotEqual( pyvbcc.disk.AttachDisk( dict( cfg, **{ pyvbcc.KEY_DISKS_PORT: 1 } ), opt ), None )
+
+            cfg[ pyvbcc.KEY_DISKS_FILE ] = "/tmp/vms/free.vdi"
+            self.assertNotEqual( pyvbcc.disk.AttachDisk( dict( cfg ), opt ), None )
+            self.assertEqual( [ str( r.uuid ) for r in self._index.by_vm( "vm1" ) if str( r.uuid ) == FREE ], [ FREE ] )
+
+            self.assertRaises( RuntimeError, pyvbcc.disk.CloseDisk, { pyvbcc.KEY_DISKS_FILE: "/tmp/vms/base.vdi" }, opt )
+            self.assertEqual( pyvbcc.disk.CloseDisk( { pyvbcc.KEY_DISKS_FILE: "/tmp/vms/missing.vdi" }, opt ), None )
+            self.assertEqual( pyvbcc.disk.CheckClose( { pyvbcc.KEY_DISKS_FILE: "/tmp/vms/free.vdi" }, opt, [ "vm1" ] ).uuid, self._index.by_uuid( FREE ).uuid )
+        finally:
+            pyvbcc.disk.index._index = None
+
+    def test_failed_result( self ):
+        pyvbcc.disk.index._index = self._index
+        try:
+            cmd = pyvbcc.disk.commands.AttachDiskCommand( { pyvbcc.KEY_VM_NAME: "vm1", pyvbcc.KEY_CONTROLLER_NAME: "SATA", pyvbcc.KEY_DISKS_FILE: "/tmp/vms/free.vdi" }, test=True )
+            cmd.parse( pyvbcc.command.GenericCommandResult( [], "", 1, [ "VBOX_E_OBJECT_NOT_FOUND" ] ) )
+            self.assertEqual( self._index.by_uuid( FREE ).vms, [] )
+
+            cmd = pyvbcc.disk.commands.CloseDiskCommand( { pyvbcc.KEY_DISKS_FILE: "/tmp/vms/free.vdi" }, test=True )
+            cmd.parse( pyvbcc.command.GenericCommandResult( [], "", 1, [ "VBOX_E_OBJECT_IN_USE" ] ) )
+            self.assertNotEqual( self._index.by_uuid( FREE ), None )
+        finally:
+            pyvbcc.disk.index._index = None
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import asyncio
+import unittest
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.metrics
+
+SCRIPT = "import sys; print( 'line one' ); print( 'line two' ); sys.stderr.write( 'VBoxManage: error: Details: code VBOX_E_FILE_ERROR (0x80bb0004)\\n' ); sys.exit( 1 )"
+
+def python_command( script ):
+    ## runs the interpreter instead of VBoxManage, the real binary is not needed
+    cmd = pyvbcc.command.GenericCommand( [ "-c", script ] )
+    cmd._command = sys.executable
+    return cmd
+
+class TestMetrics( unittest.TestCase ):
+
+    def setUp( self ):
+        pyvbcc.metrics.Reset()
+
+    def _check( self, res ):
+        self.assertEqual( res.result(), [ "line one", "line two" ] )
+        self.assertEqual( res.exitcode(), 1 )
+        self.assertEqual( res.errorcode(), "VBOX_E_FILE_ERROR" )
+        self.assertEqual( res.bytes_out(), 18 )
+        self.assertGreater( res.bytes_err(), 0 )
+        self.assertGreater( res.walltime(), 0 )
+        self.assertLessEqual( res.started(), res.finished() )
+        self.assertEqual( res.command()[1:], [ "-c", SCRIPT ] )
+
+    def test_execute( self ):
+        self._check( python_command( SCRIPT ).execute() )
+
+    def test_aexecute( self ):
+        self._check( asyncio.run( python_command( SCRIPT ).aexecute() ) )
+
+    def test_registry( self ):
+        python_command( SCRIPT ).execute()
+        asyncio.run( python_command( SCRIPT ).aexecute() )
+        pyvbcc.command.GenericCommand( [ "list", "vms" ], test=True ).execute()
+
+        report = pyvbcc.metrics.Report()
+        self.assertEqual( list( report.keys() ), [ "-c" ] )
+        self.assertEqual( report[ "-c" ][ "count" ], 2 )
+        self.assertEqual( report[ "-c" ][ "errors" ], 2 )
+        self.assertEqual( report[ "-c" ][ "errorcodes" ], { "VBOX_E_FILE_ERROR": 2 } )
+        self.assertEqual( report[ "-c" ][ "bytes_out" ], 36 )
+        self.assertEqual( sum( pyvbcc.metrics.GetRegistry().histogram( "-c" ).values() ), 2 )
+
+    def test_histogram( self ):
+        hist = pyvbcc.metrics.Histogram()
+        for i in range( 1, 101 ):
+            hist.observe( i / 100.0 )
+        self.assertEqual( hist.count, 100 )
+        self.assertAlmostEqual( hist.mean(), 0.505 )
+        self.assertTrue( 0.5 <= hist.percentile( 50 ) <= 0.75 )
+        self.assertTrue( 0.9 <= hist.percentile( 90 ) <= 1.0 )
+        self.assertEqual( hist.percentile( 100 ), 1.0 )
+
+
+if __name__ == '__main__':
+    unittest.main()
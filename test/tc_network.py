@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import time
+import asyncio
+import unittest
+from unittest import mock
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.net
+import pyvbcc.net.commands
+
+NATNETS = [
+    "NetworkName:    nat1",
+    "IP:             10.0.2.1",
+    "Network:        10.0.2.0/24",
+    "Enabled:        Yes",
+    ""
+]
+
+async def slow_aexecute( self, **opt ):
+    ## each query takes 0.2s, bridgedifs fails and natnets lists one network
+    await asyncio.sleep( 0.2 )
+    if self._mode == "bridgedifs":
+        raise RuntimeError( "VBoxManage crashed" )
+    lines = NATNETS if self._mode == "natnets" else []
+    self._exitcode = 0
+    return pyvbcc.command.GenericCommandResult( self._command_line(), lines, 0 )
+
+class TestNetworkInfo( unittest.TestCase ):
+
+    def test_fan_out( self ):
+        with mock.patch.object( pyvbcc.net.commands.ListNetworkCommand, "aexecute", slow_aexecute ):
+            start = time.time()
+            nets, errors = pyvbcc.net.GetNetworks( { pyvbcc.KEY_NETWORK_NAME: "all" } )
+            elapsed = time.time() - start
+
+        self.assertLess( elapsed, 0.6 )
+        self.assertEqual( sorted( nets.keys() ), [ "hostonlyifs", "intnets", "natnets" ] )
+        self.assertEqual( nets[ "natnets" ][ "nat1" ].network, "10.0.2.0/24" )
+        self.assertEqual( list( errors.keys() ), [ "bridgedifs" ] )
+
+    def test_info_map( self ):
+        with mock.patch.object( pyvbcc.net.commands.ListNetworkCommand, "aexecute", slow_aexecute ):
+            data = pyvbcc.net.GetNetworkInfo( { pyvbcc.KEY_NETWORK_NAME: "all", pyvbcc.KEY_NETWORK_TYPE: "natnets" } )
+        self.assertEqual( data, { "natnets": { "nat1": {
+            "name": "nat1", "type": "natnets", "ip": "10.0.2.1", "netmask": None, "network": "10.0.2.0/24", "mac": None,
+            "dhcp": None, "enabled": True, "ipv6": None, "status": None, "properties": {} } } } )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
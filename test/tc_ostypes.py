@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.cache
+import pyvbcc.emulator
+import pyvbcc.info.commands
+import pyvbcc.vm.commands
+import pyvbcc.vm.ostypes
+
+CATALOGUE = {
+    "7_0": {
+        "Other": { "id": "Other", "description": "Other/Unknown", "family_id": "Other", "family_desc": "Other", "bits64": False, "properties": {} },
+        "RedHat_64": { "id": "RedHat_64", "description": "Red Hat (64-bit)", "family_id": "Linux", "family_desc": "Linux", "bits64": True, "properties": {} }
+    }
+}
+
+class TestOsTypeCatalogue( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        self._filename = os.path.join( self._dir.name, "ostypes.json" )
+        with open( self._filename, "w" ) as fd:
+            json.dump( CATALOGUE, fd )
+
+    def tearDown( self ):
+        pyvbcc.vm.ostypes.SetCatalogue( None )
+        self._dir.cleanup()
+
+    def _catalogue( self, version ):
+        cat = pyvbcc.vm.ostypes.OsTypeCatalogue( self._filename, test=True )
+        cat._version = version
+        return cat
+
+    def test_same_version_from_file( self ):
+        cat = self._catalogue( "7_0" )
+        self.assertEqual( sorted( cat.records().keys() ), [ "Other", "RedHat_64" ] )
+        self.assertEqual( cat.get( "RedHat_64" ).bits64, True )
+        self.assertTrue( "RedHat_64" in cat )
+        self.assertFalse( cat.known( "centos7" ) )
+
+    def test_other_version_asks_vboxmanage( self ):
+        cat = self._catalogue( "7_1" )
+        ## test mode lists nothing, an empty catalogue rejects nothing and is not written
+        self.assertEqual( cat.records(), {} )
+        self.assertTrue( cat.known( "centos7" ) )
+        with open( self._filename, "r" ) as fd:
+            self.assertEqual( list( json.load( fd ).keys() ), [ "7_0" ] )
+
+    def test_createvm_rejects_unknown( self ):
+        pyvbcc.vm.ostypes.SetCatalogue( self._catalogue( "7_0" ) )
+        cfg = { pyvbcc.KEY_VM_NAME: "vm1", pyvbcc.KEY_VM_OSTYPE: "centos7", pyvbcc.KEY_GROUP_NAME: "g1" }
+        ## building the command asks nothing, running it checks the os type first
+        cmd = pyvbcc.vm.commands.CreateVmCommand( cfg )
+        self.assertRaises( RuntimeError, cmd.run )
+        cfg[ pyvbcc.KEY_VM_OSTYPE ] = "RedHat_64"
+        cmd = pyvbcc.vm.commands.CreateVmCommand( cfg )
+        self.assertIsNone( cmd.check() )
+        self.assertEqual( cmd._command_line()[1], "createvm" )
+
+    def test_version_not_cached( self ):
+        env = dict( os.environ )
+        opt = { pyvbcc.KEY_SYSTEM_COMMAND: "emulator" }
+        try:
+            os.environ[ "PYVBCC_EMULATOR_STATE" ] = os.path.join( self._dir.name, "emulator.json" )
+            pyvbcc.cache.SetCache( pyvbcc.cache.CommandCache( os.path.join( self._dir.name, "cache.db" ) ) )
+            ## what list systemproperties said before an upgrade
+            key = pyvbcc.info.commands.ListSystemPropertiesCommand( **opt )._cache_key()
+            pyvbcc.cache.GetCache().put( key, [ "API version:                     6_1" ], 3600, [ "system" ] )
+            self.assertEqual( pyvbcc.vm.ostypes.OsTypeCatalogue( None, **opt ).version(), pyvbcc.emulator.API_VERSION )
+        finally:
+            pyvbcc.cache.SetCache( None )
+            os.environ.clear()
+            os.environ.update( env )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import uuid
+import unittest
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.records
+import pyvbcc.info.commands
+import pyvbcc.vm.commands
+import pyvbcc.disk.commands
+import pyvbcc.net.commands
+import pyvbcc.vm.machinereadable
+import pyvbcc.vm.longformat
+
+import bench.corpus
+
+HDDS = [
+    "UUID:           0b8a5c0e-1111-4c4c-8b8b-000000000001",
+    "Parent UUID:    base",
+    "State:          created",
+    "Type:           normal (base)",
+    "Location:       /tmp/vms/vm1/vm1d1.vdi",
+    "Storage format: VDI",
+    "Capacity:       8192 MBytes",
+    "Encryption:     disabled",
+    "In use by VMs:  vm1 (UUID: 5d1c1a9e-2222-4c4c-8b8b-000000000001)",
+    "",
+    "UUID:           0b8a5c0e-1111-4c4c-8b8b-000000000002",
+    "Parent UUID:    base",
+    "State:          created",
+    "Type:           normal (base)",
+    "Location:       /tmp/vms/vm2/vm2d1.vdi",
+    "Storage format: VDI",
+    "Capacity:       2048 MBytes",
+    "Encryption:     disabled",
+    ""
+]
+
+OSTYPES = [
+    "ID:          Other",
+    "Description: Other/Unknown",
+    "Family ID:   Other",
+    "Family Desc: Other",
+    "64 bit:      false",
+    "",
+    "ID:          RedHat_64",
+    "Description: Red Hat (64-bit)",
+    "Family ID:   Linux",
+    "Family Desc: Linux",
+    "64 bit:      true",
+    ""
+]
+
+NATNETS = [
+    "NetworkName:    nat1",
+    "IP:             10.0.2.1",
+    "Network:        10.0.2.0/24",
+    "IPv6 Enabled:   No",
+    "Enabled:        Yes",
+    "",
+    "NetworkName:    nat2",
+    "IP:             10.0.3.1",
+    "Network:        10.0.3.0/24",
+    "IPv6 Enabled:   No",
+    "Enabled:        Yes",
+    ""
+]
+
+SHOWVMINFO = [
+    "name=\"vm1\"",
+    "groups=\"/g1,/g2\"",
+    "ostype=\"Red Hat (64-bit)\"",
+    "UUID=\"5d1c1a9e-2222-4c4c-8b8b-000000000001\"",
+    "CfgFile=\"/tmp/vms/g1/vm1/vm1.vbox\"",
+    "memory=1024",
+    "cpus=2",
+    "VMState=\"poweroff\"",
+    "VMStateChangeTime=\"2020-01-01T10:00:00.000000000\"",
+    "description=\"key=value \\\"quoted\\\"",
+    "second line\"",
+    "storagecontrollername0=\"SATA\"",
+    "storagecontrollertype0=\"IntelAhci\"",
+    "\"SATA-0-0\"=\"/tmp/vms/g1/vm1/vm1d1.vdi\"",
+    "\"SATA-ImageUUID-0-0\"=\"0b8a5c0e-1111-4c4c-8b8b-000000000001\"",
+    "\"SATA-1-0\"=\"none\"",
+    "nic1=\"nat\"",
+    "macaddress1=\"080027000001\"",
+    "Forwarding(0)=\"ssh,tcp,,2222,,22\"",
+    "nic2=\"hostonly\"",
+    "hostonlyadapter2=\"vboxnet0\"",
+    "GuestProperty=\"/a=b\""
+]
+
+LISTVMSLONG = [
+    "Name:                        vm1",
+    "Groups:                      /g1",
+    "Guest OS:                    Red Hat (64-bit)",
+    "UUID:                        5d1c1a9e-2222-4c4c-8b8b-000000000001",
+    "Config file:                 /tmp/vms/g1/vm1/vm1.vbox",
+    "Memory size                  1024MB",
+    "Number of CPUs:              2",
+    "State:                       running (since 2020-01-01T10:00:00.000000000)",
+    "Storage Controller Name (0):            SATA",
+    "Storage Controller Type (0):            IntelAhci",
+    "SATA (0, 0): /tmp/vms/g1/vm1/vm1d1.vdi (UUID: 0b8a5c0e-1111-4c4c-8b8b-000000000001)",
+    "SATA (1, 0): Empty",
+    "NIC 1:                       MAC: 080027000001, Attachment: NAT Network 'nat1', Cable connected: on, Trace: off (file: none), Type: 82540EM",
+    "NIC 1 Rule(0):   name = ssh, protocol = tcp, host ip = , host port = 2222, guest ip = , guest port = 22",
+    "NIC 2:                       disabled",
+    "",
+    "Snapshots:",
+    "",
+    "Name: base (UUID: 7e1c1a9e-2222-4c4c-8b8b-000000000001) *",
+    "",
+    "Name:                        vm2",
+    "Encryption:                  disabled",
+    "Groups:                      /g1,/g2",
+    "UUID:                        5d1c1a9e-2222-4c4c-8b8b-000000000002",
+    "Memory size:                 512MB",
+    "Number of CPUs:              1",
+    "State:                       powered off (since 2020-01-02T10:00:00.000000000)",
+    ""
+]
+
+class CountingLines( object ):
+    """
+        Line source that remembers how far the parser has read.
+    """
+    def __init__( self, lines ):
+        self.lines = lines
+        self.read = 0
+
+    def __iter__( self ):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+class TestParsers( unittest.TestCase ):
+
+    def test_disks_all( self ):
+        data = dict( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).records( HDDS ) )
+        self.assertEqual( len( data ), 2 )
+        self.assertEqual( data["0b8a5c0e-1111-4c4c-8b8b-000000000001"].vms[0]["name"], "vm1" )
+        self.assertEqual( data["0b8a5c0e-1111-4c4c-8b8b-000000000002"].capacity, 2048 * 1024 * 1024 )
+        self.assertEqual( data["0b8a5c0e-1111-4c4c-8b8b-000000000002"].parent, None )
+        self.assertEqual( data["0b8a5c0e-1111-4c4c-8b8b-000000000002"].uuid, uuid.UUID( "0b8a5c0e-1111-4c4c-8b8b-000000000002" ) )
+
+    def test_disks_by_vm( self ):
+        data = [ x[1] for x in pyvbcc.disk.commands.ListDiskCommand( "vm1", test=True ).records( HDDS ) ]
+        self.assertEqual( len( data ), 1 )
+        self.assertEqual( data[0].location, "/tmp/vms/vm1/vm1d1.vdi" )
+        self.assertEqual( data[0].format, "VDI" )
+
+    def test_disk_records_stream( self ):
+        lines = CountingLines( HDDS )
+        first = next( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).records( lines ) )
+        self.assertEqual( first[0], "0b8a5c0e-1111-4c4c-8b8b-000000000001" )
+        self.assertEqual( lines.read, 10 )
+
+    def test_ostypes( self ):
+        data = dict( pyvbcc.vm.commands.ListOsTypesCommand( test=True ).records( OSTYPES ) )
+        self.assertEqual( list( data.keys() ), ["Other", "RedHat_64"] )
+        self.assertEqual( data["RedHat_64"].family_id, "Linux" )
+        self.assertEqual( data["RedHat_64"].bits64, True )
+        self.assertEqual( data["Other"].bits64, False )
+
+    def test_ostypes_filter( self ):
+        opt = { pyvbcc.KEY_VM_OSTYPE: "RedHat_64", "test": True }
+        data = dict( pyvbcc.vm.commands.ListOsTypesCommand( **opt ).records( OSTYPES ) )
+        self.assertEqual( list( data.keys() ), ["RedHat_64"] )
+
+    def test_natnets( self ):
+        data = dict( pyvbcc.net.commands.ListNetworkCommand( "natnets", "all", test=True ).records( NATNETS ) )
+        self.assertEqual( sorted( data.keys() ), ["nat1", "nat2"] )
+        self.assertEqual( data["nat2"].network, "10.0.3.0/24" )
+        self.assertEqual( data["nat2"].enabled, True )
+        self.assertEqual( data["nat2"].ipv6, False )
+        self.assertEqual( data["nat2"].type, "natnets" )
+
+    def test_vms( self ):
+        lines = [ "\"vm1\" {5d1c1a9e-2222-4c4c-8b8b-000000000001}", "\"<inaccessible>\" {5d1c1a9e-2222-4c4c-8b8b-000000000002}" ]
+        data = dict( pyvbcc.vm.commands.ListVmsCommand( test=True ).records( lines ) )
+        self.assertEqual( data, { "vm1": "5d1c1a9e-2222-4c4c-8b8b-000000000001" } )
+
+    def test_properties_keep_colons( self ):
+        lines = [ "API version:                     6_1", "Default machine folder:          C:\\Users\\vbox" ]
+        data = dict( pyvbcc.info.commands.ListSystemPropertiesCommand( test=True ).records( lines ) )
+        self.assertEqual( data["apiversion"], "6_1" )
+        self.assertEqual( data["defaultmachinefolder"], "C:\\Users\\vbox" )
+
+    def test_machinereadable( self ):
+        rec = pyvbcc.vm.machinereadable.parse( SHOWVMINFO )
+        self.assertEqual( rec.name, "vm1" )
+        self.assertEqual( rec.memory, 1024 )
+        self.assertEqual( rec.cpus, 2 )
+        self.assertEqual( rec.groups, ["/g1", "/g2"] )
+        self.assertEqual( rec.description, "key=value \"quoted\"\nsecond line" )
+        self.assertEqual( rec.storage["SATA-0-0"]["medium"], "/tmp/vms/g1/vm1/vm1d1.vdi" )
+        self.assertEqual( rec.storage["SATA-0-0"]["uuid"], uuid.UUID( "0b8a5c0e-1111-4c4c-8b8b-000000000001" ) )
+        self.assertEqual( rec.storage["SATA-1-0"]["port"], 1 )
+        self.assertEqual( rec.state, pyvbcc.records.VmState.POWEROFF )
+        self.assertEqual( rec.nics[1]["macaddress"], "080027000001" )
+        self.assertEqual( rec.nics[2]["hostonlyadapter"], "vboxnet0" )
+        self.assertEqual( rec.forwarding, [ { "name": "ssh", "protocol": "tcp", "hostip": "", "hostport": "2222", "guestip": "", "guestport": "22", "nic": 1 } ] )
+        self.assertEqual( rec.properties["GuestProperty"], "/a=b" )
+
+    def test_list_vms_long( self ):
+        data = pyvbcc.vm.longformat.parse( LISTVMSLONG )
+        self.assertEqual( sorted( data.keys() ), ["vm1", "vm2"] )
+        vm1 = data["vm1"]
+        self.assertEqual( vm1.uuid, uuid.UUID( "5d1c1a9e-2222-4c4c-8b8b-000000000001" ) )
+        self.assertEqual( vm1.memory, 1024 )
+        self.assertEqual( vm1.cpus, 2 )
+        self.assertEqual( vm1.state, "running" )
+        self.assertEqual( vm1.state_since, "2020-01-01T10:00:00.000000000" )
+        self.assertEqual( vm1.storage["SATA-0-0"]["uuid"], uuid.UUID( "0b8a5c0e-1111-4c4c-8b8b-000000000001" ) )
+        self.assertEqual( vm1.storage["SATA-1-0"]["medium"], "emptydrive" )
+        self.assertEqual( vm1.nics[1]["nic"], "natnetwork" )
+        self.assertEqual( vm1.nics[1]["nat-network"], "nat1" )
+        self.assertEqual( vm1.nics[2]["nic"], "none" )
+        self.assertEqual( vm1.forwarding[0]["hostport"], "2222" )
+        self.assertEqual( data["vm2"].groups, ["/g1", "/g2"] )
+        self.assertEqual( data["vm2"].memory, 512 )
+        self.assertEqual( data["vm2"].state, "poweroff" )
+
+    def test_to_dict( self ):
+        data = pyvbcc.records.to_dict( dict( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).records( HDDS ) ) )
+        disk = data["0b8a5c0e-1111-4c4c-8b8b-000000000001"]
+        self.assertEqual( disk["uuid"], "0b8a5c0e-1111-4c4c-8b8b-000000000001" )
+        self.assertEqual( disk["vms"], [ { "name": "vm1", "uuid": "5d1c1a9e-2222-4c4c-8b8b-000000000001" } ] )
+        self.assertEqual( pyvbcc.vm.longformat.parse( LISTVMSLONG )["vm2"].to_dict()["state"], "poweroff" )
+
+    def test_corpus( self ):
+        ## the benchmark corpus has to parse completely, or bench_parsers measures the wrong work
+        c = bench.corpus.Corpus()
+        vms = pyvbcc.vm.longformat.parse( c.vms_long( 10 ) )
+        self.assertEqual( len( vms ), 10 )
+        self.assertEqual( str( vms[ "vm00003" ].uuid ), dict( pyvbcc.vm.commands.ListVmsCommand( test=True ).records( c.vms( 10 ) ) )[ "vm00003" ] )
+        self.assertEqual( len( vms[ "vm00003" ].storage ), 2 )
+
+        disks = dict( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).records( c.hdds( 50, 10 ) ) )
+        self.assertEqual( len( disks ), 50 )
+        self.assertEqual( sum( 1 for d in disks.values() if d.parent is not None ), 10 )
+        self.assertEqual( [ len( d.vms ) for d in disks.values() ], [ 1 ] * 50 )
+
+        for mode, lines in c.networks( 8 ).items():
+            self.assertEqual( len( dict( pyvbcc.net.commands.ListNetworkCommand( mode, "all", test=True ).records( lines ) ) ), 2 )
+        self.assertEqual( len( dict( pyvbcc.vm.commands.ListOsTypesCommand( test=True ).records( c.ostypes( 100 ) ) ) ), 100 )
+
+    def test_test_mode_stream( self ):
+        self.assertEqual( list( pyvbcc.disk.commands.ListDiskCommand( "all", test=True ).iterate() ), [] )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
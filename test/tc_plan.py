@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import time
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.executor
+import pyvbcc.plan
+import pyvbcc.vbm
+
+from helpers import environment
+
+async def slow_aexecute( self, **opt ):
+    await asyncio.sleep( 0.02 )
+    self._exitcode = 0
+    return pyvbcc.command.GenericCommandResult( self._command_line(), [], 0 )
+
+class FailingCommand( pyvbcc.command.GenericCommand ):
+    async def aexecute( self, **opt ):
+        return pyvbcc.command.GenericCommandResult( self._command_line(), [], 1 )
+
+class TestPlan( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown( self ):
+        self._dir.cleanup()
+
+    def _env( self, data ):
+        filename = os.path.join( self._dir.name, "env.json" )
+        with open( filename, "w" ) as fd:
+            json.dump( data, fd )
+        return pyvbcc.vbm.VbEnvironment( "create", filename, test=True )
+
+    def test_order_and_depth( self ):
+        plan = pyvbcc.plan.Plan()
+        plan.add( "c", None, [ "b" ] )
+        plan.add( "b", None, [ "a" ] )
+        plan.add( "a", None )
+        plan.add( "d", None, [ "a" ] )
+        self.assertEqual( plan.order(), [ "a", "b", "d", "c" ] )
+        self.assertEqual( plan.depth(), 3 )
+
+    def test_cycle_and_unknown( self ):
+        plan = pyvbcc.plan.Plan()
+        plan.add( "a", None, [ "b" ] )
+        plan.add( "b", None, [ "a" ] )
+        self.assertRaises( RuntimeError, plan.order )
+        plan = pyvbcc.plan.Plan()
+        plan.add( "a", None, [ "x" ] )
+        self.assertRaises( RuntimeError, plan.order )
+
+    def test_mistyped_dependency( self ):
+        ## a node key built wrong is an error, not a dependency quietly dropped
+        env = self._env( environment( 1 ) )
+        with mock.patch.object( env, "_controller", return_value="vm:vm0:storagectl:typo" ):
+            self.assertRaises( RuntimeError, env.plan )
+
+    def test_failure_skips_dependants( self ):
+        plan = pyvbcc.plan.Plan( test=True )
+        plan.add( "vm", FailingCommand( [ "createvm", "--name", "vm1" ] ) )
+        plan.add( "modify", pyvbcc.command.GenericCommand( [ "modifyvm", "vm1" ], test=True ), [ "vm" ] )
+        plan.add( "other", pyvbcc.command.GenericCommand( [ "modifyvm", "vm2" ], test=True ) )
+        self.assertEqual( plan.run(), { "vm": "failed", "modify": "skipped", "other": "done" } )
+
+    def test_sample_environment( self ):
+        env = self._env( environment( 1 ) )
+        plan = env.plan()
+        self.assertEqual( plan.node( "vm:vm0:nic1" ).deps, [ "vm:vm0", "net:nat1" ] )
+        self.assertEqual( plan.node( "vm:vm0:attach:vm0d1" ).deps, [ "vm:vm0:storagectl:SATA", "vm:vm0:disk:vm0d1" ] )
+        cmd = plan.node( "vm:vm0:disk:vm0d1" ).cmd._command_line()
+        self.assertEqual( cmd[ cmd.index( "--size" ) + 1 ], "2048" )
+        self.assertEqual( cmd[ cmd.index( "--filename" ) + 1 ], "/tmp/vms/bench/vm0/vm0d1.vdi" )
+        cmd = plan.node( "vm:vm0" ).cmd._command_line()
+        self.assertEqual( cmd[ cmd.index( "--ostype" ) + 1 ], "RedHat_64" )
+        cmd = plan.node( "vm:vm0:nic1" ).cmd._command_line()
+        self.assertEqual( cmd[ 1:3 ], [ "modifyvm", "vm0" ] )
+        self.assertEqual( cmd[ 7: ], [ "--nic1", "natnetwork", "--nat-network1", "nat1", "--nic2", "hostonly", "--hostonlyadapter2", "vboxnet0", "--macaddress2", "080027000000" ] )
+        self.assertEqual( plan.saved(), 2 )
+        self.assertTrue( all( s == "done" for s in plan.run().values() ) )
+
+    def test_coalesce( self ):
+        data = environment( 1 )
+        data[ "hosts" ][0][ "nics" ] = [ { "type": "intnet", "network": "int%s" % ( i ) } for i in range( 4 ) ]
+        env = self._env( data )
+        plan = env.plan()
+        merged = [ n for n in plan.nodes() if n.cmd._command_line()[1] == "modifyvm" ]
+        self.assertEqual( len( merged ), 1 )
+        self.assertEqual( plan.saved(), 4 )
+        self.assertEqual( plan.merged()[ "vm:vm0:nic4" ], "modifyvm:vm0" )
+        self.assertEqual( merged[0].cmd._command_line().count( "--intnet4" ), 1 )
+        self.assertEqual( merged[0].cmd._command_line()[3:7], [ "--cpus", "1", "--memory", "1024" ] )
+
+    def test_coalesce_conflict( self ):
+        plan = pyvbcc.plan.Plan( test=True )
+        plan.add( "a", pyvbcc.command.GenericCommand( [ "modifyvm", "vm1", "--cpus", "1" ], test=True ) )
+        plan.add( "b", pyvbcc.command.GenericCommand( [ "modifyvm", "vm1", "--cpus", "2" ], test=True ) )
+        self.assertRaises( RuntimeError, plan.coalesce )
+
+    def test_coalesce_keeps_order( self ):
+        ## b waits on a storagectl that waits on a, merging a and b would be a cycle
+        plan = pyvbcc.plan.Plan( test=True )
+        plan.add( "a", pyvbcc.command.GenericCommand( [ "modifyvm", "vm1", "--cpus", "1" ], test=True ) )
+        plan.add( "ctl", pyvbcc.command.GenericCommand( [ "storagectl", "vm1" ], test=True ), [ "a" ] )
+        plan.add( "b", pyvbcc.command.GenericCommand( [ "modifyvm", "vm1", "--memory", "512" ], test=True ), [ "ctl" ] )
+        plan.add( "c", pyvbcc.command.GenericCommand( [ "modifyvm", "vm2", "--memory", "512" ], test=True ) )
+        self.assertEqual( plan.coalesce(), 0 )
+        self.assertEqual( len( plan ), 4 )
+
+    def test_parallel_build( self ):
+        ## 20 hosts take about as long as one host's chain, not 20 of them
+        plan = self._env( environment( 20 ) ).plan()
+        per_vm = len( [ n for n in plan.nodes() if n.cmd.machine() == "vm0" ] )
+
+        with mock.patch.object( pyvbcc.command.GenericCommand, "aexecute", slow_aexecute ):
+            start = time.time()
+            plan.run( pyvbcc.executor.CommandExecutor( limit=64 ) )
+            elapsed = time.time() - start
+
+        self.assertTrue( plan.ok() )
+        self.assertLess( elapsed, 0.02 * per_vm * 4 )
+        self.assertLess( elapsed, 0.02 * len( plan ) / 4 )
+
+    def test_template( self ):
+        data = environment( 2 )
+        data[ "templates" ] = [ { "name": "centos", "vm": "centos-golden", "type": "centos7" } ]
+        for host in data[ "hosts" ]:
+            host[ "template" ] = "centos"
+            del host[ "type" ]
+        plan = self._env( data ).plan()
+
+        cmd = plan.node( "template:centos" ).cmd._command_line()
+        self.assertEqual( cmd[ 1:5 ], [ "snapshot", "centos-golden", "take", pyvbcc.vbm.DEF_TEMPLATE_SNAPSHOT ] )
+        node = plan.node( "vm:vm1" )
+        self.assertEqual( node.deps, [ "template:centos" ] )
+        self.assertEqual( node.cmd._command_line()[ 1:7 ], [ "clonevm", "centos-golden", "--snapshot", pyvbcc.vbm.DEF_TEMPLATE_SNAPSHOT, "--options", "link" ] )
+        self.assertEqual( node.cmd.machine(), "centos-golden" )
+        self.assertIn( "vm:vm1:storagectl:SATA-pyvbcc", plan )
+        self.assertEqual( self._env( data ).host_type( data[ "hosts" ][0] ), "RedHat_64" )
+
+        data[ "hosts" ][0][ "iso" ] = "/tmp/centos.iso"
+        self.assertRaises( AttributeError, self._env( data ).plan )
+        data[ "hosts" ][0][ "template" ] = "nope"
+        self.assertRaises( AttributeError, self._env( data ).plan )
+
+    def test_sizes_and_macs( self ):
+        self.assertEqual( pyvbcc.vbm.size_mb( "8G" ), "8192" )
+        self.assertEqual( pyvbcc.vbm.size_mb( "512" ), "512" )
+        self.assertEqual( pyvbcc.vbm.mac_address( "08-00-27-aa-bb-cc" ), "080027AABBCC" )
+        self.assertRaises( AttributeError, pyvbcc.vbm.mac_address, "11:22:33:44:55" )
+
+if __name__ == "__main__":
+    unittest.main( verbosity=2 )
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import fcntl
+import unittest
+
+import pyvbcc
+import pyvbcc.plan
+import pyvbcc.vbm
+import pyvbcc.vm.pool
+
+from helpers import EmulatorTestCase
+
+class TestPool( EmulatorTestCase ):
+
+    def setUp( self ):
+        super().setUp()
+        os.environ[ "PYVBCC_POOL_LOCKS" ] = os.path.join( self._dir.name, "locks" )
+
+        self._run( "createvm", "--name", "golden", "--groups", "/templates", "--ostype", "RedHat_64", "--register" )
+        self._run( "storagectl", "golden", "--name", "SATA", "--add", "sata", "--portcount", "1" )
+        self._run( "createmedium", "disk", "--filename", os.path.join( self._dir.name, "golden.vdi" ), "--size", "8192", "--format", "VDI" )
+        self._run( "storageattach", "golden", "--storagectl", "SATA", "--port", "0", "--device", "0", "--type", "hdd", "--medium", os.path.join( self._dir.name, "golden.vdi" ) )
+        self._run( "snapshot", "golden", "take", "base" )
+
+    def _pooled( self, hosts ):
+        return pyvbcc.vbm.VbEnvironment( "create", self._environment( {
+            "templates": [ { "name": "centos", "vm": "golden", "snapshot": "base", "pool": 2 } ],
+            "hosts": [ { "name": "vm%s" % ( i ), "template": "centos", "mem": "512" } for i in range( hosts ) ]
+        } ) )
+
+    def test_fill( self ):
+        pool = pyvbcc.vm.pool.VmPool( "centos", "golden", "base", 3, **self._opt )
+        self.assertEqual( pool.group(), "/pyvbcc-pool/centos" )
+        created = pool.fill()
+        self.assertEqual( len( created ), 3 )
+        self.assertEqual( pool.members(), sorted( created ) )
+        self.assertEqual( pool.fill(), [] )
+
+        ## a fill already running for the template makes the second one give up
+        with open( os.path.join( self._dir.name, "locks", "pool-centos.lock" ), "a+" ) as lock:
+            fcntl.flock( lock, fcntl.LOCK_EX )
+            self._run( "unregistervm", created[0], "--delete" )
+            self.assertEqual( pool.fill(), [] )
+        self.assertEqual( len( pool.fill() ), 1 )
+
+    def test_template_snapshot( self ):
+        ## golden has the snapshot already, a fresh state store does not take it again
+        plan = self._pooled( 1 ).plan()
+        self.assertNotIn( "template:centos", plan )
+        self.assertEqual( plan.node( "vm:vm0" ).deps, [] )
+
+        self._run( "snapshot", "golden", "delete", "base" )
+        plan = self._pooled( 1 ).plan()
+        self.assertEqual( plan.node( "template:centos" ).cmd._command_line()[1:5], [ "snapshot", "golden", "take", "base" ] )
+
+    def test_reserve( self ):
+        pool = pyvbcc.vm.pool.VmPool( "centos", "golden", "base", 2, **self._opt )
+        names = sorted( pool.fill() )
+
+        ## a concurrent create gets the other member, then none
+        first = self._pooled( 1 )
+        second = self._pooled( 1 )
+        self.assertEqual( first.plan().node( "vm:vm0" ).cmd._command_line()[2], names[0] )
+        self.assertEqual( second.plan().node( "vm:vm0" ).cmd._command_line()[2], names[1] )
+        self.assertEqual( pyvbcc.vm.pool.VmPool( "centos", "golden", "base", 2, **self._opt ).reserve(), None )
+
+        first.release()
+        self.assertEqual( pool.reserve(), names[0] )
+        pool.release()
+        second.release()
+
+    def test_claim( self ):
+        env = self._pooled( 3 )
+        members = env.pool( env.template( "centos" ) )
+        members.fill()
+        names = members.members()
+
+        ## two hosts get the two members, the third one is cloned
+        plan = env.plan()
+        self.assertEqual( plan.node( "vm:vm0" ).cmd._command_line()[1:], [ "modifyvm", names[0], "--name", "vm0", "--groups", "/emu" ] )
+        self.assertEqual( plan.node( "vm:vm1" ).cmd._command_line()[2], names[1] )
+        self.assertEqual( plan.node( "vm:vm2" ).cmd._command_line()[1], "clonevm" )
+        plan.run()
+        self.assertTrue( plan.ok() )
+
+        vms = pyvbcc.vm.commands.ListVmsLongCommand( **self._opt ).run()
+        for name in ( "vm0", "vm1", "vm2" ):
+            self.assertEqual( ( vms[ name ].groups, vms[ name ].memory ), ( [ "/emu" ], 512 ) )
+        self.assertEqual( members.members(), [] )
+
+        env.release()
+        self.assertEqual( os.listdir( os.path.join( self._dir.name, "locks" ) ), [ "pool-centos.lock" ] )
+
+        ## the hosts exist in the group, a resumed create neither claims nor clones them again
+        members.fill()
+        plan = env.plan()
+        self.assertNotIn( "vm:vm0", plan )
+        self.assertNotIn( "vm:vm2", plan )
+        self.assertEqual( len( members.members() ), 2 )
+        env.release()
+
+        for proc in env.refill():
+            self.assertEqual( proc.wait( 60 ), 0 )
+        self.assertEqual( len( members.members() ), 2 )
+
+
+if __name__ == "__main__":
+    unittest.main()
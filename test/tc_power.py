@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import unittest
+
+import pyvbcc
+import pyvbcc.emulator
+import pyvbcc.state
+import pyvbcc.vm.power
+
+from helpers import EmulatorTestCase
+
+class TestPower( EmulatorTestCase ):
+
+    def setUp( self ):
+        super().setUp()
+        os.environ[ "PYVBCC_EMULATOR_BOOT" ] = "0.5"
+
+        for name, group in ( ( "vm0", "/g1" ), ( "vm1", "/g1" ), ( "vm2", "/g1/sub" ), ( "vm3", "/g2" ) ):
+            self._run( "createvm", "--name", name, "--groups", group, "--register" )
+
+    def _states( self ):
+        emulator = pyvbcc.emulator.Emulator()
+        emulator.run( [ "list", "runningvms" ] )
+        return sorted( re.match( r'"(.+)"', line ).group(1) for line in emulator.out )
+
+    def test_group_path( self ):
+        self.assertEqual( pyvbcc.vm.power.group_path( "g1" ), "/g1" )
+        self.assertEqual( pyvbcc.vm.power.group_path( "/g1/" ), "/g1" )
+
+    def test_start_group( self ):
+        store = pyvbcc.state.GetStateStore()
+        store.put_vm( "vm0", state="poweroff" )
+        store.close()
+
+        power = pyvbcc.vm.power.GroupPower( "g1", **self._opt )
+        self.assertEqual( sorted( power.members() ), [ "vm0", "vm1", "vm2" ] )
+
+        res = power.start()
+        self.assertEqual( sorted( res ), [ "vm0", "vm1", "vm2" ] )
+        for name, r in res.items():
+            self.assertEqual( r[ "state" ], pyvbcc.vm.power.STATE_READY )
+            self.assertGreaterEqual( r[ "ready" ], 0.5 )
+            self.assertLessEqual( r[ "start" ], r[ "ready" ] )
+            self.assertTrue( r[ "ip" ].startswith( "10.0." ) )
+        self.assertEqual( self._states(), [ "vm0", "vm1", "vm2" ] )
+        self.assertEqual( pyvbcc.state.GetStateStore().vm( "vm0" )[ "state" ], "running" )
+
+        ## running VMs are not started again, only waited for
+        res = pyvbcc.vm.power.GroupPower( "g1", **self._opt ).start( [ "vm1" ] )
+        self.assertEqual( res[ "vm1" ][ "state" ], pyvbcc.vm.power.STATE_READY )
+
+    def test_timeout( self ):
+        os.environ[ "PYVBCC_EMULATOR_BOOT" ] = "30"
+        opt = dict( self._opt, **{ pyvbcc.KEY_SYSTEM_TIMEOUT: "0.5" } )
+        res = pyvbcc.vm.power.GroupPower( "g2", **opt ).start()
+        self.assertEqual( res[ "vm3" ][ "state" ], pyvbcc.vm.power.STATE_TIMEOUT )
+        self.assertIsNone( res[ "vm3" ][ "ready" ] )
+
+    def _start( self, *names ):
+        for name in names:
+            self._run( "startvm", name, "--type", "headless" )
+
+    def test_stop_group( self ):
+        os.environ[ "PYVBCC_EMULATOR_SHUTDOWN" ] = "0.3"
+        self._start( "vm0", "vm1", "vm3" )
+        store = pyvbcc.state.GetStateStore()
+        store.put_vm( "vm0", state="running" )
+        store.close()
+
+        power = pyvbcc.vm.power.GroupPower( "g1", **self._opt )
+        power._poll = 0.1
+        res = power.stop()
+        self.assertEqual( sorted( res ), [ "vm0", "vm1", "vm2" ] )
+        for name in ( "vm0", "vm1" ):
+            self.assertEqual( res[ name ][ "state" ], pyvbcc.vm.power.STATE_STOPPED )
+            self.assertEqual( res[ name ][ "method" ], "acpi" )
+            self.assertGreaterEqual( res[ name ][ "stop" ], 0.3 )
+        ## vm2 was not running
+        self.assertIsNone( res[ "vm2" ][ "method" ] )
+        self.assertEqual( self._states(), [ "vm3" ] )
+        self.assertEqual( pyvbcc.state.GetStateStore().vm( "vm0" )[ "state" ], "poweroff" )
+
+    def test_stop_escalation( self ):
+        os.environ[ "PYVBCC_EMULATOR_SHUTDOWN" ] = "0.3"
+        os.environ[ "PYVBCC_EMULATOR_ACPI_IGNORE" ] = "vm1"
+        self._start( "vm0", "vm1" )
+
+        opt = dict( self._opt, **{ pyvbcc.KEY_SYSTEM_TIMEOUT: "1" } )
+        power = pyvbcc.vm.power.GroupPower( "g1", **opt )
+        power._poll = 0.1
+        res = power.stop()
+        self.assertEqual( res[ "vm0" ][ "state" ], pyvbcc.vm.power.STATE_STOPPED )
+        self.assertLess( res[ "vm0" ][ "stop" ], 1 )
+        self.assertEqual( res[ "vm1" ][ "state" ], pyvbcc.vm.power.STATE_FORCED )
+        self.assertEqual( res[ "vm1" ][ "method" ], "poweroff" )
+        self.assertGreaterEqual( res[ "vm1" ][ "stop" ], 1 )
+        self.assertEqual( self._states(), [] )
+
+    def test_unknown_group( self ):
+        self.assertRaises( AttributeError, pyvbcc.vm.power.GroupPower( "nope", **self._opt ).members )
+
+
+if __name__ == "__main__":
+    unittest.main()
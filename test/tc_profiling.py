@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import io
+import json
+import pstats
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.profiling
+
+def busy():
+    return [ str( i ) * 10 for i in range( 20000 ) ]
+
+class TestProfiling( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown( self ):
+        self._dir.cleanup()
+
+    def test_cpu_and_memory( self ):
+        profiler = pyvbcc.profiling.Profiler( cpu=True, mem=True, top=5 )
+        profiler.start()
+        with profiler.section( "action" ):
+            keep = busy()
+        profiler.stop()
+
+        summary = profiler.summary()
+        self.assertIn( "action", summary[ "sections" ] )
+        self.assertLessEqual( len( summary[ "functions" ] ), 5 )
+        self.assertTrue( any( f[ "file" ] == __file__ for f in summary[ "functions" ] ) )
+        self.assertGreater( summary[ "peak" ], 0 )
+        self.assertTrue( any( a[ "file" ] == __file__ for a in summary[ "allocations" ] ) )
+
+        out = io.StringIO()
+        profiler.print_report( out )
+        self.assertTrue( out.getvalue().startswith( "# profile:" ) )
+
+    def test_dump( self ):
+        prefix = os.path.join( self._dir.name, "run" )
+        pyvbcc.profiling.Start( cpu=True, mem=False )
+        with pyvbcc.profiling.Section( "parse" ):
+            busy()
+        files = pyvbcc.profiling.Stop( prefix, io.StringIO() )
+        self.assertEqual( files, [ prefix + ".pstats", prefix + ".json" ] )
+        self.assertGreater( pstats.Stats( prefix + ".pstats" ).total_calls, 0 )
+        with open( prefix + ".json" ) as fd:
+            self.assertEqual( list( json.load( fd )[ "sections" ].keys() ), [ "parse" ] )
+
+        ## without a running profiler sections and Stop do nothing
+        with pyvbcc.profiling.Section( "parse" ):
+            pass
+        self.assertEqual( pyvbcc.profiling.Stop( prefix ), [] )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import copy
+import time
+import tempfile
+import asyncio
+import unittest
+from unittest import mock
+
+import pyvbcc
+import pyvbcc.plan
+import pyvbcc.command
+import pyvbcc.disk.index
+import pyvbcc.state
+import pyvbcc.vbm
+
+from helpers import environment
+
+CALLS = list()
+
+def make_aexecute( fail ):
+    async def aexecute( self, **opt ):
+        line = self._command_line()
+        CALLS.append( line )
+        self._exitcode = 1 if fail in " ".join( line ) else 0
+        return pyvbcc.command.GenericCommandResult( line, [ "UUID: 0b7d6c4e-7a4e-4b1e-9c47-5d2c2f2e9a01" ], self._exitcode )
+    return aexecute
+
+class TestState( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        self._state = os.path.join( self._dir.name, pyvbcc.state.STATE_FILE )
+
+    def tearDown( self ):
+        self._dir.cleanup()
+
+    def _env( self, data ):
+        filename = os.path.join( self._dir.name, "env.json" )
+        with open( filename, "w" ) as fd:
+            json.dump( data, fd )
+        return pyvbcc.vbm.VbEnvironment( "create", filename, test=True )
+
+    def _apply( self, data ):
+        env = self._env( data )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        plan = env.plan( state )
+        plan.run()
+        env.record( plan, state )
+        state.close()
+        return plan
+
+    def test_fingerprint( self ):
+        self.assertEqual( pyvbcc.state.fingerprint( { "a": 1, "b": [ 1, 2 ] } ), pyvbcc.state.fingerprint( { "b": [ 1, 2 ], "a": 1 } ) )
+        self.assertNotEqual( pyvbcc.state.fingerprint( { "a": 1 } ), pyvbcc.state.fingerprint( { "a": 2 } ) )
+
+    def test_store( self ):
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        self.assertEqual( state.journal_mode(), "wal" )
+        self.assertIsNone( state.changed( "hosts", "vm0", { "cpus": 1 } ) )
+        state.put( "hosts", "vm0", { "cpus": 1 } )
+        state.close()
+
+        self.assertEqual( pyvbcc.state.StateStore( self._state, "other" ).names( "hosts" ), [] )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        self.assertEqual( state.names( "hosts" ), [ "vm0" ] )
+        self.assertFalse( state.changed( "hosts", "vm0", { "cpus": 1 } ) )
+        self.assertEqual( state.changed( "hosts", "vm0", { "cpus": 2 } ), { "cpus": 1 } )
+
+    def test_unchanged_apply( self ):
+        data = environment( 50 )
+        plan = self._apply( data )
+        self.assertTrue( plan.ok() )
+
+        start = time.time()
+        plan = self._apply( data )
+        self.assertEqual( len( plan ), 0 )
+        self.assertLess( time.time() - start, 1.0 )
+
+    def test_changed_host( self ):
+        data = environment( 3 )
+        self._apply( data )
+
+        data = copy.deepcopy( data )
+        host = data[ "hosts" ][1]
+        host[ "mem" ] = "2048"
+        host[ "disks" ][0][ "size" ] = "4G"
+        host[ "disks" ].append( { "name": "vm1d2", "size": "1G", "format": "vdi" } )
+        del host[ "nics" ][1]
+
+        env = self._env( data )
+        plan = env.plan( pyvbcc.state.StateStore( self._state, "bench" ) )
+        keys = sorted( n.key for n in plan.nodes() )
+        self.assertTrue( all( k.startswith( "vm:vm1:" ) or k == "modifyvm:vm1" for k in keys ) )
+        self.assertNotIn( "vm:vm1", keys )
+
+        line = plan.node( "vm:vm1:disk:vm1d0" ).cmd._command_line()
+        self.assertEqual( line[1:3], [ "modifymedium", "disk" ] )
+        self.assertEqual( line[-2:], [ "--resize", "4096" ] )
+        self.assertIn( "--portcount", plan.node( "vm:vm1:storagectl:SATA" ).cmd._command_line() )
+        line = plan.node( "vm:vm1:attach:vm1d2" ).cmd._command_line()
+        self.assertEqual( line[ line.index( "--port" ) + 1 ], "2" )
+
+        line = plan.node( "vm:vm1:modify" ).cmd._command_line()
+        self.assertIn( "2048", line )
+        self.assertIn( "none", line )
+        self.assertNotIn( "--cpus", line )
+
+    def test_dropped_disk_port( self ):
+        data = environment( 2 )
+        self._apply( data )
+
+        ## vm1d1 left the spec but is still attached on port 1, the new disk must not take it
+        data = copy.deepcopy( data )
+        del data[ "hosts" ][1][ "disks" ][1]
+        self._apply( data )
+        data[ "hosts" ][1][ "disks" ].append( { "name": "vm1d2", "size": "1G", "format": "vdi" } )
+        index = pyvbcc.disk.index.MediaIndex( test=True )
+        index._slots[ "vm1" ] = { "SATA-0-0": "/tmp/vms/bench/vm1/vm1d0.vdi", "SATA-1-0": "/tmp/vms/bench/vm1/vm1d1.vdi" }
+        pyvbcc.disk.index._index = index
+        try:
+            plan = self._env( data ).plan( pyvbcc.state.StateStore( self._state, "bench" ) )
+        finally:
+            pyvbcc.disk.index._index = None
+        line = plan.node( "vm:vm1:attach:vm1d2" ).cmd._command_line()
+        self.assertEqual( line[ line.index( "--port" ) + 1 ], "2" )
+        line = plan.node( "vm:vm1:storagectl:SATA" ).cmd._command_line()
+        self.assertEqual( line[ line.index( "--portcount" ) + 1 ], "3" )
+
+        ## a medium on port 5 keeps the controller at six ports, the new disk fills the gap
+        index._slots[ "vm1" ][ "SATA-5-0" ] = "/tmp/vms/bench/vm1/extra.vdi"
+        pyvbcc.disk.index._index = index
+        try:
+            plan = self._env( data ).plan( pyvbcc.state.StateStore( self._state, "bench" ) )
+        finally:
+            pyvbcc.disk.index._index = None
+        line = plan.node( "vm:vm1:attach:vm1d2" ).cmd._command_line()
+        self.assertEqual( line[ line.index( "--port" ) + 1 ], "2" )
+        line = plan.node( "vm:vm1:storagectl:SATA" ).cmd._command_line()
+        self.assertEqual( line[ line.index( "--portcount" ) + 1 ], "6" )
+
+    def test_managed_objects( self ):
+        data = environment( 2 )
+        data[ "hosts" ][0][ "nics" ].append( { "type": "intnet", "network": "lab" } )
+        self._apply( data )
+
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        self.assertEqual( [ vm[ "name" ] for vm in state.vms() ], [ "vm0", "vm1" ] )
+        self.assertEqual( state.vm( "vm0" )[ "ostype" ], "RedHat_64" )
+        self.assertEqual( state.vm( "vm0" )[ "state" ], "poweroff" )
+        self.assertEqual( [ m[ "location" ] for m in state.media( "vm1" ) ], [ "/tmp/vms/bench/vm1/vm1d0.vdi", "/tmp/vms/bench/vm1/vm1d1.vdi" ] )
+        self.assertEqual( [ n[ "mac" ] for n in state.nics( "vm1" ) ], [ None, "080027000001" ] )
+        self.assertEqual( len( state.nics( "vm0" ) ), 3 )
+        self.assertEqual( [ n[ "name" ] for n in state.networks() ], [ "nat1" ] )
+        state.close()
+
+        del data[ "hosts" ][0][ "nics" ][2]
+        self._apply( data )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        self.assertEqual( len( state.nics( "vm0" ) ), 2 )
+        self.assertEqual( len( pyvbcc.state.StateStore( self._state ).managed()[ "vms" ] ), 2 )
+
+    def test_destroy( self ):
+        data = environment( 2 )
+        data[ "disks" ] = [ { "name": "shared", "size": "1G" } ]
+        self._apply( data )
+
+        env = self._env( data )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        plan = env.destroy( state, { "vm0": "uuid" } )
+        self.assertEqual( sorted( plan.states().keys() ), [ "destroy:disk:shared", "destroy:net:nat1", "destroy:vm:vm0" ] )
+        self.assertEqual( plan.node( "destroy:net:nat1" ).deps, [ "destroy:vm:vm0" ] )
+        self.assertEqual( plan.node( "destroy:vm:vm0" ).cmd._command_line()[1:], [ "unregistervm", "vm0", "--delete" ] )
+
+        plan.run()
+        self.assertEqual( env.forget( plan, state ), 4 )
+        self.assertEqual( state.managed(), { "vms": [], "media": [], "networks": [] } )
+        self.assertEqual( state.names( "hosts" ), [] )
+
+    def test_groups( self ):
+        bench = pyvbcc.state.StateStore( self._state, "bench" )
+        other = pyvbcc.state.StateStore( self._state, "other" )
+        bench.put_vm( "vm0", "uuid-1", state="poweroff" )
+        bench.put_network( "nat1", "natnetwork" )
+        bench.save()
+        other.put_vm( "vm0", "uuid-2", state="running" )
+        other.save()
+
+        self.assertEqual( ( bench.vm( "vm0" )[ "uuid" ], other.vm( "vm0" )[ "uuid" ] ), ( "uuid-1", "uuid-2" ) )
+        self.assertEqual( other.network_groups( "nat1" ), [ "bench" ] )
+        other.put_nic( "vm0", 1, type="natnetwork", network="nat2" )
+        other.save()
+        self.assertEqual( bench.network_groups( "nat2" ), [ "other" ] )
+
+        bench.drop_vm( "vm0" )
+        self.assertIsNone( bench.vm( "vm0" ) )
+        self.assertEqual( other.vm( "vm0" )[ "state" ], "running" )
+        bench.close()
+        other.close()
+
+    def test_shared_network( self ):
+        data = environment( 1 )
+        self._apply( data )
+        other = pyvbcc.state.StateStore( self._state, "other" )
+        other.put_network( "nat1", "natnetwork" )
+        other.close()
+
+        ## the other group keeps nat1, this one only forgets it
+        env = self._env( data )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+        plan = env.destroy( state, { "vm0": "uuid" } )
+        self.assertNotIn( "destroy:net:nat1", plan )
+        plan.run()
+        env.forget( plan, state )
+        self.assertEqual( state.networks(), [] )
+        self.assertEqual( [ n[ "grp" ] for n in pyvbcc.state.StateStore( self._state ).networks() ], [ "other" ] )
+
+    def test_state_file( self ):
+        env = dict( os.environ )
+        try:
+            os.environ.pop( "PYVBCC_STATE", None )
+            self.assertEqual( pyvbcc.state.state_file(), os.path.join( "etc", "pyvbcc.db" ) )
+            self.assertEqual( pyvbcc.state.state_file( "/srv/pyvbcc/pyvbcc.json" ), "/srv/pyvbcc/pyvbcc.db" )
+            self.assertEqual( pyvbcc.state.GetStateStore( None, { pyvbcc.KEY_CONFIG_FILE: "/srv/pyvbcc/pyvbcc.json" } ).filename(), "/srv/pyvbcc/pyvbcc.db" )
+            os.environ[ "PYVBCC_STATE" ] = self._state
+            self.assertEqual( pyvbcc.state.state_file( "/srv/pyvbcc/pyvbcc.json" ), self._state )
+        finally:
+            os.environ.clear()
+            os.environ.update( env )
+
+    def test_resume( self ):
+        data = environment( 3 )
+        env = self._env( data )
+        state = pyvbcc.state.StateStore( self._state, "bench" )
+
+        del CALLS[:]
+        with mock.patch.object( pyvbcc.command.GenericCommand, "aexecute", make_aexecute( "vm1d1.vdi" ) ):
+            plan = env.plan( state )
+            plan.run( journal=state )
+        self.assertFalse( plan.ok() )
+        first = len( CALLS )
+        self.assertEqual( state.journal_size(), len( [ n for n in plan.nodes() if n.state == pyvbcc.plan.STATE_DONE ] ) )
+        env.record( plan, state )
+        self.assertEqual( state.names( "hosts" ), [ "vm0", "vm2" ] )
+
+        del CALLS[:]
+        with mock.patch.object( pyvbcc.command.GenericCommand, "aexecute", make_aexecute( "no such command" ) ):
+            plan = env.plan( state )
+            plan.run( journal=state )
+        self.assertTrue( plan.ok() )
+        self.assertEqual( sorted( plan.resumed() ), [ "modifyvm:vm1", "vm:vm1", "vm:vm1:attach:vm1d0", "vm:vm1:disk:vm1d0", "vm:vm1:storagectl:SATA" ] )
+        self.assertEqual( len( CALLS ), 2 )
+        self.assertLess( len( CALLS ), first )
+
+        env.record( plan, state )
+        self.assertEqual( state.vm( "vm1" )[ "uuid" ], "0b7d6c4e-7a4e-4b1e-9c47-5d2c2f2e9a01" )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import os, sys, re
+import json
+import asyncio
+import tempfile
+import unittest
+
+import pyvbcc
+import pyvbcc.command
+import pyvbcc.executor
+import pyvbcc.trace
+
+class NapCommand( pyvbcc.command.GenericCommand ):
+
+    async def _aexecute( self, **opt ):
+        await asyncio.sleep( 0.02 )
+        self._exitcode = 0
+        return pyvbcc.command.GenericCommandResult( self._command_line(), [], 0 )
+
+class TestTrace( unittest.TestCase ):
+
+    def setUp( self ):
+        self._dir = tempfile.TemporaryDirectory()
+        pyvbcc.trace.Enable()
+
+    def tearDown( self ):
+        pyvbcc.trace.Disable()
+        self._dir.cleanup()
+
+    def test_disabled( self ):
+        pyvbcc.trace.Disable()
+        self.assertIsNone( pyvbcc.trace.Begin( "x" ) )
+        with pyvbcc.trace.Span( "x" ):
+            pass
+        pyvbcc.command.GenericCommand( [ "list", "vms" ], test=True ).execute()
+        self.assertIsNone( pyvbcc.trace.GetTracer() )
+
+    def test_command_lanes( self ):
+        cmds = [ NapCommand( [ "modifyvm", "vm%s" % ( i ), "--cpus", "1" ] ) for i in range( 6 ) ]
+        with pyvbcc.trace.Span( "run", "plan" ):
+            pyvbcc.executor.CommandExecutor( limit=2 ).run( cmds )
+
+        events = pyvbcc.trace.GetTracer().events()
+        spans = [ e for e in events if e[ "cat" ] == "vboxmanage" ]
+        self.assertEqual( len( spans ), 6 )
+        self.assertEqual( sorted( set( e[ "tid" ] for e in spans ) ), [ 1, 2 ] )
+        self.assertEqual( spans[0][ "args" ][ "subcommand" ], "modifyvm" )
+        self.assertEqual( sorted( e[ "args" ][ "vm" ] for e in spans ), [ "vm%s" % ( i ) for i in range( 6 ) ] )
+        self.assertEqual( spans[0][ "args" ][ "exitcode" ], 0 )
+
+        run = [ e for e in events if e[ "name" ] == "run" ][0]
+        self.assertEqual( run[ "tid" ], pyvbcc.trace.MAIN_LANE )
+        self.assertTrue( all( run[ "ts" ] <= e[ "ts" ] and e[ "ts" ] + e[ "dur" ] <= run[ "ts" ] + run[ "dur" ] for e in spans ) )
+
+    def test_write( self ):
+        with pyvbcc.trace.Span( "parse", "cli" ):
+            pyvbcc.command.GenericCommand( [ "list", "vms" ], test=True ).execute()
+        filename = os.path.join( self._dir.name, "out.json" )
+        pyvbcc.trace.Write( filename )
+
+        with open( filename ) as fd:
+            data = json.load( fd )
+        names = [ e[ "name" ] for e in data[ "traceEvents" ] if e[ "ph" ] == "X" ]
+        self.assertEqual( names, [ "parse", "list" ] )
+        self.assertIn( "thread_name", [ e[ "name" ] for e in data[ "traceEvents" ] if e[ "ph" ] == "M" ] )
+
+
+if __name__ == '__main__':
+    unittest.main()